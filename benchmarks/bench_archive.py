@@ -0,0 +1,78 @@
+"""
+Mede o arquivo comprimido de trajetórias (.gla) contra os CSV filtrados.
+
+Gera um CSV sintético com as colunas do data_filter (um ponto a cada 10 s, com paradas
+e intervalos sem sinal), converte-o com track_archive.archive_csv e mede a taxa de
+compressão, a descodificação completa (pontos por minuto) e leituras aleatórias de
+uma hora através do índice de blocos.
+
+Uso: python benchmarks/bench_archive.py [número de pontos] [número de leituras]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "utils"))
+
+from track_archive import TrackArchive, archive_csv, format_report  # noqa: E402
+
+
+def write_cleaned_csv(path, n, rng):
+    gaps = rng.choice([10, 10, 10, 10, 11, 20, 600], n)
+    times = pd.to_datetime(1704067200 + np.cumsum(gaps), unit="s")
+    step = rng.normal(0, 1, (n, 2)) * 8e-5 * rng.choice([0, 1, 1, 1], (n, 1))
+    lat, lon = 38.7 + np.cumsum(step[:, 0]), -9.1 + np.cumsum(step[:, 1])
+    distance = np.hypot(np.diff(lat, prepend=lat[0]), np.diff(lon, prepend=lon[0])) * 111000
+    speed = distance / gaps
+    elapsed = np.cumsum(gaps)
+    pd.DataFrame({
+        "latitude": lat.round(6),
+        "longitude": lon.round(6),
+        "date": times.strftime("%d-%m-%Y"),
+        "time": times.strftime("%H:%M:%S"),
+        "distance_in_m": distance,
+        "speed_m/s": speed.round(2),
+        "speed_kmh": (speed * 3.6).round(2),
+        "formatted_time": [f"{g} segundos" for g in gaps],
+        "total_time": [f"{t // 3600} horas, {t % 3600 // 60} minutos" for t in elapsed],
+        "total_distance": distance.cumsum(),
+    }).to_csv(path, index=False)
+
+
+def main():
+    n_points = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    n_reads = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "cleaned_bench.csv")
+        write_cleaned_csv(csv_path, n_points, rng)
+
+        started = time.perf_counter()
+        report = archive_csv(csv_path, os.path.join(tmp, "bench.gla"))
+        print(f"Arquivo: {format_report(report)}, {time.perf_counter() - started:.2f} s")
+
+        started = time.perf_counter()
+        pd.read_csv(csv_path, usecols=["latitude", "longitude", "date", "time"])
+        csv_elapsed = time.perf_counter() - started
+
+        archive = TrackArchive(report["archive_file"])
+        started = time.perf_counter()
+        epoch, lat, lon = archive.read()
+        elapsed = time.perf_counter() - started
+        print(f"Descodificação: {len(epoch)} pontos em {elapsed:.2f} s "
+              f"({len(epoch) / elapsed * 60 / 1e6:.0f} M pontos/min; leitura do CSV: {csv_elapsed:.2f} s)")
+
+        starts = pd.to_datetime(rng.choice(epoch, n_reads), unit="s")
+        started = time.perf_counter()
+        points = sum(len(archive.read(start, start + pd.Timedelta(hours=1))[0]) for start in starts)
+        elapsed = time.perf_counter() - started
+        print(f"Intervalos de 1 h: {n_reads} leituras, {points / n_reads:.0f} pontos em média, "
+              f"{elapsed / n_reads * 1000:.2f} ms por leitura")
+
+
+if __name__ == "__main__":
+    main()
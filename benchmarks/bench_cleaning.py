@@ -0,0 +1,95 @@
+"""
+Mede a limpeza de GPS (gps_cleaning.clean_track) e verifica o que não pode regredir.
+
+Gera uma trajetória sintética com troços de carro, caminhadas lentas amostradas a 1 Hz,
+paradas com ruído de GPS e saltos (teleportes) de um e de vários pontos, e confirma que:
+- uma caminhada densa não se reduz a um ponto (os pontos mantidos ficam a >= tolerância);
+- as paradas encontradas por stopping_study.find_stops são as mesmas da trajetória sem ruído;
+- os saltos são removidos e o resultado não depende do tamanho dos blocos.
+
+Uso: python benchmarks/bench_cleaning.py [número de ciclos]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "utils"))
+
+from gps_cleaning import DUPLICATE_TOLERANCE_M, clean_track, haversine_m  # noqa: E402
+from stopping_study import find_stops  # noqa: E402
+
+METRES_PER_DEGREE = 111195
+
+
+def synthetic_track(cycles, rng):
+    """
+    Cada ciclo: 10 min de carro a 15 m/s (5 s), 5 min a pé a 1.5 m/s (1 s) e uma parada de
+    10 min (1 s), com ruído de ~0.3 m. Devolve (lat, lon, epoch, número de paradas, saltos);
+    a última parada não conta, porque find_stops só conta paradas seguidas de movimento.
+    """
+    steps, dts = [], []
+    for _ in range(cycles):
+        steps += [np.full(120, 15.0 * 5), np.full(300, 1.5), np.zeros(600)]
+        dts += [np.full(120, 5), np.ones(300, dtype=int), np.ones(600, dtype=int)]
+    north = np.cumsum(np.concatenate(steps)) + rng.normal(0, 0.3, 1020 * cycles)
+    lat = 38.7 + north / METRES_PER_DEGREE
+    lon = np.full(len(lat), -9.1) + rng.normal(0, 0.2, len(lat)) / METRES_PER_DEGREE
+    epoch = 1704067200 + np.cumsum(np.concatenate(dts))
+
+    # Saltos de 5 km durante o troço de carro: um ponto e três pontos seguidos
+    jumps = []
+    for cycle in range(cycles):
+        start = cycle * 1020
+        jumps += [start + 30, start + 60, start + 61, start + 62]
+    lat[jumps] += 0.05
+    return lat, lon, epoch, cycles - 1, np.array(jumps)
+
+
+def count_stops(lat, lon, epoch):
+    """
+    Paradas como o data_filter as vê: pontos a pelo menos 10 s uns dos outros e velocidade desde o anterior.
+    """
+    rows, last = [], None
+    for i, t in enumerate(epoch.tolist()):
+        if last is None or t - last >= 10:
+            rows.append(i)
+            last = t
+    lat, lon, epoch = lat[rows], lon[rows], epoch[rows]
+    distance = haversine_m(lat[:-1], lon[:-1], lat[1:], lon[1:])
+    speed = np.concatenate([[0], distance / np.diff(epoch)]) * 3.6
+    df = pd.DataFrame({"time": pd.to_datetime(epoch, unit="s"), "speed_kmh": speed, "latitude": lat, "longitude": lon})
+    return len(find_stops(df))
+
+
+def main():
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    lat, lon, epoch, expected_stops, jumps = synthetic_track(cycles, np.random.default_rng(0))
+    times = pd.to_datetime(epoch, unit="s")
+
+    started = time.perf_counter()
+    keep, counts = clean_track(lat, lon, times)
+    elapsed = time.perf_counter() - started
+    print(f"{len(lat)} pontos em {elapsed:.2f} s ({len(lat) / elapsed:.0f} pontos/s): {counts}")
+
+    assert not keep[jumps].any(), "saltos não removidos"
+    walk = np.concatenate([np.arange(c * 1020 + 120, c * 1020 + 420) for c in range(cycles)])
+    kept_walk = walk[keep[walk]]
+    gaps = haversine_m(lat[kept_walk[:-1]], lon[kept_walk[:-1]], lat[kept_walk[1:]], lon[kept_walk[1:]])
+    assert len(kept_walk) >= len(walk) // 3, "caminhada densa reduzida"
+    print(f"Caminhada a 1 Hz: {len(kept_walk)} de {len(walk)} pontos mantidos, "
+          f"{np.mean(gaps[gaps < 100] >= DUPLICATE_TOLERANCE_M):.0%} a >= {DUPLICATE_TOLERANCE_M:g} m do anterior")
+
+    stops = count_stops(lat[keep], lon[keep], epoch[keep])
+    assert stops == expected_stops, f"paradas: {stops} em vez de {expected_stops}"
+    print(f"Paradas: {stops} (esperadas {expected_stops})")
+
+    small_keep, small_counts = clean_track(lat, lon, times, chunk_size=777)
+    assert (small_keep == keep).all() and small_counts == counts, "resultado depende dos blocos"
+    print("Blocos de 777 pontos: resultado idêntico")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Mede o tempo da geocodificação inversa offline de paradas.
+
+Gera um gazetteer sintético (formato do dump do GeoNames) e paradas aleatórias na
+mesma região e mede a primeira consulta (árvore + escrita na cache) e uma segunda
+consulta, servida só pela cache SQLite.
+
+Uso: python benchmarks/bench_geocoding.py [número de lugares] [número de paradas]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "utils"))
+
+from reverse_geocoding import ReverseGeocoder  # noqa: E402
+
+
+def write_geonames(path, n, rng):
+    lat = rng.uniform(37.0, 42.0, n)
+    lon = rng.uniform(-9.5, -6.2, n)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            f.write(f"{i}\tLugar {i}\tLugar {i}\t\t{lat[i]:.5f}\t{lon[i]:.5f}\tP\tPPL\tPT\t\t\t\t\t\t500\t\t\tEurope/Lisbon\t2024-01-01\n")
+
+
+def main():
+    n_places = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    n_stops = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        gazetteer = os.path.join(tmp, "cities.txt")
+        write_geonames(gazetteer, n_places, rng)
+        geocoder = ReverseGeocoder(gazetteer, cache_path=os.path.join(tmp, "geocache.sqlite"))
+        lat, lon = rng.uniform(37.0, 42.0, n_stops), rng.uniform(-9.5, -6.2, n_stops)
+
+        started = time.perf_counter()
+        labels = geocoder.lookup(lat, lon)
+        cold = time.perf_counter() - started
+
+        started = time.perf_counter()
+        ReverseGeocoder(gazetteer, cache_path=os.path.join(tmp, "geocache.sqlite")).lookup(lat, lon)
+        warm = time.perf_counter() - started
+
+        named = sum(label is not None for label in labels)
+        print(f"{n_places} lugares, {n_stops} paradas ({named} com nome)")
+        print(f"sem cache {cold:.2f} s ({n_stops / cold:,.0f} paradas/s)  "
+              f"com cache {warm:.2f} s ({n_stops / warm:,.0f} paradas/s)")
+
+
+if __name__ == "__main__":
+    main()
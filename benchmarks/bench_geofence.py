@@ -0,0 +1,56 @@
+"""
+Mede o débito (pontos por segundo) do motor de geofencing.
+
+Gera zonas circulares aleatórias e uma trajetória sintética (passeio aleatório) na
+mesma região, constrói o índice STRtree e calcula as visitas e o tempo de permanência.
+
+Uso: python benchmarks/bench_geofence.py [número de zonas] [número de pontos]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import shapely
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "utils"))
+
+from geofence import GeofenceIndex, dwell_summary, locate_points, zone_visits  # noqa: E402
+
+
+def synthetic_zones(n, rng):
+    centers = shapely.points(rng.uniform(-9.3, -8.9, n), rng.uniform(38.6, 38.9, n))
+    return [f"zona_{i}" for i in range(n)], shapely.buffer(centers, rng.uniform(0.001, 0.005, n), quad_segs=8)
+
+
+def synthetic_track(n, rng):
+    lat = np.clip(38.75 + np.cumsum(rng.normal(0, 2e-4, n)), 38.6, 38.9)
+    lon = np.clip(-9.1 + np.cumsum(rng.normal(0, 2e-4, n)), -9.3, -8.9)
+    times = np.datetime64("2024-01-01T00:00:00") + np.arange(n) * np.timedelta64(5, "s")
+    return lat, lon, times
+
+
+def main():
+    n_zones = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    n_points = int(sys.argv[2]) if len(sys.argv) > 2 else 2000000
+    rng = np.random.default_rng(0)
+    names, geometries = synthetic_zones(n_zones, rng)
+    lat, lon, times = synthetic_track(n_points, rng)
+
+    started = time.perf_counter()
+    index = GeofenceIndex(names, geometries)
+    built = time.perf_counter()
+    point_idx, zone_idx = locate_points(index, lat, lon)
+    located = time.perf_counter()
+    visits = zone_visits(times, point_idx, zone_idx, names)
+    summary = dwell_summary(visits)
+    finished = time.perf_counter()
+
+    print(f"{n_zones} zonas, {n_points} pontos, {len(point_idx)} pares ponto/zona, "
+          f"{len(visits)} visitas em {len(summary)} zonas")
+    print(f"índice {built - started:.2f} s  zonas {located - built:.2f} s  visitas {finished - located:.2f} s  "
+          f"({n_points / (finished - started):,.0f} pontos/s)")
+
+
+if __name__ == "__main__":
+    main()
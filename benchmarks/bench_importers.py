@@ -0,0 +1,100 @@
+"""
+Mede o débito (pontos por segundo) dos importadores de histórico de localizações.
+
+Gera ficheiros sintéticos (Records.json do Takeout, GPX e KML) numa pasta temporária
+e converte-os para CSV com location_importers.import_history. Verifica também que o pico
+de memória (tracemalloc) dos leitores GPX e KML não cresce com o tamanho do ficheiro.
+
+Uso: python benchmarks/bench_importers.py [número de pontos]
+"""
+import os
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "utils"))
+
+from location_importers import import_history, iter_gpx, iter_kml  # noqa: E402
+
+
+def synthetic_points(n):
+    start = datetime(2020, 1, 1)
+    for i in range(n):
+        yield 38.7 + (i % 1000) * 1e-4, -9.1 + (i // 1000) * 1e-4, start + timedelta(seconds=5 * i)
+
+
+def write_records(path, n):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{\n  "locations": [')
+        for i, (lat, lon, t) in enumerate(synthetic_points(n)):
+            f.write("," if i else "")
+            f.write(f'{{\n    "latitudeE7": {round(lat * 1e7)},\n    "longitudeE7": {round(lon * 1e7)},\n'
+                    f'    "accuracy": 10,\n    "timestamp": "{t:%Y-%m-%dT%H:%M:%S}.000Z"\n  }}')
+        f.write("]\n}\n")
+
+
+def write_gpx(path, n):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0"?>\n<gpx version="1.1" xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg>\n')
+        for lat, lon, t in synthetic_points(n):
+            f.write(f'<trkpt lat="{lat:.7f}" lon="{lon:.7f}"><time>{t:%Y-%m-%dT%H:%M:%S}Z</time></trkpt>\n')
+        f.write("</trkseg></trk></gpx>\n")
+
+
+def write_kml(path, n):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0"?>\n<kml xmlns="http://www.opengis.net/kml/2.2" '
+                'xmlns:gx="http://www.google.com/kml/ext/2.2"><Document><Placemark><gx:Track>\n')
+        points = list(synthetic_points(n))
+        for _, _, t in points:
+            f.write(f"<when>{t:%Y-%m-%dT%H:%M:%S}Z</when>\n")
+        for lat, lon, _ in points:
+            f.write(f"<gx:coord>{lon:.7f} {lat:.7f} 0</gx:coord>\n")
+        f.write("</gx:Track></Placemark></Document></kml>\n")
+
+
+def write_kml_placemarks(path, n):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0"?>\n<kml xmlns="http://www.opengis.net/kml/2.2"><Document>\n')
+        for lat, lon, t in synthetic_points(n):
+            f.write(f"<Placemark><TimeStamp><when>{t:%Y-%m-%dT%H:%M:%S}Z</when></TimeStamp>"
+                    f"<Point><coordinates>{lon:.7f},{lat:.7f},0</coordinates></Point></Placemark>\n")
+        f.write("</Document></kml>\n")
+
+
+def peak_memory(reader, path):
+    tracemalloc.start()
+    with open(path, "rb") as f:
+        count = sum(1 for _ in reader(f))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return count, peak
+
+
+def check_memory(tmp, n):
+    for name, writer, reader in (("track.gpx", write_gpx, iter_gpx), ("places.kml", write_kml_placemarks, iter_kml)):
+        peaks = []
+        for size in (n, 5 * n):
+            source = os.path.join(tmp, f"{size}_{name}")
+            writer(source, size)
+            count, peak = peak_memory(reader, source)
+            peaks.append(peak)
+            print(f"{name:<14} {count:>10} pontos, pico de memória {peak / 1e6:6.2f} MB")
+        assert peaks[1] < 2 * peaks[0], f"{name}: a memória cresce com o tamanho do ficheiro"
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, writer in (("Records.json", write_records), ("track.gpx", write_gpx), ("track.kml", write_kml)):
+            source = os.path.join(tmp, name)
+            writer(source, n)
+            size_mb = os.path.getsize(source) / 1e6
+            _, count, rate = import_history(source, os.path.join(tmp, name + ".csv"))
+            print(f"{name:<14} {size_mb:8.1f} MB {count:>10} pontos {rate:>12,.0f} pontos/s")
+        check_memory(tmp, n // 4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Mede o tempo do agrupamento de viagens em famílias de rotas.
+
+Gera viagens sintéticas a partir de algumas rotas base (com ruído de GPS e amostragens
+diferentes), calcula as assinaturas e agrupa-as com route_similarity.group_routes.
+Compara também o número de pares candidatos com o de uma comparação de todos os pares.
+
+Uso: python benchmarks/bench_routes.py [número de viagens] [número de rotas base]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "utils"))
+
+from route_similarity import group_routes, trip_signature  # noqa: E402
+
+
+def synthetic_trips(n_trips, n_routes, rng):
+    # Rotas base: passeios aleatórios de ~10 km numa área de 50 x 50 km (em metros)
+    bases = []
+    for _ in range(n_routes):
+        steps = rng.normal(0, 1, (200, 2)) * 30 + rng.normal(0, 1, 2) * 40
+        bases.append(rng.uniform(0, 50000, 2) + np.cumsum(steps, axis=0))
+
+    labels = rng.integers(0, n_routes, n_trips)
+    signatures = []
+    for label in labels:
+        base = bases[label]
+        rows = np.sort(rng.choice(len(base), rng.integers(60, 200), replace=False))
+        track = base[rows] + rng.normal(0, 10, (len(rows), 2))
+        signatures.append(trip_signature(track[:, 0], track[:, 1]))
+    return np.array(signatures), labels
+
+
+def main():
+    n_trips = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    n_routes = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    signatures, labels = synthetic_trips(n_trips, n_routes, np.random.default_rng(0))
+
+    for metric in ("dtw", "frechet"):
+        started = time.perf_counter()
+        families, pairs, _ = group_routes(signatures, metric=metric)
+        elapsed = time.perf_counter() - started
+
+        # Pureza: fração das viagens cuja família só contém viagens da mesma rota base
+        counts = np.bincount(np.unique(np.column_stack([families, labels]), axis=0)[:, 0])
+        pure = np.isin(families, np.flatnonzero(counts == 1)).sum()
+        print(f"{metric:<8} {n_trips} viagens, {len(pairs)} pares candidatos "
+              f"(de {n_trips * (n_trips - 1) // 2}), {families.max() + 1} famílias, "
+              f"pureza {pure / n_trips:.0%}, {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
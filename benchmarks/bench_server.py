@@ -0,0 +1,100 @@
+"""
+Mede o débito (pedidos por segundo) e a latência (p50/p99) do servidor do histórico.
+
+Preenche um HistoryStore temporário com dados sintéticos, arranca o servidor no mesmo
+processo numa porta livre e lança vários clientes asyncio com ligações keep-alive, cada
+um a pedir intervalos de tempo e caixas aleatórios.
+
+Uso: python benchmarks/bench_server.py [clientes] [pedidos por cliente]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "utils"))
+
+from history_server import HistoryServer  # noqa: E402
+from history_store import HistoryStore  # noqa: E402
+
+DAYS = 30
+POINTS_PER_DAY = 17280  # um ponto a cada 5 segundos
+START = datetime(2024, 1, 1)
+
+
+def fill_store(store):
+    n = DAYS * POINTS_PER_DAY
+    rng = np.random.default_rng(0)
+    store.write("bench", pd.DataFrame({
+        "datetime": pd.date_range(START, periods=n, freq="5s"),
+        "latitude": 38.7 + np.cumsum(rng.normal(0, 1e-4, n)),
+        "longitude": -9.1 + np.cumsum(rng.normal(0, 1e-4, n)),
+        "speed_kmh": rng.uniform(0, 120, n),
+    }))
+    return n
+
+
+def random_target(rng):
+    start = START + timedelta(minutes=rng.randrange(DAYS * 24 * 60))
+    end = start + timedelta(hours=rng.choice([1, 6, 24]))
+    query = f"device=bench&start={start:%Y-%m-%dT%H:%M}&end={end:%Y-%m-%dT%H:%M}&limit=5000"
+    if rng.random() < 0.3:
+        return f"/bbox?{query}&min_lat=38.6&min_lon=-9.2&max_lat=38.8&max_lon=-9.0"
+    return f"/range?{query}"
+
+
+async def client(port, requests, latencies, seed):
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for _ in range(requests):
+        started = time.perf_counter()
+        writer.write(f"GET {random_target(rng)} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+        await writer.drain()
+        length = 0
+        status = await reader.readline()
+        while True:
+            line = await reader.readline()
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode().partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        await reader.readexactly(length)
+        if b" 200 " not in status:
+            raise RuntimeError(status.decode().strip())
+        latencies.append(time.perf_counter() - started)
+    writer.close()
+
+
+async def run(clients, requests):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = HistoryStore(os.path.join(tmp, "store"), mmap_cache_size=512)
+        n = fill_store(store)
+        server = await HistoryServer(store, tiles_dir=os.path.join(tmp, "tiles")).start(port=0)
+        port = server.sockets[0].getsockname()[1]
+
+        latencies = []
+        started = time.perf_counter()
+        async with server:
+            await asyncio.gather(*(client(port, requests, latencies, seed) for seed in range(clients)))
+        elapsed = time.perf_counter() - started
+
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        print(f"{n} pontos em {DAYS} dias, {clients} clientes x {requests} pedidos")
+        print(f"{len(latencies) / elapsed:,.0f} pedidos/s  p50 {p50:.1f} ms  p99 {p99:.1f} ms")
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    asyncio.run(run(clients, requests))
+
+
+if __name__ == "__main__":
+    main()
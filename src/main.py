@@ -4,19 +4,33 @@ from tkinter import ttk, messagebox
 import subprocess
 import threading
 
+# Módulos usados pelos scripts que não são ferramentas executáveis
+HELPER_MODULES = {
+    "artifact_cache.py",
+    "file_reader.py",
+    "gps_cleaning.py",
+    "heatmap_bins.py",
+    "history_stats.py",
+    "history_store.py",
+    "projection.py",
+    "resampling.py",
+    "reverse_geocoding.py",
+    "simplification.py",
+    "task_runner.py",
+    "tile_pyramid.py",
+    "trip_segmentation.py",
+}
+
 def list_available_scripts(directory="./src/utils"):
     """
     Lista os scripts Python disponíveis no diretório especificado.
     """
     scripts = {}
     try:
-        # Lista todos os arquivos no diretório e filtra os .py
-        files = [f for f in os.listdir(directory) if f.endswith(".py")]
+        # Lista todos os arquivos no diretório e filtra os .py, ignorando os módulos auxiliares
+        files = [f for f in os.listdir(directory) if f.endswith(".py") and f not in HELPER_MODULES]
         for i, file in enumerate(files, start=1):
             scripts[i] = os.path.join(directory, file)  # Mapeia o número ao caminho do arquivo
-        # Se o ficheiro for o "file_reader.py", remove-o da lista
-        if "file_reader.py" in scripts.values():
-            scripts.pop(list(scripts.keys())[list(scripts.values()).index("file_reader.py")])
 
     except FileNotFoundError:
         messagebox.showerror("Erro", f"O diretório {directory} não foi encontrado.")
@@ -61,6 +75,12 @@ def get_pretty_script_name(script_name):
         "locations_maps.py": "Mapas de Localizações",
         "line_remover.py": "Remoção de Linhas",
         "velocity_study.py": "Estudo de Velocidade",
+        "location_importers.py": "Importação de Histórico",
+        "excel_export.py": "Exportação para Excel",
+        "history_server.py": "Servidor de Histórico",
+        "geofence.py": "Zonas Geográficas",
+        "route_similarity.py": "Rotas Repetidas",
+        "track_archive.py": "Arquivo Comprimido",
     }
     # Se o nome não for mapeado, retorna o nome original sem a extensão .py
     return name_map.get(script_name, script_name.replace(".py", "").replace("_", " ").title())
@@ -102,6 +122,24 @@ class ScriptSelectorApp:
                                    
         Velocity Study:
         - Estudo sobre a velocidade do utilizador.
+
+        Location Importers:
+        - Importação de Takeout (JSON), GPX e KML para CSV.
+
+        Excel Export:
+        - Relatório xlsx com dados, paragens, viagens e combustível.
+
+        History Server:
+        - Servidor local com consultas ao histórico e mapa no navegador.
+
+        Geofence:
+        - Entradas, saídas e tempo de permanência em zonas (GeoJSON).
+
+        Route Similarity:
+        - Agrupamento das viagens que repetem a mesma rota.
+
+        Track Archive:
+        - Arquivo comprimido dos CSV, com leitura por intervalo de datas.
         """, 
         font=("Arial", 18), justify=tk.LEFT, anchor="nw", padx=8, pady=40)
         
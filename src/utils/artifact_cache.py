@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+CACHE_DIR = os.path.join("maps", "cache")
+MAX_CACHE_BYTES = 512 * 1024 * 1024  # 512 MB
+DIGEST_INDEX = "digests.json"
+
+_lock = threading.Lock()
+
+
+def code_version(*source_files):
+    """
+    Gera uma versão a partir do conteúdo dos ficheiros de código indicados,
+    para que qualquer alteração ao código invalide os artefactos antigos.
+    """
+    digest = hashlib.sha256()
+    for path in source_files:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+class ArtifactCache:
+    """
+    Cache de mapas e gráficos gerados, endereçada pelo conteúdo do ficheiro de entrada,
+    pelos parâmetros da análise e pela versão do código.
+
+    Os artefactos são guardados com nomes derivados da chave, por isso execuções em
+    paralelo sobre entradas diferentes nunca escrevem no mesmo ficheiro. Quando o
+    tamanho total ultrapassa max_bytes, os artefactos usados há mais tempo são apagados.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _load_digests(self):
+        try:
+            with open(os.path.join(self.directory, DIGEST_INDEX), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_digests(self, digests):
+        path = os.path.join(self.directory, DIGEST_INDEX)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(digests, f)
+        os.replace(tmp_path, path)
+
+    def file_digest(self, file_path):
+        """
+        SHA-256 do conteúdo do ficheiro. O resultado fica guardado por caminho, tamanho
+        e data de modificação, para não voltar a ler ficheiros grandes que não mudaram.
+        """
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        with _lock:
+            digests = self._load_digests()
+            entry = digests.get(file_path)
+            if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                return entry["sha256"]
+
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+
+        with _lock:
+            digests = self._load_digests()
+            digests[file_path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest.hexdigest()}
+            self._save_digests(digests)
+        return digest.hexdigest()
+
+    def key(self, input_path, params, version):
+        """
+        Chave do artefacto: hash do conteúdo da entrada + parâmetros + versão do código.
+        """
+        payload = json.dumps({
+            "input": self.file_digest(input_path),
+            "params": params,
+            "version": version,
+        }, sort_keys=True, default=str)
+        key = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:24]
+
+        # Regista a chave na entrada do ficheiro, para o evict saber quando a pode apagar
+        input_path = os.path.abspath(input_path)
+        with _lock:
+            digests = self._load_digests()
+            entry = digests.get(input_path)
+            if entry is not None and key not in entry.setdefault("keys", []):
+                entry["keys"].append(key)
+                self._save_digests(digests)
+        return key
+
+    def path(self, key, name):
+        return os.path.join(self.directory, f"{key}_{name}")
+
+    def lookup(self, key, names):
+        """
+        Devolve {nome: caminho} se todos os artefactos existirem, ou None.
+        Os artefactos encontrados são marcados como usados recentemente.
+        """
+        paths = {name: self.path(key, name) for name in names}
+        if not all(os.path.exists(path) for path in paths.values()):
+            return None
+        for path in paths.values():
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                # Apagado por outra execução entre a verificação e o utime
+                return None
+        return paths
+
+    @contextmanager
+    def writing(self, key, name):
+        """
+        Fornece um caminho temporário para escrever o artefacto, que só é publicado
+        com o nome final (de forma atómica) se a escrita terminar sem erros.
+        """
+        final_path = self.path(key, name)
+        base, ext = os.path.splitext(final_path)
+        tmp_path = f"{base}.tmp-{os.getpid()}-{threading.get_ident()}{ext}"
+        try:
+            yield tmp_path
+            os.replace(tmp_path, final_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def evict(self, keep=()):
+        """
+        Apaga os artefactos menos usados recentemente até o total caber em max_bytes,
+        e as entradas de digests.json cujas chaves ficaram todas sem artefactos ou
+        cujo ficheiro de entrada já não existe.
+        """
+        keep = {os.path.abspath(path) for path in keep}
+        entries = []
+        evicted = set()
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.is_file() or entry.name == DIGEST_INDEX or ".tmp" in entry.name:
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if os.path.abspath(path) in keep:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+                evicted.add(os.path.basename(path).split("_", 1)[0])
+            except FileNotFoundError:
+                pass
+
+        if not evicted:
+            return
+        with _lock:
+            digests = self._load_digests()
+            for input_path, entry in list(digests.items()):
+                keys = entry.get("keys", [])
+                if not os.path.exists(input_path):
+                    del digests[input_path]
+                    continue
+                if not evicted.intersection(keys):
+                    continue
+                entry["keys"] = [key for key in keys if key not in evicted]
+                if not entry["keys"]:
+                    del digests[input_path]
+            self._save_digests(digests)
@@ -4,6 +4,12 @@ import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
 from datetime import datetime
 from math import radians, sin, cos, sqrt, atan2
+from task_runner import ProgressPanel, CHUNK_SIZE
+from file_reader import parse_datetime
+from history_store import HistoryStore, device_from_path
+from trip_segmentation import build_trip_index
+from simplification import DEFAULT_TOLERANCE_M, format_report, simplify_track
+from gps_cleaning import clean_track, format_counts
 
 def list_csv_files(directory="data"):
     return [f for f in os.listdir(directory) if f.endswith(".csv")]
@@ -33,13 +39,31 @@ def haversine(lat1, lon1, lat2, lon2):
     c = 2 * atan2(sqrt(a), sqrt(1 - a))
     return R * c
 
-def process_csv(file_path, log_widget, preview_widget):
+def compact_track(df, tolerance_m):
+    """
+    Versão compacta (para arquivo) dos pontos limpos: só os pontos necessários para
+    reproduzir a trajetória com a tolerância dada. A distância de cada ponto passa a
+    ser a percorrida desde o ponto mantido anterior, por isso os totais não mudam.
+    """
+    keep, report = simplify_track(df["latitude"], df["longitude"], tolerance_m)
+    compact = df[keep].copy()
+    compact["distance_in_m"] = compact["total_distance"].diff().fillna(compact["distance_in_m"])
+    seconds = compact["datetime"].diff().dt.total_seconds().fillna(0)
+    compact["formatted_time"] = seconds.apply(lambda x: format_time(int(x)))
+    return compact, report
+
+def process_csv(file_path, panel, simplify_tolerance=None):
+    """
+    Limpeza do CSV, executada em segundo plano. Devolve o DataFrame limpo,
+    o caminho do ficheiro gerado e as dimensões antes/depois da limpeza.
+
+    :param simplify_tolerance: Se indicada (m), grava também uma versão compacta
+        ("compact_<ficheiro>.csv") com a trajetória simplificada.
+    """
     try:
         df_original = pd.read_csv(file_path)
     except Exception as e:
-        messagebox.showerror("Erro", f"Ocorreu um erro ao abrir o arquivo CSV: {e}")
-        messagebox.showinfo("Erro", "Open your CSV with Line_Remover")
-        return
+        raise ValueError(f"Ocorreu um erro ao abrir o arquivo CSV: {e}")
 
     rows_before = df_original.shape[0]
     columns_before = df_original.shape[1]
@@ -68,16 +92,12 @@ def process_csv(file_path, log_widget, preview_widget):
         df["date"] = df["datetime"].dt.strftime("%Y-%m-%d")
         df["time"] = df["datetime"].dt.strftime("%H:%M:%S")
     elif "date" in mapped_columns and "time" in mapped_columns:
-        df["datetime"] = pd.to_datetime(df[mapped_columns["date"]] + " " + df[mapped_columns["time"]], errors="coerce")
+        df["datetime"] = parse_datetime(df[mapped_columns["date"]] + " " + df[mapped_columns["time"]])
     else:
-        messagebox.showerror("Erro", "Não foi possível identificar corretamente as colunas de data e hora.")
-        messagebox.showinfo("Erro", "Open your CSV with Line_Remover")
-        return
+        raise ValueError("Não foi possível identificar corretamente as colunas de data e hora.")
 
     if "latitude" not in mapped_columns or "longitude" not in mapped_columns:
-        messagebox.showerror("Erro", "Colunas de latitude ou longitude ausentes.")
-        messagebox.showinfo("Erro", "Open your CSV with Line_Remover")
-        return
+        raise ValueError("Colunas de latitude ou longitude ausentes.")
 
     df = df.rename(columns={
         mapped_columns["latitude"]: "latitude",
@@ -87,29 +107,32 @@ def process_csv(file_path, log_widget, preview_widget):
     df = df[["latitude", "longitude", "date", "time", "datetime"]].dropna()
     df = df.sort_values(by="datetime").reset_index(drop=True)
 
-    # Remover duplicados
-    df = df.drop_duplicates(subset=["latitude", "longitude"], keep="first").reset_index(drop=True)
+    # Remover coordenadas inválidas, duplicados consecutivos e saltos fisicamente impossíveis
+    keep, rejected = clean_track(df["latitude"], df["longitude"], df["datetime"], panel)
+    df = df[keep].reset_index(drop=True)
 
-    # Filtrar por tempo >= 10 segundos
+    # Filtrar por tempo >= 10 segundos (em blocos, para reportar o progresso)
     filtered_rows = []
     last_time = None
-    for _, row in df.iterrows():
-        if last_time is None or (row["datetime"] - last_time).total_seconds() >= 10:
-            filtered_rows.append(row)
-            last_time = row["datetime"]
+    for start in panel.chunks(len(df), desc="Filtragem por tempo"):
+        for _, row in df.iloc[start:start + CHUNK_SIZE].iterrows():
+            if last_time is None or (row["datetime"] - last_time).total_seconds() >= 10:
+                filtered_rows.append(row)
+                last_time = row["datetime"]
 
     df = pd.DataFrame(filtered_rows)
 
     # Calcular tempos/distâncias
     time_distances = [0]
     distances = [0]
-    for i in range(1, len(df)):
-        time_diff = (df.iloc[i]["datetime"] - df.iloc[i - 1]["datetime"]).total_seconds()
-        time_distances.append(time_diff)
+    for start in panel.chunks(len(df), desc="Distâncias"):
+        for i in range(max(start, 1), min(start + CHUNK_SIZE, len(df))):
+            time_diff = (df.iloc[i]["datetime"] - df.iloc[i - 1]["datetime"]).total_seconds()
+            time_distances.append(time_diff)
 
-        lat1, lon1 = df.iloc[i - 1][["latitude", "longitude"]]
-        lat2, lon2 = df.iloc[i][["latitude", "longitude"]]
-        distances.append(haversine(lat1, lon1, lat2, lon2))
+            lat1, lon1 = df.iloc[i - 1][["latitude", "longitude"]]
+            lat2, lon2 = df.iloc[i][["latitude", "longitude"]]
+            distances.append(haversine(lat1, lon1, lat2, lon2))
 
     df["time_distance"] = time_distances
     df["distance_in_m"] = distances
@@ -125,12 +148,48 @@ def process_csv(file_path, log_widget, preview_widget):
 
     df["total_time"] = cumulative_times
     df["total_distance"] = df["distance_in_m"].cumsum()
+
+    # Acrescentar ao histórico particionado por dia, para consultas por intervalo de datas
+    device = device_from_path(file_path)
+    store = HistoryStore()
+    store_days = store.write(device, df, source=os.path.basename(file_path))
+
+    # Índice de viagens e paradas, para listar/filtrar viagens sem reler os pontos
+    output_file = os.path.join("data", "cleaned_" + os.path.basename(file_path))
+    trips, stops = build_trip_index(df, device, source=output_file)
+    store.write_stops(device, stops, store_days)
+
+    compact_file = simplification = None
+    if simplify_tolerance:
+        compact, simplification = compact_track(df, simplify_tolerance)
+        compact_file = os.path.join("data", "compact_" + os.path.basename(file_path))
+        compact.drop(columns=["datetime", "time_distance"]).to_csv(compact_file, index=False)
+
     df = df.drop(columns=["datetime", "time_distance"])
 
     # Salvar arquivo com nome correto
-    output_file = os.path.join("data", "cleaned_" + os.path.basename(file_path))
     df.to_csv(output_file, index=False)
 
+    report = {
+        "rows_before": rows_before,
+        "columns_before": columns_before,
+        "rejected": rejected,
+        "device": device,
+        "store_days": len(store_days),
+        "trips": len(trips),
+        "stops": len(stops),
+        "compact_file": compact_file,
+        "simplification": simplification,
+    }
+    return df, output_file, report
+
+def show_results(result, log_widget, preview_widget):
+    """
+    Executado no thread principal: atualiza o log e a pré-visualização.
+    """
+    df, output_file, report = result
+    rows_before = report["rows_before"]
+    columns_before = report["columns_before"]
     rows_after = df.shape[0]
     columns_after = df.shape[1]
 
@@ -139,7 +198,13 @@ def process_csv(file_path, log_widget, preview_widget):
     log_widget.insert(tk.END, f"\n✅ Arquivo salvo como: {output_file}\n")
     log_widget.insert(tk.END, f"🧹 Linhas eliminadas: {rows_before - rows_after}\n")
     log_widget.insert(tk.END, f"🧹 Colunas eliminadas: {columns_before - columns_after}\n")
+    log_widget.insert(tk.END, f"🛰️ Pontos rejeitados: {format_counts(report['rejected'])}\n")
     log_widget.insert(tk.END, f"📊 Linhas finais: {rows_after}, Colunas finais: {columns_after}\n")
+    log_widget.insert(tk.END, f"🗂️ Histórico '{report['device']}' atualizado: {report['store_days']} dia(s)\n")
+    log_widget.insert(tk.END, f"🚗 Viagens: {report['trips']}, Paradas: {report['stops']}\n")
+    if report["compact_file"]:
+        log_widget.insert(tk.END, f"🗜️ Versão compacta: {report['compact_file']}, "
+                                  f"{format_report(report['simplification'])}\n")
     log_widget.insert(tk.END, "-" * 50 + "\n")
     log_widget.configure(state='disabled')
 
@@ -168,17 +233,32 @@ def main_gui():
     combo = ttk.Combobox(root, values=csv_files, state="readonly", width=50)
     combo.pack(pady=5)
 
+    compact_var = tk.BooleanVar(value=False)
+    ttk.Checkbutton(root, text=f"Guardar também versão compacta (tolerância {DEFAULT_TOLERANCE_M:g} m)",
+                    variable=compact_var).pack(pady=5)
+
+    progress_panel = ProgressPanel(root)
+    progress_panel.pack(pady=5)
+
     log_text = scrolledtext.ScrolledText(root, wrap=tk.WORD, height=12, state='disabled')
     log_text.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
 
     preview_text = scrolledtext.ScrolledText(root, wrap=tk.WORD, height=15, state='disabled')
     preview_text.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
 
+    def show_error(error):
+        messagebox.showerror("Erro", str(error))
+        messagebox.showinfo("Erro", "Open your CSV with Line_Remover")
+
     def on_process():
         selected = combo.get()
         if selected:
             path = os.path.join("data", selected)
-            process_csv(path, log_text, preview_text)
+            progress_panel.submit(
+                process_csv, path, progress_panel, DEFAULT_TOLERANCE_M if compact_var.get() else None,
+                on_done=lambda result: show_results(result, log_text, preview_text),
+                on_error=show_error
+            )
         else:
             messagebox.showwarning("Aviso", "Por favor, selecione um arquivo.")
 
@@ -0,0 +1,201 @@
+import os
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
+import pandas as pd
+from openpyxl import Workbook
+from gas_study import fuel_summary
+from history_store import device_from_path
+from reverse_geocoding import ReverseGeocoder, label_stops, label_trips
+from task_runner import ProgressPanel, CHUNK_SIZE
+from trip_segmentation import load_stop_index, trip_index_for
+
+EXCEL_MAX_ROWS = 1048576  # limite de linhas de uma folha do Excel, incluindo o cabeçalho
+
+
+class SheetWriter:
+    """
+    Escreve linhas numa folha de um Workbook em modo write-only. Quando a folha chega
+    ao limite de linhas do Excel, continua numa nova folha ("Dados (2)", ...) com o
+    mesmo cabeçalho.
+    """
+
+    def __init__(self, workbook, title, header, max_rows=EXCEL_MAX_ROWS):
+        self.workbook = workbook
+        self.title = title
+        self.header = list(header)
+        self.max_rows = max_rows
+        self.sheets = 0
+        self.rows = 0
+        self._new_sheet()
+
+    def _new_sheet(self):
+        self.sheets += 1
+        title = self.title if self.sheets == 1 else f"{self.title} ({self.sheets})"
+        self.sheet = self.workbook.create_sheet(title=title)
+        self.sheet.append(self.header)
+        self._sheet_rows = 1
+
+    def append(self, row):
+        if self._sheet_rows >= self.max_rows:
+            self._new_sheet()
+        self.sheet.append(row)
+        self._sheet_rows += 1
+        self.rows += 1
+
+    def write_frame(self, df):
+        # NaN não é um valor válido no Excel: fica como célula vazia
+        df = df.astype(object).where(df.notna(), None)
+        for row in df.itertuples(index=False, name=None):
+            self.append(row)
+
+
+def export_report(csv_path, output_path, fuel_consumption, fuel_price, panel=None):
+    """
+    Exporta para xlsx os dados filtrados, as paradas, as viagens e o resumo de
+    combustível. O workbook é escrito em modo write-only: as linhas dos dados são lidas
+    do CSV em blocos e escritas à medida que são lidas, sem manter o livro em memória.
+
+    :return: Dicionário com o número de linhas escritas por tabela.
+    """
+    device = device_from_path(csv_path)
+    trips = trip_index_for(csv_path).reset_index()
+    stops = load_stop_index(device)
+    geocoder = ReverseGeocoder.default()
+    if geocoder is not None:
+        # Nomes dos lugares das paradas e dos inícios/fins das viagens (gazetteer local)
+        stops = label_stops(stops, geocoder)
+        trips = label_trips(trips, geocoder)
+
+    workbook = Workbook(write_only=True)
+    total_bytes = os.path.getsize(csv_path)
+    bar = panel.progress(total=total_bytes, desc="Dados") if panel else None
+
+    data_sheet = None
+    daily_distance = {}
+    with open(csv_path, "rb") as f:
+        for chunk in pd.read_csv(f, chunksize=CHUNK_SIZE):
+            chunk.columns = chunk.columns.str.strip()
+            if data_sheet is None:
+                if "distance_in_m" not in chunk.columns or "date" not in chunk.columns:
+                    raise ValueError("Colunas 'distance_in_m' ou 'date' não encontradas.")
+                data_sheet = SheetWriter(workbook, "Dados", chunk.columns)
+            data_sheet.write_frame(chunk)
+
+            # Distância por dia para o resumo de combustível
+            distance = pd.to_numeric(chunk["distance_in_m"], errors="coerce").fillna(0)
+            for date, meters in distance.groupby(chunk["date"]).sum().items():
+                daily_distance[date] = daily_distance.get(date, 0) + meters
+            if bar is not None:
+                bar.update(f.tell() - bar.n)
+
+    if data_sheet is None:
+        raise ValueError("O arquivo CSV não contém dados.")
+
+    SheetWriter(workbook, "Paragens", stops.columns).write_frame(stops)
+
+    trips["fuel_l"] = trips["distance_m"] / 1000 / fuel_consumption
+    trips["fuel_cost"] = trips["fuel_l"] * fuel_price
+    SheetWriter(workbook, "Viagens", trips.columns).write_frame(trips)
+
+    fuel = SheetWriter(workbook, "Combustível", ["date", "distance_km", "fuel_l", "cost"])
+    for date, meters in daily_distance.items():
+        fuel.append([date, *fuel_summary(meters, fuel_consumption, fuel_price)])
+    fuel.append(["Total", *fuel_summary(sum(daily_distance.values()), fuel_consumption, fuel_price)])
+
+    workbook.save(output_path)
+    if bar is not None:
+        bar.close()
+    return {
+        "output_path": output_path,
+        "data_rows": data_sheet.rows,
+        "data_sheets": data_sheet.sheets,
+        "stops": len(stops),
+        "trips": len(trips),
+    }
+
+
+def main_gui():
+    root = tk.Tk()
+    root.title("Exportação de Relatórios para Excel")
+    root.attributes("-fullscreen", True)
+    root.resizable(False, False)
+
+    description = """
+Exporte um CSV filtrado para um livro Excel com as folhas:
+- Dados: os pontos filtrados (divididos em várias folhas se passarem o limite do Excel);
+- Paragens e Viagens: as tabelas de paradas e viagens;
+- Combustível: distância, combustível e custo por dia e no total.
+
+Instruções:
+1. Selecione um arquivo CSV filtrado.
+2. Informe o consumo do veículo (km/l) e o preço do combustível (€/l).
+3. Clique em "Exportar" e escolha onde guardar o ficheiro .xlsx.
+"""
+    label_description = tk.Label(root, text=description, font=("Arial", 18), justify="left", padx=0, pady=5)
+    label_description.pack(fill=tk.BOTH, expand=False, padx=0, pady=50)
+
+    frame = ttk.Frame(root, padding=50)
+    frame.pack(expand=False)
+
+    selected_file = tk.StringVar()
+
+    def browse_file():
+        filename = filedialog.askopenfilename(
+            title="Escolha um arquivo CSV",
+            filetypes=[("CSV files", "*.csv")],
+            initialdir="data"
+        )
+        if filename:
+            selected_file.set(filename)
+
+    def show_result(result):
+        messagebox.showinfo("Sucesso",
+            f"Relatório salvo como: {result['output_path']}\n"
+            f"Linhas de dados: {result['data_rows']} ({result['data_sheets']} folha(s))\n"
+            f"Paragens: {result['stops']}\n"
+            f"Viagens: {result['trips']}"
+        )
+
+    def run_export():
+        try:
+            fuel_cons = float(entry_consumo.get())
+            fuel_price = float(entry_preco.get())
+        except ValueError:
+            messagebox.showerror("Erro", "Consumo e preço devem ser números válidos.")
+            return
+        csv_path = selected_file.get()
+        if not csv_path:
+            messagebox.showwarning("Atenção", "Selecione um arquivo CSV.")
+            return
+        output_path = filedialog.asksaveasfilename(
+            title="Guardar relatório",
+            defaultextension=".xlsx",
+            filetypes=[("Excel", "*.xlsx")],
+            initialfile=f"relatorio_{device_from_path(csv_path)}.xlsx"
+        )
+        if output_path:
+            progress_panel.submit(export_report, csv_path, output_path, fuel_cons, fuel_price, progress_panel,
+                                  on_done=show_result)
+
+    ttk.Label(frame, text="Arquivo CSV:").grid(row=0, column=0, sticky="w")
+    ttk.Entry(frame, textvariable=selected_file, width=50).grid(row=0, column=1)
+    ttk.Button(frame, text="Procurar", command=browse_file).grid(row=0, column=2, padx=5)
+
+    ttk.Label(frame, text="Consumo (km/l):").grid(row=1, column=0, sticky="w", pady=(10, 0))
+    entry_consumo = ttk.Entry(frame)
+    entry_consumo.grid(row=1, column=1, pady=(10, 0))
+
+    ttk.Label(frame, text="Preço do Combustível (€/l):").grid(row=2, column=0, sticky="w", pady=(10, 0))
+    entry_preco = ttk.Entry(frame)
+    entry_preco.grid(row=2, column=1, pady=(10, 0))
+
+    ttk.Button(frame, text="Exportar", command=run_export).grid(row=3, column=1, pady=20)
+
+    progress_panel = ProgressPanel(frame)
+    progress_panel.grid(row=4, column=0, columnspan=3)
+
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    main_gui()
@@ -1,5 +1,18 @@
 import pandas as pd
 
+def parse_datetime(values):
+    """
+    Converte texto de data/hora em datetime. Datas ISO (AAAA-MM-DD) são lidas como tal;
+    as restantes são lidas com o dia primeiro (DD-MM-AAAA), como nos CSV dos registadores.
+
+    :param values: Série de texto com data e hora.
+    :return: Série datetime (NaT quando não é possível converter).
+    """
+    values = values.astype(str).str.strip()
+    if values.str.match(r"^\d{4}-").all():
+        return pd.to_datetime(values, format="ISO8601", errors="coerce")
+    return pd.to_datetime(values, dayfirst=True, errors="coerce")
+
 def read_coordinates(file_path, include_timestamps=False):
     """
     Lê as coordenadas de um arquivo CSV.
@@ -24,9 +37,8 @@ def read_coordinates(file_path, include_timestamps=False):
         
         if include_timestamps:
             # Combinar 'date' e 'time' em um único timestamp no formato ISO 8601
-            df['timestamp'] = pd.to_datetime(df['date'] + ' ' + df['time'], dayfirst=True).dt.strftime('%Y-%m-%dT%H:%M:%S')
+            df['timestamp'] = parse_datetime(df['date'] + ' ' + df['time']).dt.strftime('%Y-%m-%dT%H:%M:%S')
             timestamps = df['timestamp'].tolist()
-            print("Timestamps gerados:", timestamps)  # Debugging line
             return coordinates, timestamps
         return coordinates
     except Exception as e:
@@ -8,6 +8,14 @@ from datetime import datetime
 def list_csv_files(directory="data"):
     return [f for f in os.listdir(directory) if f.endswith(".csv")]
 
+def fuel_summary(total_distance_m, fuel_consumption, fuel_price):
+    """
+    Distância (km), combustível consumido (l) e custo (€) para uma distância em metros.
+    """
+    total_distance = total_distance_m / 1000
+    fuel_consumed = total_distance / fuel_consumption
+    return total_distance, fuel_consumed, fuel_consumed * fuel_price
+
 def process_csv(csv_path, fuel_consumption, fuel_price):
     df = pd.read_csv(csv_path)
     df.columns = df.columns.str.strip()
@@ -19,9 +27,7 @@ def process_csv(csv_path, fuel_consumption, fuel_price):
     df["distance_in_m"] = pd.to_numeric(df["distance_in_m"], errors="coerce")
     df.dropna(subset=["distance_in_m"], inplace=True)
 
-    total_distance = df["distance_in_m"].sum() / 1000
-    fuel_consumed = total_distance / fuel_consumption
-    custo_total = fuel_consumed * fuel_price
+    total_distance, fuel_consumed, custo_total = fuel_summary(df["distance_in_m"].sum(), fuel_consumption, fuel_price)
 
     df["time"] = pd.to_datetime(df["time"], errors="coerce")
     df.dropna(subset=["time"], inplace=True)
@@ -48,36 +54,36 @@ def process_csv(csv_path, fuel_consumption, fuel_price):
         f"Custo total: {custo_total:.2f} €"
     )
 
-def browse_file():
-    filename = filedialog.askopenfilename(
-        title="Escolha um arquivo CSV",
-        filetypes=[("CSV files", "*.csv")],
-        initialdir="data"
-    )
-    if filename:
-        selected_file.set(filename)
-
-def run_analysis():
-    try:
-        fuel_cons = float(entry_consumo.get())
-        fuel_price = float(entry_preco.get())
-        filepath = selected_file.get()
-        if not filepath:
-            messagebox.showwarning("Atenção", "Selecione um arquivo CSV.")
-            return
-        process_csv(filepath, fuel_cons, fuel_price)
-    except ValueError:
-        messagebox.showerror("Erro", "Consumo e preço devem ser números válidos.")
-
-# GUI
-root = tk.Tk()
-root.title("Analisador de Consumo de Combustível")
-root.geometry("575x350")
-root.attributes("-fullscreen", True)
-root.resizable(False, False)
-
-# Adicionando o tutorial/descrição
-description = """
+def main_gui():
+    def browse_file():
+        filename = filedialog.askopenfilename(
+            title="Escolha um arquivo CSV",
+            filetypes=[("CSV files", "*.csv")],
+            initialdir="data"
+        )
+        if filename:
+            selected_file.set(filename)
+
+    def run_analysis():
+        try:
+            fuel_cons = float(entry_consumo.get())
+            fuel_price = float(entry_preco.get())
+            filepath = selected_file.get()
+            if not filepath:
+                messagebox.showwarning("Atenção", "Selecione um arquivo CSV.")
+                return
+            process_csv(filepath, fuel_cons, fuel_price)
+        except ValueError:
+            messagebox.showerror("Erro", "Consumo e preço devem ser números válidos.")
+
+    root = tk.Tk()
+    root.title("Analisador de Consumo de Combustível")
+    root.geometry("575x350")
+    root.attributes("-fullscreen", True)
+    root.resizable(False, False)
+
+    # Adicionando o tutorial/descrição
+    description = """
 Aqui pode analisar dados de consumo de combustível registrados em um arquivo CSV. 
 Através dos dados de distância percorrida e tempo, ele calcula o consumo total de combustível e o custo 
 acumulado ao longo do tempo, considerando o consumo de combustível e o preço fornecido pelo utilizador. 
@@ -93,27 +99,30 @@ Entre com os dados no formulário abaixo e clique em "Analisar" para começar a
 [Recomenda-se filtrar os dados antes de usar esta funcionalidade]
 """
 
-label_description = tk.Label(root, text=description, font=("Arial", 18), justify="left", padx=0, pady=5)
-label_description.pack(fill=tk.BOTH, expand=False, padx=0, pady=50)
+    label_description = tk.Label(root, text=description, font=("Arial", 18), justify="left", padx=0, pady=5)
+    label_description.pack(fill=tk.BOTH, expand=False, padx=0, pady=50)
+
+    # Centralizando o frame
+    frame = ttk.Frame(root, padding=50)
+    frame.pack(expand=False)
 
-# Centralizando o frame
-frame = ttk.Frame(root, padding=50)
-frame.pack(expand=False)
+    selected_file = tk.StringVar()
 
-selected_file = tk.StringVar()
+    ttk.Label(frame, text="Arquivo CSV:").grid(row=0, column=0, sticky="w")
+    ttk.Entry(frame, textvariable=selected_file, width=50).grid(row=0, column=1)
+    ttk.Button(frame, text="Procurar", command=browse_file).grid(row=0, column=2, padx=5)
 
-ttk.Label(frame, text="Arquivo CSV:").grid(row=0, column=0, sticky="w")
-ttk.Entry(frame, textvariable=selected_file, width=50).grid(row=0, column=1)
-ttk.Button(frame, text="Procurar", command=browse_file).grid(row=0, column=2, padx=5)
+    ttk.Label(frame, text="Consumo (km/l):").grid(row=1, column=0, sticky="w", pady=(10, 0))
+    entry_consumo = ttk.Entry(frame)
+    entry_consumo.grid(row=1, column=1, pady=(10, 0))
 
-ttk.Label(frame, text="Consumo (km/l):").grid(row=1, column=0, sticky="w", pady=(10, 0))
-entry_consumo = ttk.Entry(frame)
-entry_consumo.grid(row=1, column=1, pady=(10, 0))
+    ttk.Label(frame, text="Preço do Combustível (€/l):").grid(row=2, column=0, sticky="w", pady=(10, 0))
+    entry_preco = ttk.Entry(frame)
+    entry_preco.grid(row=2, column=1, pady=(10, 0))
 
-ttk.Label(frame, text="Preço do Combustível (€/l):").grid(row=2, column=0, sticky="w", pady=(10, 0))
-entry_preco = ttk.Entry(frame)
-entry_preco.grid(row=2, column=1, pady=(10, 0))
+    ttk.Button(frame, text="Analisar", command=run_analysis).grid(row=3, column=1, pady=20)
 
-ttk.Button(frame, text="Analisar", command=run_analysis).grid(row=3, column=1, pady=20)
+    root.mainloop()
 
-root.mainloop()
+if __name__ == "__main__":
+    main_gui()
@@ -0,0 +1,235 @@
+import json
+import os
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox, scrolledtext
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import shape
+from history_store import device_from_path
+from task_runner import ProgressPanel
+from trip_segmentation import load_track
+
+GEOFENCE_DIR = os.path.join("data", "geofence")
+# Pontos por bloco na consulta à árvore: blocos grandes aproveitam melhor a vetorização do shapely
+GEOFENCE_CHUNK_SIZE = 100000
+
+
+def load_zones(geojson_path):
+    """
+    Lê as zonas (Polygon/MultiPolygon) de um GeoJSON. O nome de cada zona vem da
+    propriedade "name" (ou "nome"/"id"); sem nome, fica "zona_<n>".
+
+    :return: (nomes, array de geometrias shapely), pela mesma ordem.
+    """
+    with open(geojson_path, encoding="utf-8") as f:
+        data = json.load(f)
+
+    features = data["features"] if data.get("type") == "FeatureCollection" else [data]
+    names, geometries = [], []
+    for i, feature in enumerate(features):
+        geometry = shape(feature["geometry"] if feature.get("type") == "Feature" else feature)
+        if geometry.geom_type not in ("Polygon", "MultiPolygon"):
+            continue
+        properties = feature.get("properties") or {}
+        name = properties.get("name", properties.get("nome", properties.get("id", feature.get("id"))))
+        names.append(str(name) if name is not None else f"zona_{i}")
+        geometries.append(geometry)
+
+    if not geometries:
+        raise ValueError("O GeoJSON não contém polígonos.")
+    return names, np.array(geometries, dtype=object)
+
+
+class GeofenceIndex:
+    """
+    Índice espacial (STRtree) das zonas. A árvore filtra as zonas cujo retângulo
+    envolvente contém cada ponto e o predicado "intersects" vetorizado do shapely 2
+    confirma só esses pares, por isso o custo cresce pouco com o número de zonas.
+    """
+
+    def __init__(self, names, geometries):
+        self.names = list(names)
+        self.geometries = np.asarray(geometries, dtype=object)
+        shapely.prepare(self.geometries)
+        self.tree = shapely.STRtree(self.geometries)
+
+    def assign(self, lat, lon):
+        """
+        Pares (ponto, zona) para os pontos dentro (ou na fronteira) de cada zona. Um
+        ponto pode pertencer a várias zonas sobrepostas.
+
+        :return: (índices dos pontos, índices das zonas), dois arrays do mesmo tamanho.
+        """
+        points = shapely.points(np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64))
+        point_idx, zone_idx = self.tree.query(points, predicate="intersects")
+        return point_idx, zone_idx
+
+
+def zone_visits(times, point_idx, zone_idx, names):
+    """
+    Eventos de entrada/saída: cada visita é uma sequência de pontos consecutivos dentro
+    da mesma zona. A entrada é o primeiro ponto dentro e a saída o último, e o tempo de
+    permanência é a diferença entre os dois.
+
+    :param times: Datas de todos os pontos (datetime64), pela ordem da trajetória.
+    """
+    columns = ["zone", "enter_row", "exit_row", "enter_time", "exit_time", "n_points", "dwell_s"]
+    if len(point_idx) == 0:
+        return pd.DataFrame(columns=columns)
+
+    order = np.lexsort((point_idx, zone_idx))
+    point_idx, zone_idx = point_idx[order], zone_idx[order]
+
+    # Uma visita começa quando muda a zona ou há um salto nos pontos (o veículo saiu)
+    new_visit = np.ones(len(point_idx), dtype=bool)
+    new_visit[1:] = (zone_idx[1:] != zone_idx[:-1]) | (point_idx[1:] != point_idx[:-1] + 1)
+    starts = np.flatnonzero(new_visit)
+    ends = np.append(starts[1:], len(point_idx)) - 1
+
+    times = np.asarray(times)
+    enter_row, exit_row = point_idx[starts], point_idx[ends]
+    visits = pd.DataFrame({
+        "zone": np.asarray(names, dtype=object)[zone_idx[starts]],
+        "enter_row": enter_row,
+        "exit_row": exit_row,
+        "enter_time": times[enter_row],
+        "exit_time": times[exit_row],
+        "n_points": ends - starts + 1,
+        "dwell_s": (times[exit_row] - times[enter_row]) / np.timedelta64(1, "s"),
+    })
+    return visits.sort_values("enter_row", kind="stable").reset_index(drop=True)[columns]
+
+
+def dwell_summary(visits):
+    """
+    Tempo de permanência por zona: número de visitas, tempo total e médio.
+    """
+    summary = visits.groupby("zone").agg(
+        visits=("dwell_s", "size"),
+        dwell_s=("dwell_s", "sum"),
+        mean_dwell_s=("dwell_s", "mean"),
+        first_enter=("enter_time", "min"),
+        last_exit=("exit_time", "max"),
+    )
+    return summary.sort_values("dwell_s", ascending=False)
+
+
+def locate_points(index, lat, lon, panel=None, chunk_size=GEOFENCE_CHUNK_SIZE):
+    """
+    index.assign em blocos, para reportar o progresso e permitir cancelar.
+    """
+    lat, lon = np.asarray(lat), np.asarray(lon)
+    starts = panel.chunks(len(lat), desc="Zonas", chunk_size=chunk_size) if panel else range(0, len(lat), chunk_size)
+    point_parts, zone_parts = [], []
+    for start in starts:
+        point_idx, zone_idx = index.assign(lat[start:start + chunk_size], lon[start:start + chunk_size])
+        point_parts.append(point_idx + start)
+        zone_parts.append(zone_idx)
+    if not point_parts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(point_parts), np.concatenate(zone_parts)
+
+
+def geofence_paths(device, directory=GEOFENCE_DIR):
+    return (os.path.join(directory, f"{device}_visits.csv"),
+            os.path.join(directory, f"{device}_dwell.csv"))
+
+
+def analyze_geofences(csv_path, geojson_path, panel=None):
+    """
+    Cruza a trajetória de um CSV filtrado com as zonas de um GeoJSON e guarda as
+    visitas (entradas/saídas) e o tempo de permanência por zona em data/geofence.
+
+    :return: (visitas, resumo por zona, caminhos dos CSV gerados).
+    """
+    df = load_track(csv_path)
+    names, geometries = load_zones(geojson_path)
+    index = GeofenceIndex(names, geometries)
+
+    point_idx, zone_idx = locate_points(index, df["latitude"], df["longitude"], panel)
+    visits = zone_visits(df["datetime"].to_numpy(), point_idx, zone_idx, names)
+    summary = dwell_summary(visits)
+
+    visits_path, dwell_path = geofence_paths(device_from_path(csv_path))
+    os.makedirs(GEOFENCE_DIR, exist_ok=True)
+    visits.to_csv(visits_path, index=False)
+    summary.to_csv(dwell_path)
+    return visits, summary, (visits_path, dwell_path)
+
+
+def format_duration(seconds):
+    hours, remainder = divmod(int(seconds), 3600)
+    return f"{hours}h{remainder // 60:02d}m"
+
+
+def main_gui():
+    root = tk.Tk()
+    root.title("Zonas Geográficas (Geofencing)")
+    root.attributes("-fullscreen", True)
+    root.resizable(False, False)
+
+    description = """
+Calcule as entradas, saídas e o tempo de permanência em zonas (armazéns, clientes,
+zonas restritas) definidas num ficheiro GeoJSON com polígonos.
+
+Instruções:
+1. Selecione um arquivo CSV filtrado.
+2. Selecione o GeoJSON das zonas (o nome de cada zona vem da propriedade "name").
+3. Clique em "Analisar Zonas". As visitas e o resumo por zona ficam em 'data/geofence'.
+"""
+    label_description = tk.Label(root, text=description, font=("Arial", 18), justify="left", padx=10, pady=40)
+    label_description.pack(fill=tk.BOTH, padx=30, pady=0)
+
+    frame = ttk.Frame(root, padding=10)
+    frame.pack()
+
+    selected_file = tk.StringVar()
+    selected_zones = tk.StringVar()
+
+    def browse(variable, title, filetypes, initialdir=None):
+        filename = filedialog.askopenfilename(title=title, filetypes=filetypes, initialdir=initialdir)
+        if filename:
+            variable.set(filename)
+
+    log_text = scrolledtext.ScrolledText(root, wrap=tk.WORD, height=15, state='disabled')
+    log_text.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
+
+    def show_result(result):
+        visits, summary, (visits_path, dwell_path) = result
+        log_text.configure(state='normal')
+        log_text.insert(tk.END, f"\n📍 Visitas: {len(visits)} em {len(summary)} zona(s)\n")
+        for zone, row in summary.iterrows():
+            log_text.insert(tk.END, f"  {zone}: {row['visits']} visita(s), {format_duration(row['dwell_s'])} no total, "
+                                    f"{format_duration(row['mean_dwell_s'])} em média\n")
+        log_text.insert(tk.END, f"✅ Arquivos salvos como: {visits_path}, {dwell_path}\n")
+        log_text.insert(tk.END, "-" * 50 + "\n")
+        log_text.configure(state='disabled')
+
+    def start_analysis():
+        csv_path, geojson_path = selected_file.get(), selected_zones.get()
+        if not csv_path or not geojson_path:
+            messagebox.showerror("Erro", "Selecione o arquivo CSV e o GeoJSON das zonas.")
+            return
+        progress_panel.submit(analyze_geofences, csv_path, geojson_path, progress_panel, on_done=show_result)
+
+    ttk.Label(frame, text="Arquivo CSV:").grid(row=0, column=0, sticky="w")
+    ttk.Entry(frame, textvariable=selected_file, width=50).grid(row=0, column=1)
+    ttk.Button(frame, text="Procurar", command=lambda: browse(
+        selected_file, "Escolha um arquivo CSV", [("CSV files", "*.csv")], "data")).grid(row=0, column=2, padx=5)
+
+    ttk.Label(frame, text="Zonas (GeoJSON):").grid(row=1, column=0, sticky="w")
+    ttk.Entry(frame, textvariable=selected_zones, width=50).grid(row=1, column=1)
+    ttk.Button(frame, text="Procurar", command=lambda: browse(
+        selected_zones, "Escolha o GeoJSON das zonas", [("GeoJSON", "*.geojson *.json")])).grid(row=1, column=2, padx=5)
+
+    ttk.Button(frame, text="Analisar Zonas", command=start_analysis).grid(row=2, column=1, pady=20)
+
+    progress_panel = ProgressPanel(frame)
+    progress_panel.grid(row=3, column=0, columnspan=3)
+
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    main_gui()
@@ -0,0 +1,276 @@
+import numpy as np
+import pandas as pd
+from history_store import to_epoch
+
+DUPLICATE_TOLERANCE_M = 2.0  # pontos mais próximos do que isto do último ponto mantido são o mesmo ponto
+# Períodos parados (como em stopping_study.find_stops) mantidos inteiros pela regra "duplicate"
+STOP_SPEED_KMH = 4
+MIN_STOP_SECONDS = 5 * 60
+STOP_WINDOW_S = 10  # janela da velocidade nas paradas, igual à filtragem por tempo do data_filter
+MAX_SPEED_KMH = 250.0  # velocidade máxima plausível para um veículo
+MAX_ACCELERATION_MS2 = 12.0  # aceleração/travagem máxima plausível (~1.2 g)
+MAX_PASSES = 10  # passagens das regras de velocidade/aceleração
+MAX_EXCURSION_POINTS = 10  # maior salto (em pontos) removido pela regra de velocidade
+CLEANING_CHUNK_SIZE = 100000
+EARTH_RADIUS_M = 6371000
+# Regras aplicadas, pela ordem do relatório
+RULES = ["invalid", "duplicate", "speed", "acceleration"]
+JUMP_RULES = ["speed", "acceleration"]
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """
+    Distância (m) entre arrays de pontos, pela fórmula de haversine.
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _segment_speeds(lat, lon, epoch):
+    """
+    Velocidade (m/s) e intervalo (s) de cada ponto desde o anterior; o primeiro fica a 0.
+    """
+    dt = np.diff(epoch).astype(np.float64)
+    distance = haversine_m(lat[:-1], lon[:-1], lat[1:], lon[1:])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        speed = np.where(dt > 0, distance / dt, np.inf)
+    return np.concatenate([[0.0], speed]), np.concatenate([[0.0], dt])
+
+
+def _excursions(lat, lon, epoch, too_fast, max_speed, max_points):
+    """
+    Pontos em excursões: sequências curtas (até max_points) a que se chega e de que se sai
+    a velocidades impossíveis, e que podem ser saltadas (do ponto antes ao ponto depois) a
+    uma velocidade plausível. Um pico isolado é uma excursão de um só ponto.
+    """
+    run = np.cumsum(too_fast)  # cada transição impossível começa uma nova sequência
+    n_runs = run[-1] + 1
+    lengths = np.bincount(run, minlength=n_runs)
+    first = np.searchsorted(run, np.arange(n_runs))
+    last = first + lengths - 1
+
+    ids = np.arange(n_runs)
+    candidates = ids[(ids > 0) & (ids < n_runs - 1) & (lengths <= max_points)]
+    before, after = first[candidates] - 1, last[candidates] + 1
+    gap = np.maximum(epoch[after] - epoch[before], 1)
+    bridge = haversine_m(lat[before], lon[before], lat[after], lon[after]) / gap
+    return np.isin(run, candidates[bridge <= max_speed])
+
+
+def invalid_coordinates(lat, lon):
+    """
+    Coordenadas em falta, fora do intervalo válido ou (0, 0).
+    """
+    return ~np.isfinite(lat) | ~np.isfinite(lon) | (np.abs(lat) > 90) | (np.abs(lon) > 180) | ((lat == 0) & (lon == 0))
+
+
+def stationary_points(lat, lon, epoch, rows, stop_speed_kmh=STOP_SPEED_KMH, min_stop_s=MIN_STOP_SECONDS,
+                      window_s=STOP_WINDOW_S):
+    """
+    Pontos de rows (índices válidos, por ordem) em períodos parados: sequências a no máximo
+    stop_speed_kmh que duram pelo menos min_stop_s, como em stopping_study.find_stops.
+    A velocidade é medida desde o ponto de há window_s segundos, para que o ruído de GPS
+    em registos de 1 Hz não interrompa a parada.
+    São mantidos pela regra "duplicate" para que as paradas continuem a ser encontradas.
+    """
+    stationary = np.zeros(len(lat), dtype=bool)
+    if len(rows) < 2:
+        return stationary
+    lat_r, lon_r, epoch_r = lat[rows], lon[rows], epoch[rows]
+    back = np.maximum(np.searchsorted(epoch_r, epoch_r - window_s, side="right") - 1, 0)
+    back = np.minimum(back, np.maximum(np.arange(len(rows)) - 1, 0))
+    elapsed = epoch_r - epoch_r[back]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        speed = np.where(elapsed > 0, haversine_m(lat_r[back], lon_r[back], lat_r, lon_r) / elapsed, np.inf)
+
+    slow = np.concatenate([[0], (speed[1:] * 3.6 <= stop_speed_kmh).astype(np.int8), [0]])
+    edges = np.diff(slow)
+    # Um ponto lento k chega de rows[k - 1]: o período vai do ponto antes do primeiro ao último
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    long_enough = epoch_r[ends] - epoch_r[starts] >= min_stop_s
+    cover = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.add.at(cover, starts[long_enough], 1)
+    np.add.at(cover, ends[long_enough] + 1, -1)
+    stationary[rows[np.cumsum(cover[:-1]) > 0]] = True
+    return stationary
+
+
+def _next_kept(x, y, t, exempt, tolerance2):
+    """
+    Para cada posição p, a primeira posição seguinte que seria mantida com p como âncora
+    (avança no tempo e está a pelo menos a tolerância de p, ou é isenta), ou len(x).
+    Vetorizado por desvio: em cada passo compara todas as posições ainda por resolver com
+    a posição desvio pontos à frente, por isso o número de passos é a maior sequência de
+    duplicados e não o número de pontos.
+    """
+    m = len(x)
+    next_kept = np.full(m, m, dtype=np.int64)
+    pending = np.arange(m - 1)
+    offset = 1
+    while len(pending):
+        pending = pending[pending + offset < m]
+        candidate = pending + offset
+        found = (t[candidate] > t[pending]) & (
+            exempt[candidate] | ((x[candidate] - x[pending]) ** 2 + (y[candidate] - y[pending]) ** 2 >= tolerance2))
+        next_kept[pending[found]] = candidate[found]
+        pending = pending[~found]
+        offset += 1
+    return next_kept
+
+
+def _chain(next_kept, start):
+    """
+    Posições start, next_kept[start], next_kept[next_kept[start]], ... por saltos a dobrar
+    (tabelas de 1, 2, 4, ... saltos), sem percorrer a cadeia ponto a ponto.
+    """
+    m = len(next_kept)
+    jump = np.append(next_kept, m)  # o fim aponta para si próprio
+    tables = [jump]
+    while 1 << len(tables) <= m:
+        jump = jump[jump]
+        tables.append(jump)
+    chain = np.array([start])
+    for jump in reversed(tables):
+        chain = np.union1d(chain, jump[chain])
+    return chain[chain < m]
+
+
+def mark_duplicates(lat, lon, epoch, keep, rows, anchor=None, exempt=None, tolerance_m=DUPLICATE_TOLERANCE_M):
+    """
+    Regra "duplicate" sobre rows (índices por ordem, num bloco): um ponto a menos de
+    tolerance_m do último ponto mantido (a âncora), ou sem avançar no tempo, é desmarcado
+    em keep. Comparar com a âncora, e não com o ponto anterior, impede que uma trajetória
+    lenta e densa se reduza a um só ponto. Pontos em exempt (ver stationary_points) só são
+    removidos se não avançarem no tempo.
+
+    A escolha de cada âncora depende da anterior; para não a fazer ponto a ponto, calcula-se
+    com arrays o ponto mantido a seguir a cada ponto (_next_kept) e segue-se a cadeia a
+    partir da âncora por saltos a dobrar (_chain).
+
+    :param anchor: Âncora devolvida pelo bloco anterior, ou None.
+    :return: (âncora para o bloco seguinte, número de pontos removidos neste bloco).
+    """
+    if len(rows) == 0:
+        return anchor, 0
+    # Coordenadas locais em metros (equirretangular): exatas à escala da tolerância
+    y = np.radians(lat[rows]) * EARTH_RADIUS_M
+    x = np.radians(lon[rows]) * EARTH_RADIUS_M * np.cos(np.radians(lat[rows]))
+    t = epoch[rows]
+    is_exempt = exempt[rows] if exempt is not None else np.zeros(len(rows), dtype=bool)
+    if anchor is not None:
+        # A âncora do bloco anterior entra como posição 0 e não é marcada de novo
+        x, y, t = np.append(anchor[0], x), np.append(anchor[1], y), np.append(anchor[2], t)
+        is_exempt = np.append(False, is_exempt)
+
+    kept = _chain(_next_kept(x, y, t, is_exempt, tolerance_m ** 2), 0)
+    last = kept[-1]
+    if anchor is not None:
+        kept = kept[1:] - 1
+    removed = np.ones(len(rows), dtype=bool)
+    removed[kept] = False
+    keep[rows[removed]] = False
+    return (float(x[last]), float(y[last]), int(t[last])), int(removed.sum())
+
+
+def reject_jumps(lat, lon, epoch, locked=0, max_speed_kmh=MAX_SPEED_KMH, max_acceleration=MAX_ACCELERATION_MS2):
+    """
+    Regras "speed" e "acceleration" sobre pontos válidos ordenados por epoch:
+    - speed: saltos (teleportes) de um ou mais pontos, com ida e volta acima de max_speed_kmh;
+    - acceleration: ponto cuja velocidade sobe e volta a descer mais depressa do que
+      max_acceleration permite (pico de velocidade abaixo do limite de velocidade).
+    As regras repetem-se até nada mudar. Cada passagem é vetorizada.
+
+    :param locked: Número de pontos iniciais já aceites (contexto do bloco anterior), nunca removidos.
+    :return: Regra que removeu cada ponto (índice em JUMP_RULES), ou -1 para os pontos mantidos.
+    """
+    lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+    epoch = np.asarray(epoch, dtype=np.int64)
+    n = len(lat)
+    rejected_by = np.full(n, -1, dtype=np.int8)
+    keep = np.ones(n, dtype=bool)
+    removable = np.arange(n) >= locked
+
+    max_speed = max_speed_kmh / 3.6
+    for _ in range(MAX_PASSES):
+        rows = np.flatnonzero(keep)
+        if len(rows) < 3:
+            break
+        speed, dt = _segment_speeds(lat[rows], lon[rows], epoch[rows])
+
+        rule = "speed"
+        flagged = _excursions(lat[rows], lon[rows], epoch[rows], speed > max_speed, max_speed, MAX_EXCURSION_POINTS)
+        if not flagged.any():
+            rule = "acceleration"
+            change = np.zeros(len(rows))
+            change[2:] = np.diff(speed[1:]) / dt[2:]
+            # Sobe acima do possível e logo a seguir desce abaixo do possível: o ponto é ruído
+            # (saltos acima da velocidade máxima são da regra anterior, mesmo os que ficaram)
+            flagged = ((change > max_acceleration) & np.append(change[1:] < -max_acceleration, False)
+                       & (speed <= max_speed))
+
+        flagged_rows = rows[flagged & removable[rows]]
+        if len(flagged_rows) == 0:
+            break
+        keep[flagged_rows] = False
+        rejected_by[flagged_rows] = JUMP_RULES.index(rule)
+
+    return rejected_by
+
+
+def clean_track(lat, lon, times, panel=None, chunk_size=CLEANING_CHUNK_SIZE, duplicate_tolerance_m=DUPLICATE_TOLERANCE_M,
+                min_stop_s=MIN_STOP_SECONDS, **kwargs):
+    """
+    Aplica as regras de limpeza a uma trajetória ordenada por tempo, em blocos:
+    - invalid: coordenadas fora do intervalo válido ou (0, 0);
+    - duplicate: ponto junto do último ponto mantido, exceto em paradas (ver mark_duplicates);
+      a âncora passa de um bloco para o seguinte;
+    - speed/acceleration: ver reject_jumps; cada bloco recebe como contexto (bloqueado) os
+      dois últimos pontos aceites do bloco anterior.
+
+    :param times: Datas (datetime) dos pontos, por ordem.
+    :param kwargs: Limites de reject_jumps (max_speed_kmh, max_acceleration).
+    :return: (máscara dos pontos a manter, contagem de pontos removidos por regra).
+    """
+    lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+    epoch = to_epoch(pd.Series(times))
+    n = len(lat)
+    counts = dict.fromkeys(RULES, 0)
+
+    invalid = invalid_coordinates(lat, lon)
+    keep = ~invalid
+    counts["invalid"] = int(invalid.sum())
+
+    exempt = stationary_points(lat, lon, epoch, np.flatnonzero(keep), min_stop_s=min_stop_s)
+    anchor = None
+    starts = panel.chunks(n, desc="Duplicados", chunk_size=chunk_size) if panel else range(0, n, chunk_size)
+    for start in starts:
+        rows = start + np.flatnonzero(keep[start:start + chunk_size])
+        anchor, removed = mark_duplicates(lat, lon, epoch, keep, rows, anchor, exempt, duplicate_tolerance_m)
+        counts["duplicate"] += removed
+
+    # Os últimos pontos de cada bloco podem ser o início de um salto que acaba no bloco
+    # seguinte: ficam por decidir e passam para esse bloco
+    kept = np.flatnonzero(keep)
+    context = pending = np.empty(0, dtype=np.int64)
+    starts = (panel.chunks(len(kept), desc="Saltos", chunk_size=chunk_size) if panel
+              else range(0, len(kept), chunk_size))
+    for start in starts:
+        rows = np.concatenate([context, pending, kept[start:start + chunk_size]])
+        rejected_by = reject_jumps(lat[rows], lon[rows], epoch[rows], locked=len(context), **kwargs)
+        hold = 0 if start + chunk_size >= len(kept) else min(MAX_EXCURSION_POINTS + 1, len(rows) - len(context))
+        decided = slice(len(context), len(rows) - hold)
+        keep[rows[decided]] = rejected_by[decided] < 0
+        counts_by_rule = np.bincount(rejected_by[decided][rejected_by[decided] >= 0], minlength=len(JUMP_RULES))
+        for rule, count in zip(JUMP_RULES, counts_by_rule):
+            counts[rule] += int(count)
+        pending = rows[len(rows) - hold:]
+        accepted = rows[:len(rows) - hold]
+        context = accepted[rejected_by[:len(rows) - hold] < 0][-2:]
+    return keep, counts
+
+
+def format_counts(counts):
+    labels = {"invalid": "coordenadas inválidas", "duplicate": "duplicados consecutivos",
+              "speed": "velocidade impossível", "acceleration": "aceleração impossível"}
+    return ", ".join(f"{labels[rule]}: {counts[rule]}" for rule in RULES)
@@ -0,0 +1,118 @@
+import numpy as np
+from branca.element import MacroElement
+from jinja2 import Template
+from folium.plugins import HeatMap
+from projection import MERCATOR_ORIGIN, from_web_mercator, to_web_mercator
+
+# Cada nível de agregação é usado a partir deste zoom até ao nível seguinte
+ZOOM_LEVELS = (8, 11, 14, 17)
+BIN_PIXELS = 8  # lado de cada célula, em pixels, no zoom do nível
+
+
+def _hex_cells(x, y, size):
+    # Coordenadas axiais de hexágonos "pointy-top", com arredondamento cúbico
+    q = (np.sqrt(3) / 3 * x - y / 3) / size
+    r = (2 / 3 * y) / size
+    s = -q - r
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return rq.astype(np.int64), rr.astype(np.int64)
+
+
+def bin_points(lat, lon, weights=None, zoom=ZOOM_LEVELS[0], bin_pixels=BIN_PIXELS, shape="square"):
+    """
+    Agrega os pontos em células quadradas ou hexagonais com o tamanho de bin_pixels
+    pixels no zoom indicado.
+
+    :param weights: Peso de cada ponto (ex.: velocidade, segundos parado). Por omissão, 1.
+    :return: (lat, lon, peso) de cada célula ocupada; a posição é o centróide dos pontos da célula.
+    """
+    x, y = to_web_mercator(lat, lon)
+    weights = np.ones(len(x)) if weights is None else np.asarray(weights, dtype=np.float64)
+    if len(x) == 0:
+        return np.empty(0), np.empty(0), np.empty(0)
+
+    size = 2 * MERCATOR_ORIGIN / (256 * 2 ** zoom) * bin_pixels
+    if shape == "hex":
+        ix, iy = _hex_cells(x, y, size)
+    elif shape == "square":
+        ix, iy = np.floor(x / size).astype(np.int64), np.floor(y / size).astype(np.int64)
+    else:
+        raise ValueError(f"Forma de célula desconhecida: {shape}")
+
+    # Histograma esparso: só as células ocupadas ocupam memória
+    cells = (ix << 32) + (iy + (1 << 31))
+    _, inverse = np.unique(cells, return_inverse=True)
+    counts = np.bincount(inverse)
+    cell_weights = np.bincount(inverse, weights=weights)
+    cell_x = np.bincount(inverse, weights=x) / counts
+    cell_y = np.bincount(inverse, weights=y) / counts
+
+    cell_lat, cell_lon = from_web_mercator(cell_x, cell_y)
+    return cell_lat, cell_lon, cell_weights
+
+
+class ZoomLevelSwitch(MacroElement):
+    """
+    Mostra apenas a camada de calor agregada para o zoom atual do mapa.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var map = {{ this._parent.get_name() }};
+            var levels = [
+                {% for zoom, layer in this.levels %}[{{ zoom }}, {{ layer }}],{% endfor %}
+            ];
+            function update() {
+                var zoom = map.getZoom();
+                var active = levels[0][1];
+                levels.forEach(function(level) { if (zoom >= level[0]) { active = level[1]; } });
+                levels.forEach(function(level) {
+                    if (level[1] === active) {
+                        if (!map.hasLayer(level[1])) { map.addLayer(level[1]); }
+                    } else if (map.hasLayer(level[1])) {
+                        map.removeLayer(level[1]);
+                    }
+                });
+            }
+            map.on("zoomend", update);
+            update();
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, levels):
+        super().__init__()
+        self._name = "ZoomLevelSwitch"
+        self.levels = levels
+
+
+def add_binned_heatmap(map_, lat, lon, weights=None, zooms=ZOOM_LEVELS, shape="square",
+                       bin_pixels=BIN_PIXELS, **heatmap_kwargs):
+    """
+    Acrescenta ao mapa um mapa de calor pré-agregado: uma camada por nível de zoom,
+    com apenas os centróides e pesos das células ocupadas. O tamanho da página passa a
+    depender do número de células ocupadas e não do número de pontos GPS.
+    """
+    # Os pesos já vêm agregados: max_zoom=0 desliga a atenuação por zoom do Leaflet.heat
+    heatmap_kwargs.setdefault("max_zoom", 0)
+    levels = []
+    for zoom in sorted(zooms):
+        cell_lat, cell_lon, cell_weights = bin_points(lat, lon, weights, zoom, bin_pixels, shape)
+        if len(cell_weights) == 0:
+            continue
+        top = cell_weights.max()
+        intensity = cell_weights / top if top > 0 else cell_weights
+        layer = HeatMap(np.column_stack([cell_lat, cell_lon, intensity]).tolist(),
+                        control=False, **heatmap_kwargs)
+        layer.add_to(map_)
+        levels.append((zoom, layer.get_name()))
+
+    if levels:
+        ZoomLevelSwitch(levels).add_to(map_)
+    return levels
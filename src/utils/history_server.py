@@ -0,0 +1,393 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs
+import numpy as np
+from history_store import HistoryStore
+from tile_pyramid import TILES_DIR
+from trip_segmentation import filter_trips, load_stop_index, load_trip_index, trip_index_paths
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_POINTS = 50000  # pontos por resposta; acima disto a série é decimada
+MMAP_CACHE_SIZE = 512  # colunas de partições mantidas mapeadas em memória
+RESPONSE_CACHE_BYTES = 64 * 1024 * 1024
+RESPONSE_CACHE_TTL = 30  # segundos
+MIN_DATE = "1970-01-01"
+MAX_DATE = "2200-12-31"  # dentro do intervalo das datas do pandas
+MAX_BBOX_DAYS = 31  # intervalo máximo de uma consulta espacial
+NAME_PATTERN = re.compile(r"^[\w.-]+$")
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           500: "Internal Server Error"}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ResponseCache:
+    """
+    Cache LRU das respostas, limitada em bytes. Cada entrada expira ao fim de ttl
+    segundos, para que os dados novos escritos pelo data_filter acabem por aparecer.
+    """
+
+    def __init__(self, max_bytes=RESPONSE_CACHE_BYTES, ttl=RESPONSE_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, response = entry
+        if expires < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    def put(self, key, response):
+        body_size = len(response[1])
+        if body_size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, response)
+        self.size += body_size
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        _, response = self._entries.pop(key)
+        self.size -= len(response[1])
+
+
+def _json_list(values, decimals=None):
+    # NaN não é JSON válido: passa a null
+    values = np.asarray(values, dtype=np.float64)
+    if decimals is not None:
+        values = np.round(values, decimals)
+    missing = np.isnan(values)
+    if not missing.any():
+        return values.tolist()
+    return [None if m else v for v, m in zip(values.tolist(), missing.tolist())]
+
+
+class HistoryServer:
+    """
+    Serviço HTTP local (asyncio, sem dependências externas) sobre o histórico processado:
+    intervalos de tempo, consultas espaciais, tabelas de viagens e paradas e tiles.
+
+    As partições são lidas em memória mapeada partilhada entre pedidos (HistoryStore com
+    cache de mapas), as consultas correm num thread pool para não bloquear o ciclo de
+    eventos e as respostas ficam numa cache LRU.
+    """
+
+    def __init__(self, store=None, tiles_dir=TILES_DIR, cache_bytes=RESPONSE_CACHE_BYTES,
+                 cache_ttl=RESPONSE_CACHE_TTL):
+        self.store = store or HistoryStore(mmap_cache_size=MMAP_CACHE_SIZE)
+        self.tiles_dir = tiles_dir
+        self.cache = ResponseCache(cache_bytes, cache_ttl)
+        self._tables = {}
+        self._tables_lock = threading.Lock()
+        self.routes = {
+            "/": self.viewer,
+            "/devices": self.devices,
+            "/range": self.range,
+            "/bbox": self.bbox,
+            "/trips": self.trips,
+            "/stops": self.stops,
+        }
+
+    # --- Respostas -------------------------------------------------------------
+
+    def viewer(self, params):
+        return "text/html; charset=utf-8", VIEWER_HTML.encode("utf-8")
+
+    def devices(self, params):
+        return self._json(self.store.devices())
+
+    def range(self, params):
+        device, start, end = self._device_range(params)
+        # Sem datas o intervalo é o histórico inteiro: a amostra é tirada ao ler cada partição
+        arrays, count, stride = self.store.query_sample(device, start, end, self._limit(params),
+                                                        ["latitude", "longitude", "speed_kmh"])
+        return self._points(arrays, count, stride)
+
+    def bbox(self, params):
+        if "start" not in params or "end" not in params:
+            raise HttpError(400, "Parâmetros 'start' e 'end' obrigatórios nas consultas espaciais.")
+        device, start, end = self._device_range(params)
+        if (end - start).total_seconds() > MAX_BBOX_DAYS * 86400:
+            raise HttpError(400, f"Intervalo demasiado longo (máximo {MAX_BBOX_DAYS} dias).")
+        try:
+            min_lat, min_lon, max_lat, max_lon = (float(params[k]) for k in ("min_lat", "min_lon", "max_lat", "max_lon"))
+        except (KeyError, ValueError):
+            raise HttpError(400, "Parâmetros min_lat, min_lon, max_lat e max_lon obrigatórios.")
+        arrays = self.store.query_bbox(device, start, end, min_lat, min_lon, max_lat, max_lon,
+                                       ["latitude", "longitude", "speed_kmh"])
+        count = len(arrays["epoch"])
+        stride = max(1, math.ceil(count / self._limit(params)))
+        return self._points({c: values[::stride] for c, values in arrays.items()}, count, stride)
+
+    def trips(self, params):
+        device, start, end = self._device_range(params)
+        trips = filter_trips(self._table(device, 0, load_trip_index), start, end).reset_index()
+        return "application/json", trips.to_json(orient="records", date_format="iso").encode("utf-8")
+
+    def stops(self, params):
+        device, start, end = self._device_range(params)
+        stops = self._table(device, 1, load_stop_index)
+        stops = stops[(stops["start_time"] >= start) & (stops["end_time"] <= end)]
+        return "application/json", stops.to_json(orient="records", date_format="iso").encode("utf-8")
+
+    def tile(self, path):
+        parts = path.strip("/").split("/")
+        if len(parts) != 5 or not NAME_PATTERN.match(parts[1]) or not parts[4].endswith(".png"):
+            raise HttpError(404, "Tile inexistente.")
+        z, x, y = parts[2], parts[3], parts[4][:-4]
+        if not (z.isdigit() and x.isdigit() and y.isdigit()):
+            raise HttpError(404, "Tile inexistente.")
+        tile_path = os.path.join(self.tiles_dir, parts[1], z, x, f"{y}.png")
+        try:
+            with open(tile_path, "rb") as f:
+                return "image/png", f.read()
+        except FileNotFoundError:
+            raise HttpError(404, "Tile inexistente.")
+
+    # --- Auxiliares --------------------------------------------------------------
+
+    def _json(self, value):
+        return "application/json", json.dumps(value).encode("utf-8")
+
+    def _device_range(self, params):
+        device = params.get("device", "")
+        if not NAME_PATTERN.match(device):
+            raise HttpError(400, "Parâmetro 'device' inválido.")
+        try:
+            start = np.datetime64(params.get("start", MIN_DATE))
+            end = np.datetime64(params.get("end", MAX_DATE))
+        except ValueError:
+            raise HttpError(400, "Datas inválidas (use o formato ISO, ex.: 2024-03-01T14:00).")
+        return device, start.astype("datetime64[s]").item(), end.astype("datetime64[s]").item()
+
+    def _limit(self, params):
+        try:
+            return max(1, int(params.get("limit", MAX_POINTS)))
+        except ValueError:
+            raise HttpError(400, "Parâmetro 'limit' inválido.")
+
+    def _points(self, arrays, count, stride):
+        # arrays já vem amostrado (1 em cada stride) dos count pontos do intervalo
+        return self._json({
+            "count": count,
+            "stride": stride,
+            "epoch": arrays["epoch"].tolist(),
+            "latitude": _json_list(arrays["latitude"], 6),
+            "longitude": _json_list(arrays["longitude"], 6),
+            "speed_kmh": _json_list(arrays["speed_kmh"], 2),
+        })
+
+    def _table(self, device, which, loader):
+        # Tabelas de viagens/paradas partilhadas entre pedidos, relidas quando o ficheiro muda
+        path = trip_index_paths(device)[which]
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            raise HttpError(404, f"Sem índice de viagens para '{device}'.")
+        with self._tables_lock:
+            cached = self._tables.get(path)
+            if cached is None or cached[0] != mtime:
+                cached = (mtime, loader(device))
+                self._tables[path] = cached
+            return cached[1]
+
+    def _dispatch(self, target):
+        url = urlsplit(target)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if url.path.startswith("/tiles/"):
+            return self.tile(url.path)
+        handler = self.routes.get(url.path)
+        if handler is None:
+            raise HttpError(404, "Recurso inexistente.")
+        return handler(params)
+
+    # --- HTTP ---------------------------------------------------------------------
+
+    async def respond(self, target):
+        """
+        Resposta (status, content-type, corpo) para um pedido GET, com cache.
+        """
+        cached = self.cache.get(target)
+        if cached is not None:
+            return cached
+        loop = asyncio.get_running_loop()
+        try:
+            content_type, body = await loop.run_in_executor(None, self._dispatch, target)
+        except HttpError as e:
+            return e.status, "text/plain; charset=utf-8", str(e).encode("utf-8")
+        except Exception as e:
+            return 500, "text/plain; charset=utf-8", f"Erro: {e}".encode("utf-8")
+        response = (200, content_type, body)
+        self.cache.put(target, response)
+        return response
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip().lower()
+
+                connection = headers.get("connection", "")
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+
+                if method != "GET":
+                    status, content_type, body = 405, "text/plain; charset=utf-8", b"Apenas GET."
+                else:
+                    status, content_type, body = await self.respond(target)
+
+                writer.write((
+                    f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                    "\r\n"
+                ).encode("latin-1") + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        return await asyncio.start_server(self.handle, host, port)
+
+
+VIEWER_HTML = """<!DOCTYPE html>
+<html lang="pt">
+<head>
+<meta charset="utf-8">
+<title>Histórico de Localizações</title>
+<style>
+  body { margin: 0; font-family: Arial, sans-serif; }
+  #controls { padding: 8px; background: #eee; }
+  canvas { display: block; width: 100vw; height: calc(100vh - 48px); }
+</style>
+</head>
+<body>
+<div id="controls">
+  Dispositivo: <select id="device"></select>
+  Início: <input id="start" type="datetime-local">
+  Fim: <input id="end" type="datetime-local">
+  <button id="load">Carregar</button>
+  <span id="status"></span>
+</div>
+<canvas id="map"></canvas>
+<script>
+// Página sem dependências externas: os pontos são pedidos ao servidor e desenhados num canvas
+const canvas = document.getElementById("map");
+const status = document.getElementById("status");
+
+function mercator(lat, lon) {
+  const rad = Math.PI / 180;
+  return [lon * rad, Math.log(Math.tan(Math.PI / 4 + lat * rad / 2))];
+}
+
+function draw(data) {
+  const ctx = canvas.getContext("2d");
+  canvas.width = canvas.clientWidth;
+  canvas.height = canvas.clientHeight;
+  ctx.clearRect(0, 0, canvas.width, canvas.height);
+  const points = [];
+  for (let i = 0; i < data.latitude.length; i++) {
+    if (data.latitude[i] !== null && data.longitude[i] !== null) {
+      points.push([...mercator(data.latitude[i], data.longitude[i]), data.speed_kmh[i] || 0]);
+    }
+  }
+  if (!points.length) { return; }
+  const xs = points.map(p => p[0]), ys = points.map(p => p[1]);
+  const minX = Math.min(...xs), maxX = Math.max(...xs), minY = Math.min(...ys), maxY = Math.max(...ys);
+  const scale = 0.9 * Math.min(canvas.width / (maxX - minX || 1e-9), canvas.height / (maxY - minY || 1e-9));
+  const offX = (canvas.width - scale * (maxX - minX)) / 2, offY = (canvas.height - scale * (maxY - minY)) / 2;
+  const project = p => [offX + (p[0] - minX) * scale, canvas.height - offY - (p[1] - minY) * scale];
+  ctx.strokeStyle = "#3060c0";
+  ctx.beginPath();
+  points.forEach((p, i) => { const [x, y] = project(p); i ? ctx.lineTo(x, y) : ctx.moveTo(x, y); });
+  ctx.stroke();
+  points.forEach(p => {
+    const [x, y] = project(p);
+    ctx.fillStyle = `hsl(${Math.max(0, 240 - 2 * p[2])}, 90%, 45%)`;
+    ctx.fillRect(x - 1.5, y - 1.5, 3, 3);
+  });
+}
+
+async function load() {
+  const params = new URLSearchParams({ device: document.getElementById("device").value });
+  const start = document.getElementById("start").value, end = document.getElementById("end").value;
+  if (start) { params.set("start", start); }
+  if (end) { params.set("end", end); }
+  status.textContent = "A carregar...";
+  const response = await fetch("/range?" + params);
+  if (!response.ok) { status.textContent = await response.text(); return; }
+  const data = await response.json();
+  status.textContent = `${data.count} pontos` + (data.stride > 1 ? ` (1 em cada ${data.stride})` : "");
+  draw(data);
+}
+
+fetch("/devices").then(r => r.json()).then(devices => {
+  const select = document.getElementById("device");
+  devices.forEach(d => select.add(new Option(d, d)));
+});
+document.getElementById("load").addEventListener("click", load);
+</script>
+</body>
+</html>
+"""
+
+
+async def serve(host, port):
+    server = await HistoryServer().start(host, port)
+    print(f"🌐 Servidor do histórico em http://{host}:{port}/ (Ctrl+C para terminar)", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local do histórico de localizações.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
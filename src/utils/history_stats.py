@@ -0,0 +1,103 @@
+import os
+import numpy as np
+
+# Limites dos bins de cada histograma. Valores abaixo do primeiro ou acima do último
+# limite ficam em dois bins extra, nas pontas do array de contagens.
+SPEED_EDGES = np.linspace(0, 300, 601)  # km/h, bins de 0.5 km/h
+DURATION_EDGES = np.concatenate([[0], np.logspace(-1, 6, 701)])  # s, de 0.1 s a ~11.6 dias, bins de ~2.3%
+METRIC_EDGES = {
+    "speed_kmh": SPEED_EDGES,  # velocidade dos pontos em movimento
+    "interval_s": DURATION_EDGES,  # duração dos segmentos entre pontos consecutivos
+    "stop_s": DURATION_EDGES,  # duração das paradas
+}
+# Métricas calculadas a partir dos pontos de cada partição (as paradas vêm do índice de viagens)
+POINT_METRICS = ["speed_kmh", "interval_s"]
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """
+    Histograma de bins fixos, atualizável bloco a bloco e combinável por soma: o
+    histograma de um intervalo de datas é a soma dos histogramas das partições.
+    Os quantis são estimados por interpolação linear dentro do bin, com um erro
+    máximo igual à largura do bin.
+    """
+
+    def __init__(self, edges, counts=None):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        if counts is None:
+            counts = np.zeros(len(self.edges) + 1, dtype=np.int64)
+        self.counts = np.asarray(counts, dtype=np.int64)
+
+    @classmethod
+    def for_metric(cls, metric):
+        return cls(METRIC_EDGES[metric])
+
+    @classmethod
+    def load(cls, path, edges):
+        """
+        Lê um histograma guardado, ou devolve None se não existir ou tiver sido
+        gravado com outros bins.
+        """
+        try:
+            counts = np.load(path)
+        except FileNotFoundError:
+            return None
+        if len(counts) != len(edges) + 1:
+            return None
+        return cls(edges, counts)
+
+    def save(self, path):
+        tmp_path = path[:-len(".npy")] + f".tmp-{os.getpid()}.npy"
+        np.save(tmp_path, self.counts)
+        os.replace(tmp_path, path)
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        bins = np.searchsorted(self.edges, values, side="right")
+        self.counts += np.bincount(bins, minlength=len(self.counts))
+        return self
+
+    def merge(self, other):
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Histogramas com bins diferentes não podem ser combinados.")
+        self.counts += other.counts
+        return self
+
+    def quantile(self, q):
+        total = self.total
+        if total == 0:
+            return float("nan")
+        cumulative = np.cumsum(self.counts)
+        target = q * total
+        i = int(np.searchsorted(cumulative, target, side="left"))
+        if i == 0:
+            return float(self.edges[0])
+        if i >= len(self.edges):
+            return float(self.edges[-1])
+        fraction = (target - cumulative[i - 1]) / self.counts[i]
+        return float(self.edges[i - 1] + fraction * (self.edges[i] - self.edges[i - 1]))
+
+    def quantiles(self, qs=DEFAULT_QUANTILES):
+        return {q: self.quantile(q) for q in qs}
+
+
+def histogram_path(partition, metric):
+    return os.path.join(partition, f"hist_{metric}.npy")
+
+
+def point_histograms(epoch, speed_kmh):
+    """
+    Histogramas de velocidade (só pontos com velocidade > 0, como no velocity_study)
+    e de duração dos segmentos entre pontos consecutivos.
+    """
+    speed_kmh = np.asarray(speed_kmh, dtype=np.float64)
+    return {
+        "speed_kmh": Histogram.for_metric("speed_kmh").update(speed_kmh[speed_kmh > 0]),
+        "interval_s": Histogram.for_metric("interval_s").update(np.diff(np.asarray(epoch))),
+    }
@@ -0,0 +1,435 @@
+import json
+import math
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from history_stats import METRIC_EDGES, POINT_METRICS, Histogram, histogram_path, point_histograms
+
+STORE_DIR = os.path.join("data", "store")
+# Colunas guardadas em cada partição (uma .npy por coluna); "epoch" vai sempre ordenada
+COLUMNS = ["epoch", "latitude", "longitude", "speed_kmh", "distance_in_m"]
+SECONDS_PER_DAY = 86400
+# Área (lat_min, lat_max, lon_min, lon_max) de cada partição, para as consultas espaciais
+BOUNDS_FILE = "bounds.npy"
+# Origem de cada ponto (índice em SOURCES_FILE), para substituir os pontos de um ficheiro reprocessado
+SOURCE_COLUMN = "source"
+SOURCES_FILE = "sources.json"
+
+
+def device_from_path(file_path):
+    """
+    Nome do dispositivo a partir do nome do ficheiro, sem os prefixos
+    acrescentados pelas ferramentas de limpeza ("cleaned_test1.csv" -> "test1").
+    """
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    for prefix in ("cleaned_", "removed_"):
+        while name.startswith(prefix):
+            name = name[len(prefix):]
+    return name
+
+
+def _bounds(lat, lon):
+    valid = np.isfinite(lat) & np.isfinite(lon)
+    if not valid.any():
+        return np.full(4, np.nan)
+    return np.array([lat[valid].min(), lat[valid].max(), lon[valid].min(), lon[valid].max()])
+
+
+def _load_column(f, mmap_mode=None):
+    """
+    Lê um .npy a partir de um ficheiro já aberto; com mmap_mode, mapeia-o em memória
+    (np.load só mapeia ficheiros indicados pelo caminho).
+    """
+    if not mmap_mode:
+        return np.load(f)
+    major, _ = np.lib.format.read_magic(f)
+    read_header = np.lib.format.read_array_header_1_0 if major == 1 else np.lib.format.read_array_header_2_0
+    shape, fortran_order, dtype = read_header(f)
+    if not np.prod(shape):
+        return np.empty(shape, dtype=dtype)  # não é possível mapear zero bytes
+    return np.memmap(f, dtype=dtype, mode=mmap_mode, shape=shape, order="F" if fortran_order else "C",
+                     offset=f.tell())
+
+
+def to_epoch(values):
+    """
+    Converte datas (sem fuso horário) em segundos desde 1970-01-01.
+    """
+    values = pd.to_datetime(values)
+    return ((values - pd.Timestamp(0)) // pd.Timedelta(seconds=1)).to_numpy(dtype=np.int64)
+
+
+class HistoryStore:
+    """
+    Histórico de localizações particionado em dispositivo/ano/mês/dia.
+
+    Cada partição diária é uma pasta com um ficheiro .npy por coluna, ordenada por
+    "epoch". As consultas abrem só as partições que intersetam o intervalo pedido e
+    fazem pesquisa binária na coluna epoch em memória mapeada, por isso pedir uma
+    tarde de um histórico de vários anos só lê alguns kilobytes do disco.
+    """
+
+    def __init__(self, root=STORE_DIR, mmap_cache_size=0):
+        """
+        :param mmap_cache_size: Número de colunas mapeadas em memória mantidas abertas entre
+            consultas (útil num servidor, onde várias consultas partilham os mesmos mapas).
+        """
+        self.root = root
+        self._lock = threading.Lock()
+        self._mmap_cache_size = mmap_cache_size
+        self._mmap_cache = OrderedDict()
+        self._mmap_lock = threading.Lock()
+
+    def devices(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d for d in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, d)))
+
+    def partition_path(self, device, day):
+        return os.path.join(self.root, device, f"{day:%Y}", f"{day:%m}", f"{day:%d}")
+
+    def write(self, device, df, source=""):
+        """
+        Grava os pontos de df (colunas "datetime", "latitude", "longitude" e,
+        opcionalmente, "speed_kmh" e "distance_in_m") nas partições do dispositivo.
+
+        Em cada dia entre o primeiro e o último ponto de df, os pontos escritos antes pela
+        mesma origem (source, ex.: o nome do ficheiro) são substituídos pelos de df: voltar
+        a limpar um ficheiro não deixa no histórico os pontos que a nova limpeza rejeita.
+        Pontos de outras origens com o mesmo epoch de um ponto novo são substituídos por ele.
+        Devolve a lista de dias (date) escritos.
+        """
+        epoch = to_epoch(df["datetime"])
+        data = {"epoch": epoch}
+        for column in COLUMNS[1:]:
+            if column in df.columns:
+                data[column] = pd.to_numeric(df[column], errors="coerce").to_numpy(dtype=np.float64)
+            else:
+                data[column] = np.full(len(df), np.nan)
+        if not len(epoch):
+            return []
+
+        days = epoch // SECONDS_PER_DAY
+        order = np.argsort(days, kind="stable")
+        unique_days, starts = np.unique(days[order], return_index=True)
+        bounds = list(starts[1:]) + [len(order)]
+        rows_by_day = {int(day): order[start:end] for day, start, end in zip(unique_days, starts, bounds)}
+
+        written = []
+        with self._lock:
+            for day_number in range(int(unique_days[0]), int(unique_days[-1]) + 1):
+                rows = rows_by_day.get(day_number, order[:0])
+                day = (datetime(1970, 1, 1) + timedelta(days=day_number)).date()
+                path = self.partition_path(device, day)
+                if not len(rows) and not os.path.isdir(path):
+                    continue
+                self._replace_partition(path, {c: v[rows] for c, v in data.items()}, source)
+                written.append(day)
+        return written
+
+    def _read_sources(self, path, count, source):
+        """
+        Nomes das origens e índice da origem de cada ponto de uma partição. As partições
+        escritas antes de haver origens são atribuídas a source.
+        """
+        try:
+            with open(os.path.join(path, SOURCES_FILE), encoding="utf-8") as f:
+                names = json.load(f)
+            ids = np.load(os.path.join(path, f"{SOURCE_COLUMN}.npy"))
+        except FileNotFoundError:
+            return [source], np.zeros(count, dtype=np.int16)
+        return names, ids
+
+    def _replace_partition(self, path, new, source):
+        ids = np.zeros(len(new["epoch"]), dtype=np.int16)
+        names = [source]
+        existing = self._read_partition(path)
+        if existing is not None:
+            # Mantém só os pontos das outras origens; os da origem escrita agora são substituídos
+            old_names, old_ids = self._read_sources(path, len(existing["epoch"]), source)
+            others = [name for name in old_names if name != source]
+            remap = np.array([others.index(name) + 1 if name != source else -1 for name in old_names], dtype=np.int16)
+            kept = remap[old_ids] >= 0
+            new = {c: np.concatenate([existing[c][kept], new[c]]) for c in COLUMNS}
+            ids = np.concatenate([remap[old_ids[kept]], ids])
+            names += others
+
+        # Ordena por epoch e mantém o último ponto de cada epoch (o mais recente a ser escrito)
+        order = np.argsort(new["epoch"], kind="stable")
+        epoch = new["epoch"][order]
+        keep = np.append(epoch[1:] != epoch[:-1], True) if len(epoch) else np.zeros(0, dtype=bool)
+        rows = order[keep]
+
+        # A nova versão é escrita numa pasta temporária e trocada pela atual de uma vez, para
+        # que um leitor nunca veja colunas de versões diferentes
+        parent, name = os.path.split(path)
+        tmp_dir = os.path.join(parent, f"{name}.tmp-{os.getpid()}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for column in COLUMNS:
+            np.save(os.path.join(tmp_dir, f"{column}.npy"), np.ascontiguousarray(new[column][rows]))
+        np.save(os.path.join(tmp_dir, f"{SOURCE_COLUMN}.npy"), ids[rows])
+        with open(os.path.join(tmp_dir, SOURCES_FILE), "w", encoding="utf-8") as f:
+            json.dump(names, f)
+
+        # Histogramas da partição, para percentis por intervalo de datas sem reler os pontos
+        for metric, histogram in point_histograms(epoch[keep], new["speed_kmh"][rows]).items():
+            histogram.save(histogram_path(tmp_dir, metric))
+        np.save(os.path.join(tmp_dir, BOUNDS_FILE), _bounds(new["latitude"][rows], new["longitude"][rows]))
+
+        # Ficheiros que não são recalculados aqui (ex.: histograma das paradas) passam para a nova versão
+        if os.path.isdir(path):
+            for file_name in os.listdir(path):
+                if not os.path.exists(os.path.join(tmp_dir, file_name)):
+                    shutil.copy2(os.path.join(path, file_name), tmp_dir)
+        self._publish(tmp_dir, path)
+
+    @staticmethod
+    def _publish(tmp_dir, path):
+        """
+        Troca a pasta da partição pela nova versão. Entre as duas mudanças de nome a
+        partição falta por instantes, mas nunca fica a meio de ser escrita.
+        """
+        old_dir = f"{path}.old-{os.getpid()}"
+        if os.path.isdir(path):
+            os.rename(path, old_dir)
+        os.rename(tmp_dir, path)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    def write_stops(self, device, stops, days):
+        """
+        Guarda o histograma da duração das paradas de cada dia em days (os dias escritos
+        por write), substituindo o anterior. Cada parada conta no dia em que começa.
+
+        :param stops: Tabela de paradas (trip_segmentation.segment_trips) com start_time e duration_s.
+        """
+        start_days = pd.to_datetime(stops["start_time"]).dt.date
+        durations = stops["duration_s"].to_numpy(dtype=np.float64)
+        with self._lock:
+            for day in days:
+                path = self.partition_path(device, day)
+                if os.path.isdir(path):
+                    histogram = Histogram.for_metric("stop_s").update(durations[(start_days == day).to_numpy()])
+                    histogram.save(histogram_path(path, "stop_s"))
+
+    def read_partition(self, path, columns=COLUMNS):
+        """
+        Colunas de uma partição (pasta devolvida por partitions), ou None se não existir.
+        """
+        return self._read_partition(path, columns)
+
+    def _read_partition(self, path, columns=COLUMNS, mmap_mode=None):
+        # As colunas são abertas a partir do mesmo descritor da pasta: se a partição for
+        # trocada por uma nova versão a meio da leitura, continuam todas a vir da antiga
+        try:
+            dir_fd = os.open(path, os.O_RDONLY)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        try:
+            def opener(name, flags):
+                return os.open(name, flags, dir_fd=dir_fd)
+
+            def load(column):
+                with open(f"{column}.npy", "rb", opener=opener) as f:
+                    return _load_column(f, mmap_mode)
+
+            if mmap_mode and self._mmap_cache_size:
+                stat = os.fstat(dir_fd)
+                version = (path, stat.st_ino, stat.st_ctime_ns)
+                return {c: self._cached_mmap(version, c, load) for c in columns}
+            return {c: load(c) for c in columns}
+        except FileNotFoundError:
+            return None
+        finally:
+            os.close(dir_fd)
+
+    def _cached_mmap(self, version, column, load):
+        # A chave inclui a versão da pasta: uma partição reescrita volta a ser mapeada
+        key = (version, column)
+        with self._mmap_lock:
+            array = self._mmap_cache.get(key)
+            if array is not None:
+                self._mmap_cache.move_to_end(key)
+                return array
+        array = load(column)
+        with self._mmap_lock:
+            self._mmap_cache[key] = array
+            while len(self._mmap_cache) > self._mmap_cache_size:
+                self._mmap_cache.popitem(last=False)
+        return array
+
+    def partitions(self, device, start, end):
+        """
+        Pastas das partições diárias do dispositivo entre start e end (inclusive),
+        percorrendo apenas os anos e meses dentro do intervalo.
+        """
+        device_dir = os.path.join(self.root, device)
+        if not os.path.isdir(device_dir):
+            return []
+
+        first, last = pd.Timestamp(start).date(), pd.Timestamp(end).date()
+        result = []
+        for year in sorted(os.listdir(device_dir)):
+            if not year.isdigit() or not first.year <= int(year) <= last.year:
+                continue
+            year_dir = os.path.join(device_dir, year)
+            for month in sorted(os.listdir(year_dir)):
+                if not (first.year, first.month) <= (int(year), int(month)) <= (last.year, last.month):
+                    continue
+                month_dir = os.path.join(year_dir, month)
+                for day in sorted(os.listdir(month_dir)):
+                    if not day.isdigit():
+                        continue  # versões temporárias de uma partição a ser reescrita
+                    if first <= datetime(int(year), int(month), int(day)).date() <= last:
+                        result.append(os.path.join(month_dir, day))
+        return result
+
+    def _time_slices(self, device, start, end, columns):
+        """
+        (colunas mapeadas em memória, i0, i1) de cada partição com pontos entre start e end.
+        """
+        start_epoch, end_epoch = to_epoch([start, end])
+        slices = []
+        for path in self.partitions(device, start, end):
+            arrays = self._read_partition(path, ["epoch"] + columns, mmap_mode="r")
+            if arrays is None:
+                continue
+            epoch = arrays["epoch"]
+            i0 = np.searchsorted(epoch, start_epoch, side="left")
+            i1 = np.searchsorted(epoch, end_epoch, side="right")
+            if i1 > i0:
+                slices.append((arrays, i0, i1))
+        return slices
+
+    @staticmethod
+    def _concatenate(parts, columns):
+        if parts:
+            return {c: np.concatenate([p[c] for p in parts]) for c in ["epoch"] + columns}
+        return {"epoch": np.empty(0, dtype=np.int64), **{c: np.empty(0) for c in columns}}
+
+    def query_arrays(self, device, start, end, columns=None):
+        """
+        Arrays NumPy ("epoch" + columns) dos pontos do dispositivo com start <= datetime <= end.
+        """
+        columns = [c for c in (columns or COLUMNS[1:]) if c != "epoch"]
+        parts = [{c: np.array(arrays[c][i0:i1]) for c in arrays}
+                 for arrays, i0, i1 in self._time_slices(device, start, end, columns)]
+        return self._concatenate(parts, columns)
+
+    def query_sample(self, device, start, end, limit, columns=None):
+        """
+        Como query_arrays, mas com no máximo limit pontos (1 em cada stride). A amostra é
+        tirada partição a partição, por isso um intervalo de anos nunca é copiado inteiro
+        para a memória.
+
+        :return: (arrays, número de pontos no intervalo, stride)
+        """
+        columns = [c for c in (columns or COLUMNS[1:]) if c != "epoch"]
+        slices = self._time_slices(device, start, end, columns)
+        count = sum(int(i1 - i0) for _, i0, i1 in slices)
+        stride = max(1, math.ceil(count / limit))
+
+        parts = []
+        position = 0  # índice global do primeiro ponto da partição
+        for arrays, i0, i1 in slices:
+            first = i0 + (-position) % stride
+            parts.append({c: np.array(arrays[c][first:i1:stride]) for c in arrays})
+            position += int(i1 - i0)
+        return self._concatenate(parts, columns), count, stride
+
+    def partition_bounds(self, path):
+        """
+        Área (lat_min, lat_max, lon_min, lon_max) dos pontos de uma partição; NaN se não tiver
+        coordenadas. Partições escritas antes de haver este ficheiro são calculadas agora.
+        """
+        bounds_path = os.path.join(path, BOUNDS_FILE)
+        try:
+            return np.load(bounds_path)
+        except FileNotFoundError:
+            arrays = self._read_partition(path, ["latitude", "longitude"], mmap_mode="r")
+            if arrays is None:
+                return np.full(4, np.nan)
+            bounds = _bounds(arrays["latitude"], arrays["longitude"])
+            tmp_path = os.path.join(path, f"bounds.tmp-{os.getpid()}-{threading.get_ident()}.npy")
+            np.save(tmp_path, bounds)
+            os.replace(tmp_path, bounds_path)
+            return bounds
+
+    def query_bbox(self, device, start, end, min_lat, min_lon, max_lat, max_lon, columns=None):
+        """
+        query_arrays restrito aos pontos dentro do retângulo. As partições cuja área não toca
+        o retângulo nem são abertas, e das restantes só se copiam os pontos de dentro.
+        """
+        columns = [c for c in (columns or COLUMNS[1:]) if c != "epoch"]
+        read_columns = ["epoch"] + [c for c in ["latitude", "longitude"] + columns if c != "epoch"]
+        read_columns = list(dict.fromkeys(read_columns))
+        start_epoch, end_epoch = to_epoch([start, end])
+
+        parts = []
+        for path in self.partitions(device, start, end):
+            lat0, lat1, lon0, lon1 = self.partition_bounds(path)
+            if not (lat0 <= max_lat and lat1 >= min_lat and lon0 <= max_lon and lon1 >= min_lon):
+                continue  # também exclui as partições sem coordenadas (NaN)
+            arrays = self._read_partition(path, read_columns, mmap_mode="r")
+            if arrays is None:
+                continue
+            i0 = np.searchsorted(arrays["epoch"], start_epoch, side="left")
+            i1 = np.searchsorted(arrays["epoch"], end_epoch, side="right")
+            lat, lon = np.asarray(arrays["latitude"][i0:i1]), np.asarray(arrays["longitude"][i0:i1])
+            inside = (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+            if inside.any():
+                parts.append({c: np.asarray(arrays[c][i0:i1])[inside] for c in ["epoch"] + columns})
+
+        return self._concatenate(parts, columns)
+
+    def histograms(self, device, start, end, metrics=None):
+        """
+        Histogramas (history_stats.Histogram) das métricas entre start e end, obtidos somando
+        os histogramas guardados nas partições. Nos dias só parcialmente dentro do intervalo,
+        os histogramas dos pontos são calculados a partir dos pontos desse troço; as paradas
+        contam por dia inteiro.
+        """
+        metrics = metrics or list(METRIC_EDGES)
+        result = {metric: Histogram.for_metric(metric) for metric in metrics}
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+
+        for path in self.partitions(device, start, end):
+            day_start = pd.Timestamp(*(int(part) for part in path.split(os.sep)[-3:]))
+            day_end = day_start + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+            partial = None
+            if start > day_start or end < day_end:
+                partial = self.query_arrays(device, max(start, day_start), min(end, day_end), ["speed_kmh"])
+                partial = point_histograms(partial["epoch"], partial["speed_kmh"])
+
+            for metric in metrics:
+                if partial is not None and metric in partial:
+                    result[metric].merge(partial[metric])
+                    continue
+                histogram = Histogram.load(histogram_path(path, metric), METRIC_EDGES[metric])
+                if histogram is None and metric in POINT_METRICS:
+                    # Partição escrita antes de haver histogramas: calcula e guarda agora
+                    arrays = self._read_partition(path, ["epoch", "speed_kmh"])
+                    if arrays is None:
+                        continue
+                    computed = point_histograms(arrays["epoch"], arrays["speed_kmh"])
+                    for name, value in computed.items():
+                        value.save(histogram_path(path, name))
+                    histogram = computed[metric]
+                if histogram is not None:
+                    result[metric].merge(histogram)
+        return result
+
+    def query(self, device, start, end, columns=None):
+        """
+        Pontos do dispositivo com start <= datetime <= end, no esquema das ferramentas
+        (latitude, longitude, date, time, datetime, ...).
+        """
+        df = pd.DataFrame(self.query_arrays(device, start, end, columns))
+        df["datetime"] = pd.to_datetime(df["epoch"], unit="s")
+        df["date"] = df["datetime"].dt.strftime("%Y-%m-%d")
+        df["time"] = df["datetime"].dt.strftime("%H:%M:%S")
+        return df
@@ -0,0 +1,350 @@
+import codecs
+import csv
+import json
+import os
+import time
+import tkinter as tk
+import xml.etree.ElementTree as ET
+from collections import deque
+from datetime import datetime, timezone
+from tkinter import ttk, filedialog, messagebox, scrolledtext
+from task_runner import ProgressPanel
+
+# Colunas do CSV gerado, no esquema esperado pelo data_filter
+IMPORT_COLUMNS = ["latitude", "longitude", "date", "time"]
+READ_SIZE = 1024 * 1024
+PROGRESS_EVERY = 10000  # pontos entre cada atualização do progresso
+# Elementos retirados da árvore (do elemento pai) assim que acabam de ser lidos: os pontos
+# e os seus contentores, que num ficheiro real podem ter milhões de filhos
+GPX_RELEASED = {"trkpt", "rtept", "wpt", "trkseg", "trk", "rte"}
+KML_RELEASED = {"when", "coord", "Track", "Placemark", "Folder"}
+
+
+def _parse_timestamp(value):
+    """
+    Converte um timestamp ISO 8601 (ex.: "2020-01-01T10:00:00.123Z") ou em
+    milissegundos desde 1970 num datetime UTC sem fuso horário.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)) or str(value).isdigit():
+        return datetime.fromtimestamp(int(value) / 1000, tz=timezone.utc).replace(tzinfo=None)
+    parsed = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _iter_json_array(fp, key):
+    """
+    Percorre, um objeto de cada vez, o array JSON associado a "key" num ficheiro binário,
+    sem carregar o ficheiro inteiro em memória. Procura a primeira ocorrência da chave,
+    que nos ficheiros do Takeout é a chave de topo.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    marker = f'"{key}"'
+    buf = ""
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = fp.read(READ_SIZE)
+        eof = not chunk
+        buf = buf[pos:] + utf8.decode(chunk, final=eof)
+        pos = 0
+
+    # Procurar a chave e o início do array
+    while True:
+        found = buf.find(marker, pos)
+        if found >= 0:
+            pos = found + len(marker)
+            break
+        if eof:
+            return
+        pos = max(pos, len(buf) - len(marker))
+        fill()
+
+    opened = False
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,:":
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                return
+            fill()
+            continue
+
+        if not opened:
+            if buf[pos] != "[":
+                return
+            opened = True
+            pos += 1
+            continue
+        if buf[pos] == "]":
+            return
+
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            # Objeto incompleto no buffer: lê mais e tenta de novo
+            if eof:
+                raise
+            fill()
+            continue
+        pos = end
+        yield obj
+
+
+def _e7(location, lat_key="latitudeE7", lon_key="longitudeE7"):
+    if lat_key not in location or lon_key not in location:
+        return None
+    return location[lat_key] / 1e7, location[lon_key] / 1e7
+
+
+def iter_takeout_records(fp):
+    """
+    Pontos de um Records.json do Google Takeout: (latitude, longitude, datetime).
+    """
+    for location in _iter_json_array(fp, "locations"):
+        point = _e7(location)
+        timestamp = _parse_timestamp(location.get("timestamp", location.get("timestampMs")))
+        if point and timestamp:
+            yield point[0], point[1], timestamp
+
+
+def iter_semantic_history(fp):
+    """
+    Pontos de um ficheiro de "Semantic Location History" do Takeout (AAAA_MÊS.json):
+    locais visitados, início/fim de cada deslocação e os pontos do percurso simplificado.
+    """
+    for obj in _iter_json_array(fp, "timelineObjects"):
+        if "placeVisit" in obj:
+            visit = obj["placeVisit"]
+            point = _e7(visit.get("location", {}))
+            duration = visit.get("duration", {})
+            for key in ("startTimestamp", "endTimestamp", "startTimestampMs", "endTimestampMs"):
+                if point and key in duration:
+                    yield point[0], point[1], _parse_timestamp(duration[key])
+        elif "activitySegment" in obj:
+            segment = obj["activitySegment"]
+            duration = segment.get("duration", {})
+            start = _e7(segment.get("startLocation", {}))
+            start_time = duration.get("startTimestamp", duration.get("startTimestampMs"))
+            if start and start_time:
+                yield start[0], start[1], _parse_timestamp(start_time)
+            for raw in segment.get("simplifiedRawPath", {}).get("points", []):
+                point = _e7(raw, "latE7", "lngE7")
+                timestamp = raw.get("timestamp", raw.get("timestampMs"))
+                if point and timestamp:
+                    yield point[0], point[1], _parse_timestamp(timestamp)
+            end = _e7(segment.get("endLocation", {}))
+            end_time = duration.get("endTimestamp", duration.get("endTimestampMs"))
+            if end and end_time:
+                yield end[0], end[1], _parse_timestamp(end_time)
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def iter_gpx(fp):
+    """
+    Pontos com data/hora de um ficheiro GPX (trkpt, rtept e wpt). Cada ponto é retirado
+    da árvore depois de lido, para a memória não crescer com o tamanho do ficheiro.
+    """
+    parents = []
+    for event, elem in ET.iterparse(fp, events=("start", "end")):
+        if event == "start":
+            parents.append(elem)
+            continue
+        parents.pop()
+        name = _local_name(elem.tag)
+        if name in ("trkpt", "rtept", "wpt"):
+            timestamp = None
+            for child in elem:
+                if _local_name(child.tag) == "time":
+                    timestamp = _parse_timestamp(child.text)
+            if timestamp is not None:
+                yield float(elem.get("lat")), float(elem.get("lon")), timestamp
+        if name in GPX_RELEASED and parents:
+            parents[-1].remove(elem)
+
+
+def iter_kml(fp):
+    """
+    Pontos com data/hora de um ficheiro KML: trajetos gx:Track (when + gx:coord) e
+    Placemarks com TimeStamp e Point. Os pares when/coord são emitidos à medida que
+    ficam completos, por isso só um trajeto de cada vez fica em memória; os elementos
+    já lidos são retirados da árvore.
+    """
+    whens = deque()
+    coords = deque()
+    in_point = False
+    placemark_time = None
+    placemark_point = None
+    parents = []
+
+    for event, elem in ET.iterparse(fp, events=("start", "end")):
+        name = _local_name(elem.tag)
+        if event == "start":
+            parents.append(elem)
+            if name == "Placemark":
+                placemark_time = placemark_point = None
+            elif name == "Point":
+                in_point = True
+            continue
+        parents.pop()
+
+        if name == "when":
+            if elem.text:
+                whens.append(_parse_timestamp(elem.text))
+        elif name == "coord":
+            lon, lat = elem.text.split()[:2]
+            coords.append((float(lat), float(lon)))
+        elif name == "coordinates" and in_point:
+            placemark_point = elem.text
+        elif name == "Point":
+            in_point = False
+        elif name == "TimeStamp":
+            placemark_time = whens.pop() if whens else None
+        elif name == "Track":
+            whens.clear()
+            coords.clear()
+        elif name == "Placemark":
+            if placemark_time is not None and placemark_point:
+                lon, lat = placemark_point.strip().split(",")[:2]
+                yield float(lat), float(lon), placemark_time
+        elif name not in KML_RELEASED:
+            continue
+
+        # Emparelha os when/coord do gx:Track pela ordem em que aparecem
+        while whens and coords:
+            lat, lon = coords.popleft()
+            yield lat, lon, whens.popleft()
+        if name in KML_RELEASED and parents:
+            parents[-1].remove(elem)
+
+
+def detect_format(path):
+    """
+    Identifica o formato pelo nome e, nos JSON, pelo início do conteúdo.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".gpx":
+        return "gpx"
+    if extension == ".kml":
+        return "kml"
+    if extension == ".json":
+        with open(path, "rb") as f:
+            head = f.read(64 * 1024)
+        if b'"timelineObjects"' in head:
+            return "semantic"
+        return "records"
+    raise ValueError(f"Formato não suportado: {extension}")
+
+
+IMPORTERS = {
+    "records": iter_takeout_records,
+    "semantic": iter_semantic_history,
+    "gpx": iter_gpx,
+    "kml": iter_kml,
+}
+
+
+def import_history(path, output_path=None, progress=None):
+    """
+    Converte um ficheiro do Takeout (Records.json ou Semantic Location History), GPX ou
+    KML num CSV com as colunas latitude, longitude, date e time, escrevendo cada ponto
+    à medida que é lido.
+
+    :param progress: Fábrica de barras tqdm (ex.: ProgressPanel.progress), opcional.
+    :return: (caminho do CSV, número de pontos, pontos por segundo).
+    """
+    importer = IMPORTERS[detect_format(path)]
+    if output_path is None:
+        output_path = os.path.join("data", os.path.splitext(os.path.basename(path))[0] + ".csv")
+
+    total_bytes = os.path.getsize(path)
+    bar = progress(total=total_bytes, desc="Importação") if progress else None
+    count = 0
+    started = time.perf_counter()
+
+    with open(path, "rb") as source, open(output_path, "w", newline="", encoding="utf-8") as target:
+        writer = csv.writer(target)
+        writer.writerow(IMPORT_COLUMNS)
+        for lat, lon, timestamp in importer(source):
+            writer.writerow((lat, lon, timestamp.strftime("%Y-%m-%d"), timestamp.strftime("%H:%M:%S")))
+            count += 1
+            if bar is not None and count % PROGRESS_EVERY == 0:
+                bar.update(source.tell() - bar.n)
+
+    elapsed = time.perf_counter() - started
+    if bar is not None:
+        bar.update(total_bytes - bar.n)
+        bar.close()
+    return output_path, count, count / elapsed if elapsed > 0 else 0.0
+
+
+def main_gui():
+    root = tk.Tk()
+    root.title("Importador de Histórico de Localizações")
+    root.attributes("-fullscreen", True)
+    root.resizable(False, False)
+
+    description = """
+Importe históricos de localização do Google Takeout (Records.json ou Semantic Location History),
+GPX ou KML para um CSV com latitude, longitude, data e hora na pasta 'data'.
+
+Instruções:
+- Selecione o ficheiro exportado.
+- Clique em "Importar" e, depois, filtre o CSV gerado com a Filtragem de Dados.
+"""
+    label_description = tk.Label(root, text=description, font=("Arial", 18), justify="left", padx=10, pady=40)
+    label_description.pack(fill=tk.BOTH, padx=30, pady=0)
+
+    frame = ttk.Frame(root, padding=10)
+    frame.pack()
+
+    selected_file = tk.StringVar()
+
+    def browse_file():
+        filename = filedialog.askopenfilename(
+            title="Escolha um ficheiro de histórico",
+            filetypes=[("Histórico de localizações", "*.json *.gpx *.kml")]
+        )
+        if filename:
+            selected_file.set(filename)
+
+    log_text = scrolledtext.ScrolledText(root, wrap=tk.WORD, height=12, state='disabled')
+    log_text.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
+
+    def show_result(result):
+        output_path, count, rate = result
+        log_text.configure(state='normal')
+        log_text.insert(tk.END, f"\n✅ Arquivo salvo como: {output_path}\n")
+        log_text.insert(tk.END, f"📍 Pontos importados: {count} ({rate:,.0f} pontos/s)\n")
+        log_text.insert(tk.END, "-" * 50 + "\n")
+        log_text.configure(state='disabled')
+
+    def start_import():
+        path = selected_file.get()
+        if not path:
+            messagebox.showerror("Erro", "Nenhum arquivo selecionado.")
+            return
+        progress_panel.submit(import_history, path, None, progress_panel.progress, on_done=show_result)
+
+    ttk.Label(frame, text="Ficheiro:").grid(row=0, column=0, sticky="w")
+    ttk.Entry(frame, textvariable=selected_file, width=50).grid(row=0, column=1)
+    ttk.Button(frame, text="Procurar", command=browse_file).grid(row=0, column=2, padx=5)
+    ttk.Button(frame, text="Importar", command=start_import).grid(row=1, column=1, pady=20)
+
+    progress_panel = ProgressPanel(frame)
+    progress_panel.grid(row=2, column=0, columnspan=3)
+
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    main_gui()
@@ -1,15 +1,36 @@
+import json
 import os
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
+from tkinter import ttk, filedialog, messagebox, scrolledtext
 import folium
+import pandas as pd
 from folium.plugins import TimestampedGeoJson
 from file_reader import read_coordinates
 import webbrowser
+from task_runner import ProgressPanel, CHUNK_SIZE
+from artifact_cache import ArtifactCache, code_version
+from history_store import HistoryStore, device_from_path
+from tile_pyramid import TilePyramid, MAX_ZOOM
+from simplification import simplify_track, format_report
+from resampling import resample_frame
+import file_reader
+import resampling
+import simplification
+
+CODE_VERSION = code_version(__file__, file_reader.__file__, simplification.__file__, resampling.__file__)
+MAP_OUTPUTS = ["location_map.html", "timelapse_map.html", "simplificacao.json"]
+# Tolerância (m) da simplificação da trajetória antes de desenhar os mapas
+SIMPLIFY_TOLERANCE_M = 5
+# Passo (s) da grelha de tempo do timelapse: cada fotograma corresponde ao mesmo intervalo
+TIMELAPSE_STEP_S = 30
+# Com a pirâmide de tiles, os pontos do ficheiro só são desenhados por cima até este número
+OVERLAY_MAX_POINTS = 5000
+
+cache = ArtifactCache()
 
 def create_timelapse(coordinates, timestamps, output_file='maps/timelapse_map.html'):
     if not coordinates or not timestamps:
-        messagebox.showwarning("Aviso", "Nenhum dado disponível para criar o timelapse.")
-        return
+        raise ValueError("Nenhum dado disponível para criar o timelapse.")
 
     os.makedirs("maps", exist_ok=True)
 
@@ -34,14 +55,11 @@ def create_timelapse(coordinates, timestamps, output_file='maps/timelapse_map.ht
 
     timestamped_geojson.add_to(map_)
     map_.save(output_file)
+    return output_file
 
-    # Abre os mapas no navegador
-    webbrowser.open(f"file://{os.path.abspath(output_file)}")
-
-def create_static_map(coordinates, output_file='maps/location_map.html'):
+def create_static_map(coordinates, output_file='maps/location_map.html', panel=None, pyramid=None):
     if not coordinates:
-        messagebox.showwarning("Aviso", "Nenhuma coordenada disponível para o mapa.")
-        return
+        raise ValueError("Nenhuma coordenada disponível para o mapa.")
 
     avg_lat = sum(lat for lat, _ in coordinates) / len(coordinates)
     avg_lon = sum(lon for _, lon in coordinates) / len(coordinates)
@@ -49,13 +67,99 @@ def create_static_map(coordinates, output_file='maps/location_map.html'):
     os.makedirs("maps", exist_ok=True)
 
     map_ = folium.Map(location=[avg_lat, avg_lon], zoom_start=12)
-    for lat, lon in coordinates:
-        folium.CircleMarker(location=[lat, lon], radius=5, color='blue').add_to(map_)
+
+    if pyramid is not None:
+        # Histórico pré-desenhado em tiles: o navegador só pede os tiles visíveis
+        folium.TileLayer(
+            tiles=pyramid.tile_url(os.path.dirname(os.path.abspath(output_file))),
+            attr="Histórico de localizações",
+            name="Histórico",
+            overlay=True,
+            max_native_zoom=MAX_ZOOM,
+            max_zoom=19
+        ).add_to(map_)
+        if len(coordinates) > OVERLAY_MAX_POINTS:
+            # Intervalos grandes ficam só nos tiles: milhares de marcadores tornam o HTML pesado
+            map_.save(output_file)
+            return output_file
+
+    starts = panel.chunks(len(coordinates), desc="Mapa estático") if panel else range(0, len(coordinates), CHUNK_SIZE)
+    for start in starts:
+        for lat, lon in coordinates[start:start + CHUNK_SIZE]:
+            folium.CircleMarker(location=[lat, lon], radius=5, color='blue').add_to(map_)
 
     map_.save(output_file)
+    return output_file
+
+def build_maps(file_path, panel):
+    """
+    Executado em segundo plano: lê o CSV e gera o mapa estático e o timelapse,
+    ou reaproveita-os da cache se a entrada e o código não mudaram.
+    """
+    # Se o histórico do dispositivo está no HistoryStore, atualiza a pirâmide de tiles
+    store = HistoryStore()
+    device = device_from_path(file_path)
+    pyramid = None
+    if device in store.devices():
+        pyramid = TilePyramid(device)
+        pyramid.update(store, progress=panel.progress)
+
+    key = cache.key(file_path, {"analise": "mapas", "tiles": pyramid is not None,
+                                "tolerancia": SIMPLIFY_TOLERANCE_M, "passo": TIMELAPSE_STEP_S,
+                                "sobreposicao": OVERLAY_MAX_POINTS}, CODE_VERSION)
+    outputs = cache.lookup(key, MAP_OUTPUTS)
+    if outputs:
+        return list(outputs.values())
+
+    coordinates, timestamps = read_coordinates(file_path, include_timestamps=True)
+    if not coordinates:
+        return []
+
+    # Timelapse sobre a trajetória completa reamostrada numa grelha de tempo regular
+    timeline = resample_frame(pd.DataFrame({
+        "datetime": pd.to_datetime(timestamps),
+        "latitude": [lat for lat, _ in coordinates],
+        "longitude": [lon for _, lon in coordinates],
+    }), TIMELAPSE_STEP_S)
+    with cache.writing(key, "timelapse_map.html") as tmp_path:
+        create_timelapse(list(zip(timeline["latitude"], timeline["longitude"])),
+                         timeline["datetime"].dt.strftime("%Y-%m-%dT%H:%M:%S").tolist(), tmp_path)
+
+    # Nos troços retos a maior parte dos pontos não acrescenta nada ao desenho
+    keep, report = simplify_track([lat for lat, _ in coordinates], [lon for _, lon in coordinates],
+                                  SIMPLIFY_TOLERANCE_M)
+    coordinates = [point for point, kept in zip(coordinates, keep) if kept]
+    with cache.writing(key, "simplificacao.json") as tmp_path:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(report, f)
+
+    with cache.writing(key, "location_map.html") as tmp_path:
+        create_static_map(coordinates, tmp_path, panel=panel, pyramid=pyramid)  # Criar o mapa estático
+
+    output_files = [cache.path(key, name) for name in MAP_OUTPUTS]
+    cache.evict(keep=output_files)
+    return output_files
+
+def open_maps(output_files):
+    """
+    Executado no thread principal: abre os mapas gerados no navegador e mostra
+    o relatório da simplificação no log.
+    """
+    if not output_files:
+        messagebox.showwarning("Aviso", "Nenhuma coordenada foi lida.")
+        return
 
-    # Abrir o arquivo gerado no navegador
-    webbrowser.open(f"file://{os.path.abspath(output_file)}")
+    for output_file in output_files:
+        if output_file.endswith(".html"):
+            webbrowser.open(f"file://{os.path.abspath(output_file)}")
+        else:
+            with open(output_file, encoding="utf-8") as f:
+                report = json.load(f)
+            log_text.configure(state='normal')
+            log_text.insert(tk.END, f"🗺️ Mapas gerados: {os.path.dirname(output_file)}\n")
+            log_text.insert(tk.END, f"🗜️ Simplificação: {format_report(report)}\n")
+            log_text.insert(tk.END, "-" * 50 + "\n")
+            log_text.configure(state='disabled')
 
 def run_mapping():
     file_path = selected_file.get()
@@ -63,16 +167,11 @@ def run_mapping():
         messagebox.showerror("Erro", "Nenhum arquivo selecionado.")
         return
 
-    try:
-        coordinates, timestamps = read_coordinates(file_path, include_timestamps=True)
-        if not coordinates:
-            messagebox.showwarning("Aviso", "Nenhuma coordenada foi lida.")
-            return
-
-        create_static_map(coordinates)  # Criar o mapa estático
-        create_timelapse(coordinates, timestamps)  # Criar o timelapse
-    except Exception as e:
-        messagebox.showerror("Erro", f"Erro ao processar o arquivo:\n{str(e)}")
+    progress_panel.submit(
+        build_maps, file_path, progress_panel,
+        on_done=open_maps,
+        on_error=lambda e: messagebox.showerror("Erro", f"Erro ao processar o arquivo:\n{str(e)}")
+    )
 
 def browse_file():
     filename = filedialog.askopenfilename(
@@ -117,4 +216,10 @@ ttk.Button(frame, text="Procurar", command=browse_file).grid(row=0, column=2, pa
 
 ttk.Button(frame, text="Gerar Mapas", command=run_mapping).grid(row=1, column=1, pady=20)
 
+progress_panel = ProgressPanel(frame)
+progress_panel.grid(row=2, column=0, columnspan=3)
+
+log_text = scrolledtext.ScrolledText(frame, wrap=tk.WORD, height=6, width=80, state='disabled')
+log_text.grid(row=3, column=0, columnspan=3, pady=10)
+
 root.mainloop()
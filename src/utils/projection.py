@@ -0,0 +1,57 @@
+from functools import lru_cache
+import numpy as np
+from pyproj import Transformer
+
+WGS84 = "EPSG:4326"
+WEB_MERCATOR = "EPSG:3857"
+MERCATOR_ORIGIN = 20037508.342789244  # metade da largura do mundo em Web Mercator
+MAX_MERCATOR_LAT = 85.05112878  # latitude do limite superior/inferior do mapa Web Mercator
+
+
+@lru_cache(maxsize=None)
+def get_transformer(source=WGS84, target=WEB_MERCATOR):
+    """
+    Transformer do pyproj entre dois CRS, criado uma única vez por par.
+    Usa sempre a ordem (x, y) = (longitude, latitude).
+    """
+    return Transformer.from_crs(source, target, always_xy=True)
+
+
+def to_web_mercator(lat, lon):
+    """
+    Converte arrays de latitude/longitude em metros Web Mercator (x, y).
+    As latitudes fora do mapa são limitadas a ±MAX_MERCATOR_LAT.
+    """
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT)
+    x, y = get_transformer(WGS84, WEB_MERCATOR).transform(np.asarray(lon, dtype=np.float64), lat)
+    return np.asarray(x), np.asarray(y)
+
+
+def from_web_mercator(x, y):
+    """
+    Converte metros Web Mercator (x, y) em arrays de latitude/longitude.
+    """
+    lon, lat = get_transformer(WEB_MERCATOR, WGS84).transform(x, y)
+    return lat, lon
+
+
+def utm_crs(lat, lon):
+    """
+    Código EPSG da zona UTM (WGS84) que contém o ponto (lat, lon).
+    """
+    zone = int((lon + 180) // 6) % 60 + 1
+    return f"EPSG:{(32600 if lat >= 0 else 32700) + zone}"
+
+
+def to_utm(lat, lon):
+    """
+    Converte arrays de latitude/longitude em metros na zona UTM do ponto mediano,
+    onde as distâncias são quase exatas (ao contrário do Web Mercator, que as
+    aumenta com a latitude).
+
+    :return: (x, y, crs)
+    """
+    lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+    crs = utm_crs(float(np.nanmedian(lat)), float(np.nanmedian(lon)))
+    x, y = get_transformer(WGS84, crs).transform(lon, lat)
+    return np.asarray(x), np.asarray(y), crs
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+from file_reader import parse_datetime
+from history_store import to_epoch
+
+DEFAULT_STEP_S = 60
+# Intervalo máximo entre duas amostras reais para interpolar entre elas; acima disto a
+# grelha fica sem pontos (o veículo pode ter feito qualquer percurso)
+MAX_GAP_S = 5 * 60
+RESAMPLE_CHUNK_ROWS = 100000
+
+
+def _to_unit_vectors(lat, lon):
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def great_circle_interpolate(lat1, lon1, lat2, lon2, fraction):
+    """
+    Posição a uma fração do caminho entre dois pontos, ao longo do círculo máximo
+    (interpolação esférica). Vetorizada.
+    """
+    a, b = _to_unit_vectors(lat1, lon1), _to_unit_vectors(lat2, lon2)
+    omega = np.arccos(np.clip(np.sum(a * b, axis=-1), -1.0, 1.0))
+    sin_omega = np.sin(omega)
+    fraction = np.asarray(fraction, dtype=np.float64)
+    # Pontos (quase) coincidentes: a interpolação linear é exata à precisão do double
+    small = sin_omega < 1e-12
+    safe = np.where(small, 1.0, sin_omega)
+    wa = np.where(small, 1 - fraction, np.sin((1 - fraction) * omega) / safe)
+    wb = np.where(small, fraction, np.sin(fraction * omega) / safe)
+    p = wa[..., None] * a + wb[..., None] * b
+    lat = np.degrees(np.arctan2(p[..., 2], np.hypot(p[..., 0], p[..., 1])))
+    lon = np.degrees(np.arctan2(p[..., 1], p[..., 0]))
+    return lat, lon
+
+
+def resample_track(epoch, lat, lon, speed=None, step_s=DEFAULT_STEP_S, max_gap_s=MAX_GAP_S, after=None):
+    """
+    Projeta uma trajetória (ordenada por epoch) numa grelha de tempo fixa, alinhada com
+    múltiplos de step_s desde 1970 para que dias e blocos diferentes partilhem os
+    mesmos instantes. A posição é interpolada ao longo do círculo máximo entre as
+    amostras vizinhas e a velocidade é a da última amostra (carry forward). Instantes
+    entre amostras separadas mais de max_gap_s ficam de fora.
+
+    :param after: Se indicado, só devolve instantes > after (usado entre blocos).
+    :return: Dicionário de arrays "epoch", "latitude", "longitude" (e "speed_kmh" se speed for dado).
+    """
+    epoch = np.asarray(epoch, dtype=np.int64)
+    lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+    valid = np.isfinite(lat) & np.isfinite(lon)
+    epoch, lat, lon = epoch[valid], lat[valid], lon[valid]
+    if speed is not None:
+        speed = np.asarray(speed, dtype=np.float64)[valid]
+
+    result = {"epoch": np.empty(0, dtype=np.int64), "latitude": np.empty(0), "longitude": np.empty(0)}
+    if speed is not None:
+        result["speed_kmh"] = np.empty(0)
+    if len(epoch) == 0:
+        return result
+
+    first = -(-epoch[0] // step_s) * step_s
+    if after is not None:
+        first = max(first, (after // step_s + 1) * step_s)
+    grid = np.arange(first, epoch[-1] + 1, step_s, dtype=np.int64)
+
+    # Amostra anterior (i) e seguinte (j) de cada instante da grelha
+    i = np.searchsorted(epoch, grid, side="right") - 1
+    j = np.minimum(i + 1, len(epoch) - 1)
+    exact = epoch[i] == grid
+    gap = epoch[j] - epoch[i]
+    keep = exact | ((gap > 0) & (gap <= max_gap_s))
+    grid, i, j, gap, exact = grid[keep], i[keep], j[keep], gap[keep], exact[keep]
+
+    fraction = np.where(exact, 0.0, (grid - epoch[i]) / np.where(gap > 0, gap, 1))
+    result["epoch"] = grid
+    result["latitude"], result["longitude"] = great_circle_interpolate(lat[i], lon[i], lat[j], lon[j], fraction)
+    if speed is not None:
+        result["speed_kmh"] = speed[i]
+    return result
+
+
+def resample_frame(df, step_s=DEFAULT_STEP_S, max_gap_s=MAX_GAP_S, time_col="datetime"):
+    """
+    resample_track sobre um DataFrame com time_col, latitude, longitude e, opcionalmente,
+    speed_kmh. Devolve um DataFrame com "datetime", latitude, longitude (e speed_kmh).
+    """
+    df = df.dropna(subset=[time_col]).sort_values(time_col, kind="stable")
+    speed = pd.to_numeric(df["speed_kmh"], errors="coerce") if "speed_kmh" in df.columns else None
+    arrays = resample_track(to_epoch(df[time_col]), df["latitude"], df["longitude"], speed, step_s, max_gap_s)
+    return _frame(arrays)
+
+
+def _frame(arrays):
+    resampled = pd.DataFrame(arrays)
+    resampled.insert(0, "datetime", pd.to_datetime(resampled.pop("epoch"), unit="s"))
+    return resampled
+
+
+def iter_resampled_csv(csv_path, step_s=DEFAULT_STEP_S, max_gap_s=MAX_GAP_S, chunksize=RESAMPLE_CHUNK_ROWS):
+    """
+    Reamostra um CSV (latitude, longitude, date, time e, opcionalmente, speed_kmh) bloco
+    a bloco, sem o carregar inteiro. A última amostra de cada bloco é levada para o
+    seguinte, para interpolar os instantes entre blocos sem repetir nenhum.
+    O CSV deve estar ordenado por data/hora, como os gerados pelo data_filter.
+    """
+    carry = None
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+        chunk.columns = chunk.columns.str.strip().str.lower()
+        chunk["datetime"] = parse_datetime(chunk["date"].astype(str) + " " + chunk["time"].astype(str))
+        columns = ["datetime", "latitude", "longitude"] + (["speed_kmh"] if "speed_kmh" in chunk.columns else [])
+        chunk = chunk[columns].dropna(subset=["datetime"])
+        after = None
+        if carry is not None:
+            after = int(to_epoch(carry["datetime"])[0])
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        located = chunk.dropna(subset=["latitude", "longitude"])
+        if len(located):
+            carry = located.iloc[[-1]]
+
+        speed = pd.to_numeric(chunk["speed_kmh"], errors="coerce") if "speed_kmh" in chunk.columns else None
+        arrays = resample_track(to_epoch(chunk["datetime"]), chunk["latitude"], chunk["longitude"],
+                                speed, step_s, max_gap_s, after=after)
+        if len(arrays["epoch"]):
+            yield _frame(arrays)
@@ -0,0 +1,151 @@
+import csv
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree
+
+# Gazetteer local no formato do GeoNames: o dump original (ex.: cities500.txt, separado
+# por tabs e sem cabeçalho) ou um CSV com as colunas name, latitude, longitude e country
+GAZETTEER_PATHS = [os.path.join("data", "gazetteer.csv"), os.path.join("data", "gazetteer.txt")]
+GEOCACHE_PATH = os.path.join("data", "geocache.sqlite")
+CACHE_DECIMALS = 4  # chave da cache: coordenadas arredondadas a ~11 m
+MAX_DISTANCE_KM = 5  # acima disto o ponto fica sem nome
+EARTH_RADIUS_KM = 6371.0088
+GEONAMES_COLUMNS = {1: "name", 4: "latitude", 5: "longitude", 8: "country"}
+
+
+def load_gazetteer(path):
+    """
+    Lê um gazetteer (dump do GeoNames ou CSV com cabeçalho) para um DataFrame com
+    name, latitude, longitude e country.
+    """
+    if path.endswith(".txt"):
+        df = pd.read_csv(path, sep="\t", header=None, usecols=list(GEONAMES_COLUMNS), quoting=csv.QUOTE_NONE,
+                         keep_default_na=False, dtype={1: str, 8: str}).rename(columns=GEONAMES_COLUMNS)
+    else:
+        df = pd.read_csv(path, keep_default_na=False)
+        df.columns = df.columns.str.strip().str.lower()
+        df = df.rename(columns={"lat": "latitude", "lon": "longitude", "lng": "longitude",
+                                "country_code": "country", "country code": "country"})
+        if not {"name", "latitude", "longitude"}.issubset(df.columns):
+            raise ValueError("O gazetteer precisa das colunas name, latitude e longitude.")
+        if "country" not in df.columns:
+            df["country"] = ""
+
+    df["latitude"] = pd.to_numeric(df["latitude"], errors="coerce")
+    df["longitude"] = pd.to_numeric(df["longitude"], errors="coerce")
+    df = df.dropna(subset=["latitude", "longitude"]).reset_index(drop=True)
+    return df[["name", "latitude", "longitude", "country"]]
+
+
+class ReverseGeocoder:
+    """
+    Geocodificação inversa offline: o nome do lugar do gazetteer mais próximo de cada
+    ponto, procurado numa BallTree (distância haversine) em lote.
+
+    Os resultados ficam numa cache SQLite, com chave nas coordenadas arredondadas, que
+    persiste entre execuções; a árvore só é construída se houver pontos fora da cache.
+    A cache é esvaziada quando o gazetteer ou a distância máxima mudam.
+    """
+
+    def __init__(self, gazetteer_path, cache_path=GEOCACHE_PATH, max_distance_km=MAX_DISTANCE_KM):
+        self.gazetteer_path = gazetteer_path
+        self.cache_path = cache_path
+        self.max_distance_km = max_distance_km
+        stat = os.stat(gazetteer_path)
+        self.version = f"{os.path.basename(gazetteer_path)}:{stat.st_size}:{stat.st_mtime_ns}:{max_distance_km}"
+        self._tree = None
+        self._labels = None
+
+    @classmethod
+    def default(cls):
+        """
+        Geocodificador com o gazetteer da pasta 'data', ou None se não existir nenhum.
+        """
+        for path in GAZETTEER_PATHS:
+            if os.path.exists(path):
+                return cls(path)
+        return None
+
+    def _index(self):
+        if self._tree is None:
+            places = load_gazetteer(self.gazetteer_path)
+            self._tree = BallTree(np.radians(places[["latitude", "longitude"]].to_numpy()), metric="haversine")
+            countries = places["country"].astype(str)
+            self._labels = np.where(countries != "", places["name"] + " (" + countries + ")", places["name"])
+        return self._tree
+
+    def _connect(self):
+        con = sqlite3.connect(self.cache_path)
+        con.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        con.execute("CREATE TABLE IF NOT EXISTS places "
+                    "(lat_key INTEGER, lon_key INTEGER, label TEXT, PRIMARY KEY (lat_key, lon_key))")
+        row = con.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row is None or row[0] != self.version:
+            con.execute("DELETE FROM places")
+            con.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (self.version,))
+            con.commit()
+        return con
+
+    def _resolve(self, keys):
+        """
+        Nome do lugar mais próximo do centro de cada chave ("" se estiver longe demais).
+        """
+        self._index()
+        points = np.radians(keys / 10 ** CACHE_DECIMALS)
+        distance, index = self._tree.query(points, k=1)
+        labels = self._labels[index[:, 0]].astype(object)
+        labels[distance[:, 0] * EARTH_RADIUS_KM > self.max_distance_km] = ""
+        return labels
+
+    def lookup(self, lat, lon):
+        """
+        Nomes dos lugares (ou None) para arrays de latitude/longitude.
+        """
+        lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+        result = np.full(len(lat), None, dtype=object)
+        valid = np.isfinite(lat) & np.isfinite(lon)
+        if not valid.any():
+            return result
+
+        scale = 10 ** CACHE_DECIMALS
+        keys = np.column_stack([np.round(lat[valid] * scale), np.round(lon[valid] * scale)]).astype(np.int64)
+        unique_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+
+        con = self._connect()
+        try:
+            con.execute("CREATE TEMP TABLE wanted (lat_key INTEGER, lon_key INTEGER)")
+            con.executemany("INSERT INTO wanted VALUES (?, ?)", unique_keys.tolist())
+            cached = {(a, b): label for a, b, label in con.execute(
+                "SELECT p.lat_key, p.lon_key, p.label FROM places p JOIN wanted w USING (lat_key, lon_key)")}
+
+            labels = np.array([cached.get((a, b)) for a, b in unique_keys.tolist()], dtype=object)
+            missing = np.flatnonzero(labels == None)  # noqa: E711 (comparação elemento a elemento)
+            if len(missing):
+                labels[missing] = self._resolve(unique_keys[missing])
+                con.executemany("INSERT OR REPLACE INTO places VALUES (?, ?, ?)",
+                                zip(*unique_keys[missing].T.tolist(), labels[missing].tolist()))
+                con.commit()
+        finally:
+            con.close()
+
+        labels[labels == ""] = None
+        result[valid] = labels[inverse.reshape(-1)]
+        return result
+
+
+def label_stops(stops, geocoder):
+    """
+    Acrescenta a coluna "place" (nome do lugar) a uma tabela de paradas.
+    """
+    return stops.assign(place=geocoder.lookup(stops["latitude"], stops["longitude"]))
+
+
+def label_trips(trips, geocoder):
+    """
+    Acrescenta as colunas "start_place" e "end_place" a uma tabela de viagens, numa só consulta.
+    """
+    labels = geocoder.lookup(np.concatenate([trips["start_latitude"], trips["end_latitude"]]),
+                             np.concatenate([trips["start_longitude"], trips["end_longitude"]]))
+    return trips.assign(start_place=labels[:len(trips)], end_place=labels[len(trips):])
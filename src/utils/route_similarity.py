@@ -0,0 +1,277 @@
+import os
+import tkinter as tk
+from concurrent.futures import ProcessPoolExecutor
+from tkinter import ttk, filedialog, messagebox, scrolledtext
+import numpy as np
+import shapely
+from history_store import device_from_path
+from projection import to_utm
+from task_runner import ProgressPanel
+from trip_segmentation import TRIPS_DIR, load_track, trip_index_for
+
+SIGNATURE_POINTS = 32  # pontos de cada assinatura, igualmente espaçados ao longo do percurso
+BAND = 4  # largura da banda (Sakoe-Chiba) do DTW/Fréchet, em pontos da assinatura
+ROUTE_THRESHOLD_M = 200  # distância máxima entre duas viagens da mesma rota
+METRICS = ("dtw", "frechet")
+PAIRS_PER_BATCH = 5000
+PARALLEL_MIN_PAIRS = 20000  # abaixo disto não compensa arrancar processos
+
+
+def trip_signature(x, y, n=SIGNATURE_POINTS):
+    """
+    Assinatura de tamanho fixo de um percurso: n pontos igualmente espaçados ao longo
+    da distância percorrida, em metros. Torna comparáveis viagens com amostragens diferentes.
+    """
+    steps = np.hypot(np.diff(x), np.diff(y))
+    along = np.concatenate([[0.0], np.cumsum(steps)])
+    targets = np.linspace(0.0, along[-1], n)
+    return np.column_stack([np.interp(targets, along, x), np.interp(targets, along, y)])
+
+
+def trip_signatures(df, trips, n=SIGNATURE_POINTS):
+    """
+    Assinaturas (array n_viagens x n x 2) das viagens do índice, a partir dos pontos em df
+    projetados em UTM. Viagens com menos de dois pontos válidos são ignoradas.
+
+    :return: (ids das viagens incluídas, assinaturas).
+    """
+    x, y, _ = to_utm(df["latitude"], df["longitude"])
+    signatures, trip_ids = [], []
+    for trip_id, row_start, row_end in zip(trips.index, trips["row_start"], trips["row_end"]):
+        tx, ty = x[row_start:row_end + 1], y[row_start:row_end + 1]
+        valid = np.isfinite(tx) & np.isfinite(ty)
+        if valid.sum() >= 2:
+            signatures.append(trip_signature(tx[valid], ty[valid], n))
+            trip_ids.append(trip_id)
+    signatures = np.array(signatures).reshape(-1, n, 2)
+    return np.array(trip_ids), signatures
+
+
+def candidate_pairs(signatures, threshold=ROUTE_THRESHOLD_M):
+    """
+    Pares (i, j), i < j, que podem ser a mesma rota: inícios a menos do limiar (consulta
+    a um STRtree dos pontos de início), fins a menos do limiar e caixas envolventes,
+    alargadas pelo limiar, que se intersetam. Só estes pares são comparados.
+    """
+    if len(signatures) < 2:
+        return np.empty((0, 2), dtype=np.int64)
+    starts = shapely.points(signatures[:, 0, 0], signatures[:, 0, 1])
+    i, j = shapely.STRtree(starts).query(starts, predicate="dwithin", distance=threshold)
+    keep = i < j
+    i, j = i[keep], j[keep]
+
+    # A mesma rota acaba no mesmo sítio (e é feita no mesmo sentido)
+    end_gap = np.hypot(*(signatures[i, -1] - signatures[j, -1]).T)
+    low, high = signatures.min(axis=1) - threshold, signatures.max(axis=1) + threshold
+    overlap = np.all((low[i] <= high[j]) & (low[j] <= high[i]), axis=1)
+    keep = (end_gap <= threshold) & overlap
+    return np.column_stack([i[keep], j[keep]])
+
+
+def banded_distance(a, b, band=BAND, metric="dtw"):
+    """
+    DTW ou distância de Fréchet discreta entre pares de assinaturas (arrays pares x n x 2),
+    restrita a uma banda de largura band em torno da diagonal. Vetorizada sobre os pares;
+    só guarda duas linhas da matriz de programação dinâmica.
+
+    :return: Distância por par, em metros (no DTW, a média por ponto).
+    """
+    pairs, n, _ = a.shape
+    previous = np.full((pairs, n + 1), np.inf)
+    previous[:, 0] = 0.0
+    for i in range(1, n + 1):
+        current = np.full((pairs, n + 1), np.inf)
+        for j in range(max(1, i - band), min(n, i + band) + 1):
+            cost = np.hypot(a[:, i - 1, 0] - b[:, j - 1, 0], a[:, i - 1, 1] - b[:, j - 1, 1])
+            best = np.minimum(np.minimum(previous[:, j], current[:, j - 1]), previous[:, j - 1])
+            current[:, j] = cost + best if metric == "dtw" else np.maximum(cost, best)
+        previous = current
+    return previous[:, n] / n if metric == "dtw" else previous[:, n]
+
+
+def _distance_batch(args):
+    a, b, band, metric = args
+    return banded_distance(a, b, band, metric)
+
+
+def pair_distances(signatures, pairs, band=BAND, metric="dtw", progress=None, workers=None):
+    """
+    Distâncias dos pares candidatos, em blocos. Com muitos pares, os blocos são
+    distribuídos por um pool de processos.
+    """
+    batches = [(signatures[chunk[:, 0]], signatures[chunk[:, 1]], band, metric)
+               for chunk in np.array_split(pairs, max(1, -(-len(pairs) // PAIRS_PER_BATCH)))]
+    if len(pairs) < PARALLEL_MIN_PAIRS:
+        results = map(_distance_batch, batches)
+        if progress:
+            results = progress(results, total=len(batches), desc="Comparação")
+        results = list(results)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(_distance_batch, batches)
+            if progress:
+                results = progress(results, total=len(batches), desc="Comparação")
+            try:
+                results = list(results)
+            except BaseException:
+                # Cancelado (ou erro): descarta os blocos ainda em fila em vez de esperar por eles
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+    return np.concatenate(results) if results else np.empty(0)
+
+
+def route_families(n, pairs):
+    """
+    Agrupa n viagens em famílias (componentes ligadas) a partir dos pares semelhantes,
+    com union-find. Devolve o número da família de cada viagem, 0 para a maior.
+    """
+    parent = np.arange(n)
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in pairs:
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+    roots = np.array([find(i) for i in range(n)], dtype=np.int64)
+
+    # Numera as famílias por tamanho decrescente
+    unique, inverse, counts = np.unique(roots, return_inverse=True, return_counts=True)
+    rank = np.empty(len(unique), dtype=np.int64)
+    rank[np.argsort(-counts, kind="stable")] = np.arange(len(unique))
+    return rank[inverse]
+
+
+def group_routes(signatures, threshold=ROUTE_THRESHOLD_M, band=BAND, metric="dtw", progress=None, workers=None):
+    """
+    Famílias de rotas: pré-filtro espacial, distância com banda só nos candidatos e union-find.
+
+    :return: (família de cada assinatura, pares candidatos, distâncias dos candidatos).
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Métrica desconhecida: {metric}")
+    pairs = candidate_pairs(signatures, threshold)
+    distances = pair_distances(signatures, pairs, band, metric, progress, workers)
+    families = route_families(len(signatures), pairs[distances <= threshold])
+    return families, pairs, distances
+
+
+def routes_path(device, directory=TRIPS_DIR):
+    return os.path.join(directory, f"{device}_routes.csv")
+
+
+def find_repeated_routes(csv_path, threshold=ROUTE_THRESHOLD_M, metric="dtw", panel=None):
+    """
+    Agrupa as viagens de um CSV filtrado em famílias de rotas repetidas e guarda
+    a família de cada viagem em data/trips/<dispositivo>_routes.csv.
+
+    :return: (tabela das viagens com a família, caminho do CSV, número de pares comparados).
+    """
+    device = device_from_path(csv_path)
+    trips = trip_index_for(csv_path)
+    if trips.empty:
+        raise ValueError("O ficheiro não tem viagens.")
+
+    trip_ids, signatures = trip_signatures(load_track(csv_path), trips)
+    families, pairs, _ = group_routes(signatures, threshold, metric=metric,
+                                      progress=panel.progress if panel else None)
+
+    routes = trips.loc[trip_ids, ["start_time", "end_time", "distance_m", "duration_s"]].copy()
+    routes["family"] = families
+    routes["family_size"] = routes.groupby("family")["family"].transform("size")
+    output_path = routes_path(device)
+    routes.to_csv(output_path)
+    return routes, output_path, len(pairs)
+
+
+def main_gui():
+    root = tk.Tk()
+    root.title("Rotas Repetidas")
+    root.attributes("-fullscreen", True)
+    root.resizable(False, False)
+
+    description = f"""
+Descubra quais viagens são a mesma rota (o mesmo trajeto casa-trabalho, a mesma volta de entregas).
+
+Cada viagem é reduzida a {SIGNATURE_POINTS} pontos ao longo do percurso; só as viagens com início, fim e
+área próximos são comparadas (DTW ou Fréchet) e as semelhantes formam uma família de rotas.
+
+Instruções:
+1. Selecione um arquivo CSV filtrado.
+2. Escolha a métrica e a distância máxima (m) entre viagens da mesma rota.
+3. Clique em "Agrupar Rotas".
+"""
+    label_description = tk.Label(root, text=description, font=("Arial", 18), justify="left", padx=10, pady=40)
+    label_description.pack(fill=tk.BOTH, padx=30, pady=0)
+
+    frame = ttk.Frame(root, padding=10)
+    frame.pack()
+
+    selected_file = tk.StringVar()
+    selected_metric = tk.StringVar(value="dtw")
+
+    def browse_file():
+        filename = filedialog.askopenfilename(
+            title="Escolha um arquivo CSV",
+            filetypes=[("CSV files", "*.csv")],
+            initialdir="data"
+        )
+        if filename:
+            selected_file.set(filename)
+
+    log_text = scrolledtext.ScrolledText(root, wrap=tk.WORD, height=15, state='disabled')
+    log_text.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
+
+    def show_result(result):
+        routes, output_path, n_pairs = result
+        repeated = routes[routes["family_size"] > 1]
+        log_text.configure(state='normal')
+        log_text.insert(tk.END, f"\n🚗 Viagens: {len(routes)}, pares comparados: {n_pairs}\n")
+        log_text.insert(tk.END, f"🔁 Rotas repetidas: {repeated['family'].nunique()} "
+                                f"({len(repeated)} viagens)\n")
+        for family, group in list(repeated.groupby("family"))[:10]:
+            log_text.insert(tk.END, f"  Rota {family}: {len(group)} viagens, "
+                                    f"{group['distance_m'].mean() / 1000:.1f} km em média\n")
+        log_text.insert(tk.END, f"✅ Arquivo salvo como: {output_path}\n")
+        log_text.insert(tk.END, "-" * 50 + "\n")
+        log_text.configure(state='disabled')
+
+    def start_grouping():
+        csv_path = selected_file.get()
+        if not csv_path:
+            messagebox.showerror("Erro", "Nenhum arquivo selecionado.")
+            return
+        try:
+            threshold = float(entry_threshold.get())
+        except ValueError:
+            messagebox.showerror("Erro", "A distância máxima deve ser um número.")
+            return
+        progress_panel.submit(find_repeated_routes, csv_path, threshold, selected_metric.get(), progress_panel,
+                              on_done=show_result)
+
+    ttk.Label(frame, text="Arquivo CSV:").grid(row=0, column=0, sticky="w")
+    ttk.Entry(frame, textvariable=selected_file, width=50).grid(row=0, column=1)
+    ttk.Button(frame, text="Procurar", command=browse_file).grid(row=0, column=2, padx=5)
+
+    ttk.Label(frame, text="Métrica:").grid(row=1, column=0, sticky="w", pady=(10, 0))
+    ttk.Combobox(frame, textvariable=selected_metric, values=METRICS, state="readonly").grid(row=1, column=1, pady=(10, 0))
+
+    ttk.Label(frame, text="Distância máxima (m):").grid(row=2, column=0, sticky="w", pady=(10, 0))
+    entry_threshold = ttk.Entry(frame)
+    entry_threshold.insert(0, str(ROUTE_THRESHOLD_M))
+    entry_threshold.grid(row=2, column=1, pady=(10, 0))
+
+    ttk.Button(frame, text="Agrupar Rotas", command=start_grouping).grid(row=3, column=1, pady=20)
+
+    progress_panel = ProgressPanel(frame)
+    progress_panel.grid(row=4, column=0, columnspan=3)
+
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    main_gui()
@@ -0,0 +1,134 @@
+import heapq
+import numpy as np
+from projection import to_utm
+
+DEFAULT_TOLERANCE_M = 5.0
+METHODS = ("rdp", "visvalingam")
+
+
+def _segment_distance(px, py, ax, ay, bx, by):
+    """
+    Distância (vetorizada) dos pontos p aos segmentos a-b, em unidades das coordenadas.
+    """
+    dx, dy = bx - ax, by - ay
+    length2 = dx * dx + dy * dy
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = np.where(length2 > 0, ((px - ax) * dx + (py - ay) * dy) / length2, 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    return np.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+def rdp_mask(x, y, tolerance):
+    """
+    Ramer-Douglas-Peucker: mantém os pontos que se afastam mais de tolerance da reta
+    entre os pontos mantidos. Iterativo (sem recursão) e vetorizado por segmento.
+    """
+    n = len(x)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    keep[0] = keep[-1] = True
+
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        distances = _segment_distance(x[start + 1:end], y[start + 1:end], x[start], y[start], x[end], y[end])
+        i = int(np.argmax(distances))
+        if distances[i] > tolerance:
+            index = start + 1 + i
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    return keep
+
+
+def visvalingam_mask(x, y, tolerance):
+    """
+    Visvalingam-Whyatt: remove repetidamente o ponto cujo triângulo com os vizinhos
+    tem a menor área, até todas as áreas efetivas serem >= tolerance² (m²).
+    """
+    n = len(x)
+    if n < 3:
+        return np.ones(n, dtype=bool)
+    xs, ys = x.tolist(), y.tolist()
+    previous = list(range(-1, n - 1))
+    following = list(range(1, n + 1))
+
+    def area(i):
+        a, b = previous[i], following[i]
+        return abs((xs[a] - xs[i]) * (ys[b] - ys[i]) - (xs[b] - xs[i]) * (ys[a] - ys[i])) / 2
+
+    areas = [float("inf")] + [area(i) for i in range(1, n - 1)] + [float("inf")]
+    heap = [(areas[i], i) for i in range(1, n - 1)]
+    heapq.heapify(heap)
+    removed = np.zeros(n, dtype=bool)
+    threshold = tolerance * tolerance
+
+    while heap:
+        current, i = heapq.heappop(heap)
+        if removed[i] or current != areas[i]:
+            continue  # entrada desatualizada
+        if current >= threshold:
+            break
+        removed[i] = True
+        a, b = previous[i], following[i]
+        following[a], previous[b] = b, a
+        for j in (a, b):
+            if 0 < j < n - 1:
+                # A área efetiva nunca desce abaixo da do ponto removido
+                areas[j] = max(area(j), current)
+                heapq.heappush(heap, (areas[j], j))
+    return ~removed
+
+
+def max_deviation(x, y, keep):
+    """
+    Maior distância de um ponto removido ao segmento entre os pontos mantidos que o rodeiam.
+    """
+    kept = np.flatnonzero(keep)
+    if len(kept) == 0:
+        return 0.0
+    rows = np.arange(len(x))
+    before = kept[np.maximum(np.searchsorted(kept, rows, side="right") - 1, 0)]
+    after = kept[np.minimum(np.searchsorted(kept, rows, side="left"), len(kept) - 1)]
+    distances = _segment_distance(x, y, x[before], y[before], x[after], y[after])
+    return float(distances.max())
+
+
+def simplify_track(lat, lon, tolerance_m=DEFAULT_TOLERANCE_M, method="rdp"):
+    """
+    Simplifica uma trajetória com uma tolerância em metros, calculada em coordenadas
+    UTM (ver projection.to_utm). Pontos sem coordenadas válidas são descartados.
+
+    :param method: "rdp" (Ramer-Douglas-Peucker) ou "visvalingam".
+    :return: (máscara dos pontos a manter, relatório com a redução e o desvio máximo).
+    """
+    if method not in METHODS:
+        raise ValueError(f"Método de simplificação desconhecido: {method}")
+    lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+    keep = np.zeros(len(lat), dtype=bool)
+    valid = np.isfinite(lat) & np.isfinite(lon)
+    report = {"method": method, "tolerance_m": tolerance_m, "crs": None, "points_before": len(lat),
+              "points_after": 0, "reduction": 0.0, "max_deviation_m": 0.0}
+    if not valid.any():
+        return keep, report
+
+    x, y, crs = to_utm(lat[valid], lon[valid])
+    mask = rdp_mask(x, y, tolerance_m) if method == "rdp" else visvalingam_mask(x, y, tolerance_m)
+    keep[valid] = mask
+
+    report.update(
+        crs=crs,
+        points_after=int(keep.sum()),
+        reduction=float(1 - keep.sum() / len(lat)),
+        max_deviation_m=max_deviation(x, y, mask),
+    )
+    return keep, report
+
+
+def format_report(report):
+    return (f"{report['points_before']} -> {report['points_after']} pontos "
+            f"(-{report['reduction']:.0%}, {report['method']}, tolerância {report['tolerance_m']:g} m, "
+            f"desvio máximo {report['max_deviation_m']:.1f} m)")
@@ -4,100 +4,150 @@ from tkinter import filedialog, messagebox, ttk
 import folium
 import pandas as pd
 import matplotlib.pyplot as plt
-from folium.plugins import HeatMap
 import webbrowser
-
-def identify_stopped_locations(file_path):
-    if not file_path:
-        messagebox.showerror("Erro", "Nenhum arquivo selecionado.")
-        return
+import numpy as np
+from task_runner import ProgressPanel
+from artifact_cache import ArtifactCache, code_version
+from heatmap_bins import add_binned_heatmap
+from reverse_geocoding import ReverseGeocoder
+import heatmap_bins
+import projection
+import reverse_geocoding
+
+CODE_VERSION = code_version(__file__, heatmap_bins.__file__, projection.__file__, reverse_geocoding.__file__)
+STOP_OUTPUTS = ["mapa_paradas.html", "grafico_paradas.png"]
+STOP_SPEED_KMH = 4
+MIN_STOP_MINUTES = 5
+
+cache = ArtifactCache()
+
+def find_stops(df, time_col="time", speed_threshold=STOP_SPEED_KMH, min_minutes=MIN_STOP_MINUTES):
+    """
+    Identifica as paradas: sequências de pelo menos dois pontos com velocidade
+    <= speed_threshold, durante pelo menos min_minutes, terminadas por um ponto
+    mais rápido. df deve estar ordenado por tempo.
+
+    :return: DataFrame com uma linha por parada (start_row/end_row são posições em df).
+    """
+    slow = (df["speed_kmh"] <= speed_threshold).to_numpy(dtype=np.int8)
+    edges = np.diff(np.concatenate([[0], slow, [0]]))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+
+    # Só contam as paradas que terminam (seguidas de um ponto em movimento)
+    closed = ends < len(df) - 1
+    starts, ends = starts[closed], ends[closed]
+
+    times = pd.to_datetime(df[time_col]).to_numpy()
+    duration = (times[ends] - times[starts]) / np.timedelta64(1, "s")
+    keep = (ends > starts) & (duration >= min_minutes * 60)
+    starts, ends = starts[keep], ends[keep]
+
+    return pd.DataFrame({
+        "start_row": starts,
+        "end_row": ends,
+        "start_time": times[starts],
+        "end_time": times[ends],
+        "duration_s": duration[keep],
+        "latitude": df["latitude"].to_numpy()[starts],
+        "longitude": df["longitude"].to_numpy()[starts],
+    })
+
+def identify_stopped_locations(file_path, panel):
+    """
+    Parte pesada da análise, executada em segundo plano: identifica as paradas
+    e gera o mapa. Devolve a chave na cache, os caminhos dos artefactos e os horários
+    das paradas (None se os artefactos já existiam), ou None se não houver paradas.
+    """
+    geocoder = ReverseGeocoder.default()
+    key = cache.key(file_path, {"analise": "paradas", "velocidade": STOP_SPEED_KMH, "minutos": MIN_STOP_MINUTES,
+                                "gazetteer": geocoder.version if geocoder else None}, CODE_VERSION)
+    outputs = cache.lookup(key, STOP_OUTPUTS)
+    if outputs:
+        return key, outputs, None
 
     df = pd.read_csv(file_path)
     df.columns = df.columns.str.strip()
 
     required_cols = {"speed_kmh", "latitude", "longitude", "time"}
     if not required_cols.issubset(df.columns):
-        messagebox.showerror("Erro", "Colunas essenciais ausentes no CSV.")
-        return
+        raise ValueError("Colunas essenciais ausentes no CSV.")
 
     df["speed_kmh"] = pd.to_numeric(df["speed_kmh"], errors="coerce")
     df["time"] = pd.to_datetime(df["time"], errors="coerce")
     df.dropna(subset=["speed_kmh", "time", "latitude", "longitude"], inplace=True)
 
-    stopped_locations = []
-    current_stop = []
-    stop_times = []
-
-    for i in range(len(df)):
-        if df.iloc[i]["speed_kmh"] <= 4:
-            current_stop.append(df.iloc[i])
-        else:
-            if len(current_stop) > 1:
-                start_time = current_stop[0]["time"]
-                end_time = current_stop[-1]["time"]
-                duration = (end_time - start_time).total_seconds() / 60
-                if duration >= 5:
-                    stopped_locations.append(current_stop[0])
-                    stop_times.append(start_time.strftime("%H:%M"))
-            current_stop = []
-
-    if stopped_locations:
-        map_center = [stopped_locations[0]["latitude"], stopped_locations[0]["longitude"]]
-        folium_map = folium.Map(location=map_center, zoom_start=14)
-
-        for stop in stopped_locations:
-            folium.Marker(
-                location=[stop["latitude"], stop["longitude"]],
-                popup="Parado por pelo menos 5 minutos",
-                icon=folium.Icon(color="red")
-            ).add_to(folium_map)
-
-        heat_data = [[stop["latitude"], stop["longitude"]] for stop in stopped_locations]
-        HeatMap(heat_data).add_to(folium_map)
-
-        os.makedirs("maps", exist_ok=True)
-        folium_map.save("maps/mapa_paradas.html")
-
-        # Abrir o mapa gerado no navegador
-        webbrowser.open(f"file://{os.path.abspath('maps/mapa_paradas.html')}")
-
-        # Criar gráfico
-        plt.figure(figsize=(10, 5))
-        plt.hist(stop_times, bins=len(set(stop_times)), edgecolor='black', alpha=0.7)
-        plt.xlabel("Horário")
-        plt.ylabel("Número de Paradas")
-        plt.title("Horários das Paradas de 5 minutos")
-        plt.xticks(rotation=45)
-        plt.grid(axis='y', linestyle='--', alpha=0.7)
-        plt.tight_layout()
-
-        plt.savefig("maps/grafico_paradas.png")
-        plt.show()
+    stops = find_stops(df)
+    if stops.empty:
+        return None
+
+    map_center = [stops["latitude"].iloc[0], stops["longitude"].iloc[0]]
+    folium_map = folium.Map(location=map_center, zoom_start=14)
+
+    # Nomes dos lugares a partir do gazetteer local (data/gazetteer.csv), se existir
+    places = geocoder.lookup(stops["latitude"], stops["longitude"]) if geocoder else [None] * len(stops)
+
+    for stop, place in zip(panel.progress(stops.itertuples(), total=len(stops), desc="Paradas"), places):
+        folium.Marker(
+            location=[stop.latitude, stop.longitude],
+            popup=f"{place}: parado por pelo menos 5 minutos" if place else "Parado por pelo menos 5 minutos",
+            icon=folium.Icon(color="red")
+        ).add_to(folium_map)
+
+    # Calor agregado por células, pesado pelos segundos parados em cada célula
+    add_binned_heatmap(folium_map, stops["latitude"], stops["longitude"], stops["duration_s"])
+
+    with cache.writing(key, "mapa_paradas.html") as tmp_path:
+        folium_map.save(tmp_path)
+
+    outputs = {name: cache.path(key, name) for name in STOP_OUTPUTS}
+    return key, outputs, stops["start_time"].dt.strftime("%H:%M").tolist()
 
-    else:
+def show_stop_results(result):
+    """
+    Executado no thread principal: abre o mapa e desenha o gráfico dos horários
+    (ou mostra o gráfico guardado na cache).
+    """
+    if result is None:
         messagebox.showinfo("Resultado", "Nenhuma parada longa identificada.")
+        return
+
+    key, outputs, stop_times = result
+
+    # Abrir o mapa gerado no navegador
+    webbrowser.open(f"file://{os.path.abspath(outputs['mapa_paradas.html'])}")
+
+    plt.figure(figsize=(10, 5))
+    if stop_times is None:
+        # Artefactos reaproveitados da cache: mostra o gráfico já gerado
+        plt.imshow(plt.imread(outputs["grafico_paradas.png"]))
+        plt.axis("off")
+        cache.evict(keep=outputs.values())
+        plt.show()
+        return
 
-def browse_file():
-    filename = filedialog.askopenfilename(
-        title="Escolha um arquivo CSV",
-        filetypes=[("CSV files", "*.csv")],
-        initialdir="data"
-    )
-    if filename:
-        selected_file.set(filename)
-
-def start_analysis():
-    file_path = selected_file.get()
-    identify_stopped_locations(file_path)
-
-# GUI Setup
-root = tk.Tk()
-root.title("Analisador de Paradas (Velocidade Zero)")
-root.attributes("-fullscreen", True)
-root.resizable(False, False)
-
-# Adicionando texto explicativo
-description_text = """
+    # Criar gráfico
+    plt.hist(stop_times, bins=len(set(stop_times)), edgecolor='black', alpha=0.7)
+    plt.xlabel("Horário")
+    plt.ylabel("Número de Paradas")
+    plt.title("Horários das Paradas de 5 minutos")
+    plt.xticks(rotation=45)
+    plt.grid(axis='y', linestyle='--', alpha=0.7)
+    plt.tight_layout()
+
+    with cache.writing(key, "grafico_paradas.png") as tmp_path:
+        plt.savefig(tmp_path)
+    cache.evict(keep=outputs.values())
+    plt.show()
+
+def main_gui():
+    root = tk.Tk()
+    root.title("Analisador de Paradas (Velocidade Zero)")
+    root.attributes("-fullscreen", True)
+    root.resizable(False, False)
+
+    # Adicionando texto explicativo
+    description_text = """
 Identifique locais onde a velocidade estve parado por mais de 5 minutos.
 
 Instruções:
@@ -105,19 +155,41 @@ Instruções:
 - Clique em "Analisar Paradas" para gerar um mapa com as paradas e um gráfico com os horários.
 """
 
-label_description = tk.Label(root, text=description_text, font=("Arial", 18), justify="left", padx=10, pady=150)
-label_description.pack(fill=tk.BOTH, padx=30, pady=0)
+    label_description = tk.Label(root, text=description_text, font=("Arial", 18), justify="left", padx=10, pady=150)
+    label_description.pack(fill=tk.BOTH, padx=30, pady=0)
+
+    # Frame para a funcionalidade principal
+    frame = ttk.Frame(root, padding=0)
+    frame.place(relx=0.5, rely=0.5, anchor="center")
+
+    selected_file = tk.StringVar()
+
+    def browse_file():
+        filename = filedialog.askopenfilename(
+            title="Escolha um arquivo CSV",
+            filetypes=[("CSV files", "*.csv")],
+            initialdir="data"
+        )
+        if filename:
+            selected_file.set(filename)
+
+    def start_analysis():
+        file_path = selected_file.get()
+        if not file_path:
+            messagebox.showerror("Erro", "Nenhum arquivo selecionado.")
+            return
+        progress_panel.submit(identify_stopped_locations, file_path, progress_panel, on_done=show_stop_results)
 
-# Frame para a funcionalidade principal
-frame = ttk.Frame(root, padding=0)
-frame.place(relx=0.5, rely=0.5, anchor="center")
+    ttk.Label(frame, text="Arquivo CSV:").grid(row=0, column=0, sticky="w")
+    ttk.Entry(frame, textvariable=selected_file, width=50).grid(row=0, column=1)
+    ttk.Button(frame, text="Procurar", command=browse_file).grid(row=0, column=2, padx=5)
 
-selected_file = tk.StringVar()
+    ttk.Button(frame, text="Analisar Paradas", command=start_analysis).grid(row=1, column=1, pady=20)
 
-ttk.Label(frame, text="Arquivo CSV:").grid(row=0, column=0, sticky="w")
-ttk.Entry(frame, textvariable=selected_file, width=50).grid(row=0, column=1)
-ttk.Button(frame, text="Procurar", command=browse_file).grid(row=0, column=2, padx=5)
+    progress_panel = ProgressPanel(frame)
+    progress_panel.grid(row=2, column=0, columnspan=3)
 
-ttk.Button(frame, text="Analisar Paradas", command=start_analysis).grid(row=1, column=1, pady=20)
+    root.mainloop()
 
-root.mainloop()
+if __name__ == "__main__":
+    main_gui()
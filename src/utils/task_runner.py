@@ -0,0 +1,143 @@
+import io
+import queue
+import threading
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import ttk, messagebox
+from tqdm import tqdm
+
+# Número de linhas processadas entre cada atualização de progresso/cancelamento
+CHUNK_SIZE = 5000
+
+
+class TaskCancelled(Exception):
+    """
+    Levantada dentro da tarefa quando o utilizador carrega em "Cancelar".
+    """
+
+
+class QueueProgress(tqdm):
+    """
+    Barra tqdm que, em vez de escrever no terminal, envia o progresso para uma fila
+    lida pela interface Tk. Verifica o pedido de cancelamento a cada atualização.
+    """
+
+    def __init__(self, *args, progress_queue=None, cancel_event=None, **kwargs):
+        self._progress_queue = progress_queue
+        self._cancel_event = cancel_event
+        kwargs.setdefault("file", io.StringIO())
+        kwargs.setdefault("mininterval", 0.05)
+        super().__init__(*args, **kwargs)
+
+    def display(self, msg=None, pos=None):
+        if self._progress_queue is not None:
+            self._progress_queue.put((self.n, self.total, self.desc))
+        return True
+
+    def update(self, n=1):
+        if self._cancel_event is not None and self._cancel_event.is_set():
+            raise TaskCancelled()
+        return super().update(n)
+
+    def __iter__(self):
+        for item in super().__iter__():
+            if self._cancel_event is not None and self._cancel_event.is_set():
+                raise TaskCancelled()
+            yield item
+
+
+class ProgressPanel(ttk.Frame):
+    """
+    Painel com barra de progresso, texto de estado e botão de cancelar.
+    Executa as tarefas num executor em segundo plano para não bloquear a janela.
+    """
+
+    def __init__(self, parent, **kwargs):
+        super().__init__(parent, **kwargs)
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._queue = queue.Queue()
+        self._cancel_event = threading.Event()
+        self._future = None
+
+        self.status = tk.StringVar(value="")
+        self.bar = ttk.Progressbar(self, orient=tk.HORIZONTAL, length=400, mode="determinate")
+        self.bar.grid(row=0, column=0, padx=5)
+        self.cancel_button = ttk.Button(self, text="Cancelar", command=self.cancel, state="disabled")
+        self.cancel_button.grid(row=0, column=1, padx=5)
+        ttk.Label(self, textvariable=self.status).grid(row=1, column=0, columnspan=2, sticky="w")
+
+        # Se a janela for fechada, pede à tarefa para parar no próximo bloco
+        self.bind("<Destroy>", lambda e: self._cancel_event.set())
+
+    def progress(self, iterable=None, total=None, desc=""):
+        """
+        Cria uma barra tqdm ligada a este painel. Deve ser usada dentro da tarefa.
+        """
+        return QueueProgress(iterable, total=total, desc=desc,
+                             progress_queue=self._queue, cancel_event=self._cancel_event)
+
+    def chunks(self, length, desc="", chunk_size=CHUNK_SIZE):
+        """
+        Itera sobre os índices de início de cada bloco de linhas, reportando o progresso.
+        """
+        return self.progress(range(0, length, chunk_size), desc=desc)
+
+    def is_busy(self):
+        return self._future is not None and not self._future.done()
+
+    def submit(self, func, *args, on_done=None, on_error=None):
+        """
+        Executa func(*args) em segundo plano. on_done(resultado) e on_error(exceção)
+        são chamados no thread principal do Tk quando a tarefa termina.
+        """
+        if self.is_busy():
+            messagebox.showwarning("Aviso", "Já existe uma análise em curso.")
+            return False
+
+        self._cancel_event.clear()
+        self.bar.configure(value=0, maximum=1)
+        self.status.set("A processar...")
+        self.cancel_button.configure(state="normal")
+        self._future = self._executor.submit(func, *args)
+        self.after(100, self._poll, on_done, on_error)
+        return True
+
+    def cancel(self):
+        self._cancel_event.set()
+        self.status.set("A cancelar...")
+
+    def _poll(self, on_done, on_error):
+        try:
+            while True:
+                n, total, desc = self._queue.get_nowait()
+                if total:
+                    self.bar.configure(maximum=total, value=n)
+                    self.status.set(f"{desc} {n}/{total}".strip())
+                else:
+                    self.status.set(f"{desc} {n}".strip())
+        except queue.Empty:
+            pass
+
+        if not self._future.done():
+            self.after(100, self._poll, on_done, on_error)
+            return
+
+        self.cancel_button.configure(state="disabled")
+        try:
+            result = self._future.result()
+        except TaskCancelled:
+            self.status.set("Cancelado.")
+            messagebox.showinfo("Cancelado", "Operação cancelada pelo utilizador.")
+            return
+        except Exception as e:
+            self.status.set("Erro.")
+            if on_error is not None:
+                on_error(e)
+            else:
+                messagebox.showerror("Erro", str(e))
+            return
+
+        self.bar.configure(value=self.bar.cget("maximum"))
+        self.status.set("Concluído.")
+        if on_done is not None:
+            on_done(result)
@@ -0,0 +1,285 @@
+import json
+import os
+import shutil
+import numpy as np
+from matplotlib import colormaps
+from matplotlib.image import imsave
+from projection import MERCATOR_ORIGIN, from_web_mercator, to_web_mercator
+
+TILES_DIR = os.path.join("maps", "tiles")
+TILE_SIZE = 256
+MIN_ZOOM = 5
+MAX_ZOOM = 16
+COUNTS_DIR = "_counts"
+MANIFEST = "manifest.json"
+MANIFEST_FORMAT = 2  # 2: contagens esparsas (.npz) e bbox de cada partição
+# Número de pontos num pixel que corresponde à cor mais intensa
+SATURATION_COUNT = 50
+
+
+def load_counts(path):
+    """
+    Contagens por pixel (256x256) de um tile, ou None se o tile ainda não existe.
+    """
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        counts = np.zeros(TILE_SIZE * TILE_SIZE, dtype=np.int64)
+        counts[data["pixel"]] = data["count"]
+    return counts.reshape(TILE_SIZE, TILE_SIZE)
+
+
+def save_counts(path, counts):
+    """
+    Guarda só os pixels com pontos: pares (índice do pixel, contagem).
+    """
+    flat = counts.reshape(-1)
+    pixel = np.flatnonzero(flat)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez(path, pixel=pixel.astype(np.uint16), count=flat[pixel].astype(np.uint32))
+
+
+def _bbox(lat, lon):
+    return [float(lat.min()), float(lat.max()), float(lon.min()), float(lon.max())]
+
+
+def _overlaps(bbox, regions):
+    return bool(bbox) and any(bbox[0] <= r[1] and r[0] <= bbox[1] and bbox[2] <= r[3] and r[2] <= bbox[3]
+                              for r in regions)
+
+
+def _in_rectangles(tx, ty, rectangles):
+    """
+    Tiles (escalares ou arrays) dentro de algum dos retângulos (tx0, tx1, ty0, ty1, inclusive).
+    """
+    inside = np.zeros(np.shape(tx), dtype=bool)
+    for x0, x1, y0, y1 in rectangles:
+        inside |= (tx >= x0) & (tx <= x1) & (ty >= y0) & (ty <= y1)
+    return inside
+
+
+class TilePyramid:
+    """
+    Pirâmide de tiles raster z/x/y.png do histórico de um dispositivo, pré-desenhada em disco.
+
+    Para cada tile guarda-se também a contagem de pontos por pixel (_counts/z/x/y.npz, só os
+    pixels com pontos), de modo que acrescentar dias novos ao histórico só soma os pontos
+    novos e volta a desenhar os tiles afetados. O manifesto regista as partições já
+    incluídas e a área (bbox) de cada uma: se uma partição for reescrita, só os tiles
+    dentro da área antiga e da nova são recontados. Uma atualização cancelada deixa no
+    manifesto as áreas que estava a mudar ("pending"), recontadas na atualização seguinte.
+    """
+
+    def __init__(self, device, root=TILES_DIR, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM):
+        self.device = device
+        self.directory = os.path.join(root, device)
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.colormap = colormaps["plasma"]
+
+    def _manifest_path(self):
+        return os.path.join(self.directory, MANIFEST)
+
+    def _load_manifest(self):
+        try:
+            with open(self._manifest_path(), encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if (manifest.get("format"), manifest.get("min_zoom"), manifest.get("max_zoom")) != \
+                (MANIFEST_FORMAT, self.min_zoom, self.max_zoom):
+            return None
+        return manifest
+
+    def _save_manifest(self, manifest):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self._manifest_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._manifest_path())
+
+    def update(self, store, progress=None):
+        """
+        Acrescenta à pirâmide as partições do HistoryStore que ainda não foram desenhadas.
+        Se uma partição já desenhada mudou (ou desapareceu), os tiles da sua área antiga e
+        nova são recontados a partir das partições que lá têm pontos.
+
+        :return: Número de partições acrescentadas ou redesenhadas.
+        """
+        partitions = {}
+        for path in store.partitions(self.device, "1970-01-01", "2200-12-31"):
+            epoch_file = os.path.join(path, "epoch.npy")
+            if os.path.exists(epoch_file):
+                partitions[os.path.relpath(path, store.root)] = os.stat(epoch_file).st_mtime_ns
+
+        manifest = self._load_manifest()
+        if manifest is None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            manifest = {"format": MANIFEST_FORMAT, "min_zoom": self.min_zoom, "max_zoom": self.max_zoom,
+                        "partitions": {}}
+
+        drawn = manifest["partitions"]
+        changed = [p for p, entry in drawn.items() if partitions.get(p) != entry["mtime"]]
+        new = [p for p in partitions if p not in drawn or p in changed]
+        # Áreas de uma atualização interrompida: alguns zooms já têm os pontos novos e
+        # outros não, por isso são recontadas do zero em todos
+        interrupted = manifest.get("pending", [])
+        if not new and not changed and not interrupted:
+            return 0
+
+        points = {p: self._load_points(store, p) for p in new}
+        regions = interrupted + [drawn[p]["bbox"] for p in changed if drawn[p]["bbox"]]
+        regions += [_bbox(*points[p]) for p in changed if p in points and len(points[p][0])]
+        for p in changed:
+            del drawn[p]
+        for p in new:
+            drawn[p] = {"mtime": partitions[p], "bbox": _bbox(*points[p]) if len(points[p][0]) else None}
+
+        # O manifesto é gravado antes de mexer nos tiles, com as áreas que vão mudar; se a
+        # atualização for cancelada a meio, a seguinte reconta essas áreas em vez de voltar
+        # a somar os mesmos pontos
+        manifest["pending"] = regions + [drawn[p]["bbox"] for p in new if p not in changed and drawn[p]["bbox"]]
+        self._save_manifest(manifest)
+
+        zooms = range(self.min_zoom, self.max_zoom + 1)
+        rectangles = {zoom: self._region_tiles(zoom, regions) for zoom in zooms}
+        if regions:
+            # Pontos de todas as partições (já desenhadas ou não) nos tiles a recontar; os do
+            # zoom mínimo são os maiores e contêm os dos outros zooms
+            areas = [self._tile_bounds(self.min_zoom, rectangle) for rectangle in rectangles[self.min_zoom]]
+            touching = [p for p, entry in drawn.items() if _overlaps(entry["bbox"], areas)]
+            region_points = [points[p] if p in points else self._load_points(store, p) for p in touching]
+            x, y = self._project(region_points)
+            for zoom in (progress(zooms, desc="Tiles (redesenho)") if progress else zooms):
+                self._rebuild_region(zoom, x, y, rectangles[zoom])
+
+        # Pontos novos fora das áreas recontadas (as partições novas também entram na recontagem)
+        x, y = self._project([points[p] for p in new])
+        if len(x):
+            for zoom in (progress(zooms, desc="Tiles") if progress else zooms):
+                self._add_points(zoom, x, y, exclude=rectangles[zoom])
+
+        del manifest["pending"]
+        self._save_manifest(manifest)
+        return len(new) + len([p for p in changed if p not in partitions])
+
+    @staticmethod
+    def _load_points(store, partition):
+        arrays = store.read_partition(os.path.join(store.root, partition), ["latitude", "longitude"])
+        if arrays is None:
+            return np.empty(0), np.empty(0)
+        lat, lon = arrays["latitude"], arrays["longitude"]
+        valid = np.isfinite(lat) & np.isfinite(lon)
+        return lat[valid], lon[valid]
+
+    @staticmethod
+    def _project(points):
+        if not points:
+            return np.empty(0), np.empty(0)
+        x, y = to_web_mercator(np.concatenate([lat for lat, _ in points]), np.concatenate([lon for _, lon in points]))
+        return np.asarray(x), np.asarray(y)
+
+    def _pixels(self, zoom, x, y):
+        world_pixels = TILE_SIZE * 2 ** zoom
+        px = ((x + MERCATOR_ORIGIN) / (2 * MERCATOR_ORIGIN) * world_pixels).astype(np.int64)
+        py = ((MERCATOR_ORIGIN - y) / (2 * MERCATOR_ORIGIN) * world_pixels).astype(np.int64)
+        return np.clip(px, 0, world_pixels - 1), np.clip(py, 0, world_pixels - 1)
+
+    def _tile_counts(self, zoom, px, py):
+        """
+        Agrupa os pixels por tile e devolve (tx, ty, contagens 256x256) de cada tile.
+        """
+        tiles = (px // TILE_SIZE << 32) + py // TILE_SIZE
+        order = np.argsort(tiles, kind="stable")
+        tiles, px, py = tiles[order], px[order], py[order]
+        unique_tiles, starts = np.unique(tiles, return_index=True)
+        ends = np.append(starts[1:], len(tiles))
+
+        for tile, start, end in zip(unique_tiles, starts, ends):
+            local = (py[start:end] % TILE_SIZE) * TILE_SIZE + px[start:end] % TILE_SIZE
+            counts = np.bincount(local, minlength=TILE_SIZE * TILE_SIZE).reshape(TILE_SIZE, TILE_SIZE)
+            yield int(tile >> 32), int(tile & 0xFFFFFFFF), counts
+
+    def _paths(self, zoom, tx, ty):
+        return (os.path.join(self.directory, COUNTS_DIR, str(zoom), str(tx), f"{ty}.npz"),
+                os.path.join(self.directory, str(zoom), str(tx), f"{ty}.png"))
+
+    def _write_tile(self, zoom, tx, ty, counts):
+        counts_path, tile_path = self._paths(zoom, tx, ty)
+        save_counts(counts_path, counts)
+        os.makedirs(os.path.dirname(tile_path), exist_ok=True)
+        imsave(tile_path, self.render(counts))
+
+    def _add_points(self, zoom, x, y, exclude=()):
+        px, py = self._pixels(zoom, x, y)
+        if exclude:
+            outside = ~_in_rectangles(px // TILE_SIZE, py // TILE_SIZE, exclude)
+            px, py = px[outside], py[outside]
+        for tx, ty, counts in self._tile_counts(zoom, px, py):
+            existing = load_counts(self._paths(zoom, tx, ty)[0])
+            self._write_tile(zoom, tx, ty, counts if existing is None else counts + existing)
+
+    def _region_tiles(self, zoom, regions):
+        """
+        Retângulos de tiles (tx0, tx1, ty0, ty1, inclusive) que cobrem cada bbox.
+        """
+        rectangles = []
+        for lat_min, lat_max, lon_min, lon_max in regions:
+            x, y = to_web_mercator(np.array([lat_max, lat_min]), np.array([lon_min, lon_max]))
+            px, py = self._pixels(zoom, np.asarray(x), np.asarray(y))
+            rectangles.append((px[0] // TILE_SIZE, px[1] // TILE_SIZE, py[0] // TILE_SIZE, py[1] // TILE_SIZE))
+        return rectangles
+
+    def _tile_bounds(self, zoom, rectangle):
+        """
+        Área (bbox em graus) coberta por um retângulo de tiles.
+        """
+        x0, x1, y0, y1 = rectangle
+        tile_m = 2 * MERCATOR_ORIGIN / 2 ** zoom
+        lat, lon = from_web_mercator(np.array([x0, x1 + 1]) * tile_m - MERCATOR_ORIGIN,
+                                     MERCATOR_ORIGIN - np.array([y1 + 1, y0]) * tile_m)
+        return [float(lat[0]), float(lat[1]), float(lon[0]), float(lon[1])]
+
+    def _rebuild_region(self, zoom, x, y, rectangles):
+        """
+        Reconta do zero os tiles dos retângulos alterados com os pontos x, y (todas as
+        partições que lá têm pontos) e apaga os tiles desses retângulos que ficaram sem pontos.
+        """
+        px, py = self._pixels(zoom, x, y)
+        selected = _in_rectangles(px // TILE_SIZE, py // TILE_SIZE, rectangles)
+
+        rebuilt = set()
+        for tile_x, tile_y, counts in self._tile_counts(zoom, px[selected], py[selected]):
+            self._write_tile(zoom, tile_x, tile_y, counts)
+            rebuilt.add((tile_x, tile_y))
+
+        zoom_dir = os.path.join(self.directory, COUNTS_DIR, str(zoom))
+        for column in os.listdir(zoom_dir) if os.path.isdir(zoom_dir) else []:
+            for name in os.listdir(os.path.join(zoom_dir, column)):
+                tile = (int(column), int(name.split(".")[0]))
+                if tile not in rebuilt and _in_rectangles(*tile, rectangles):
+                    for path in self._paths(zoom, *tile):
+                        if os.path.exists(path):
+                            os.remove(path)
+
+    def render(self, counts):
+        """
+        Converte as contagens por pixel de um tile numa imagem RGBA.
+        """
+        intensity = np.log1p(counts) / np.log1p(SATURATION_COUNT)
+        intensity = np.clip(intensity, 0, 1)
+
+        # Engrossa cada ponto para 3x3 pixels para continuar visível nos zooms altos
+        padded = np.pad(intensity, 1)
+        thick = np.max([padded[dy:dy + TILE_SIZE, dx:dx + TILE_SIZE] for dy in range(3) for dx in range(3)], axis=0)
+
+        rgba = self.colormap(thick)
+        rgba[..., 3] = np.where(thick > 0, 0.5 + 0.5 * thick, 0)
+        return (rgba * 255).astype(np.uint8)
+
+    def tile_url(self, relative_to):
+        """
+        URL relativo (a partir da pasta de uma página HTML) no formato {z}/{x}/{y}.png.
+        """
+        path = os.path.relpath(self.directory, relative_to).replace(os.sep, "/")
+        return path + "/{z}/{x}/{y}.png"
@@ -0,0 +1,428 @@
+import os
+import struct
+import threading
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox, scrolledtext
+import numpy as np
+import pandas as pd
+from file_reader import parse_datetime
+from history_store import to_epoch
+from task_runner import ProgressPanel
+
+# Formato de arquivo de trajetórias (.gla):
+#   cabeçalho | bloco 0 | bloco 1 | ... | índice de blocos | rodapé
+# Cada bloco descodifica-se sozinho: cabeçalho do bloco (número de pontos e primeiro
+# ponto) seguido de três sequências de varints: delta-of-delta dos epochs e deltas
+# zigzag de latitude/longitude em ponto fixo (1e-7 graus, ~1 cm).
+ARCHIVE_DIR = os.path.join("data", "archive")
+ARCHIVE_EXTENSION = ".gla"
+MAGIC = b"GLTA"
+FORMAT_VERSION = 1
+COORDINATE_SCALE = 10 ** 7
+BLOCK_SIZE = 16384  # pontos por bloco: granularidade do acesso por intervalo de tempo
+ARCHIVE_CHUNK_ROWS = 500000
+
+FILE_HEADER = struct.Struct("<4sHI")  # magia, versão, escala das coordenadas
+BLOCK_HEADER = struct.Struct("<IqqqIII")  # pontos, primeiro epoch/lat/lon, bytes de cada sequência
+FOOTER = struct.Struct("<QI4s")  # posição do índice, número de blocos, magia
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("size", "<u4"), ("count", "<u4"),
+                        ("start", "<i8"), ("end", "<i8")])
+
+_VARINT_LIMITS = np.array([1 << (7 * k) for k in range(1, 10)], dtype=np.uint64)
+
+
+def zigzag_encode(values):
+    """
+    Inteiros com sinal -> sem sinal, com os valores pequenos (positivos ou negativos) perto de 0.
+    """
+    values = np.asarray(values, dtype=np.int64)
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+
+def zigzag_decode(values):
+    values = np.asarray(values, dtype=np.uint64)
+    return (values >> np.uint64(1)).view(np.int64) ^ -(values & np.uint64(1)).view(np.int64)
+
+
+def varint_encode(values):
+    """
+    Codifica inteiros sem sinal em varints (7 bits por byte, bit alto = "continua").
+    Vetorizado: um passo por posição de byte (no máximo 10), não por valor.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    if len(values) == 0:
+        return np.empty(0, dtype=np.uint8)
+    nbytes = 1 + (values[:, None] >= _VARINT_LIMITS).sum(axis=1)
+    starts = np.cumsum(nbytes) - nbytes
+    out = np.empty(int(nbytes.sum()), dtype=np.uint8)
+    for j in range(int(nbytes.max())):
+        rows = np.flatnonzero(nbytes > j)
+        byte = (values[rows] >> np.uint64(7 * j)) & np.uint64(0x7F)
+        more = (nbytes[rows] > j + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[rows] + j] = byte | more
+    return out
+
+
+def varint_decode(buffer, count):
+    """
+    Descodifica count varints de um array de bytes, de forma vetorizada.
+    """
+    buffer = np.asarray(buffer, dtype=np.uint8)
+    ends = np.flatnonzero(buffer < 0x80)
+    if len(ends) != count or (count and ends[-1] != len(buffer) - 1):
+        raise ValueError("Bloco corrompido: número de valores inesperado.")
+    if count == 0:
+        return np.empty(0, dtype=np.uint64)
+    starts = np.empty(count, dtype=np.int64)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    if len(buffer) == count:  # tudo com um byte (o caso mais comum nos epochs)
+        return buffer.astype(np.uint64)
+    position = np.arange(len(buffer), dtype=np.int64) - np.repeat(starts, ends - starts + 1)
+    values = (buffer & 0x7F).astype(np.uint64) << (7 * position).astype(np.uint64)
+    return np.bitwise_or.reduceat(values, starts)
+
+
+def encode_block(epoch, lat_fixed, lon_fixed):
+    """
+    Codifica um bloco de pontos (epoch em segundos, coordenadas em ponto fixo).
+    """
+    deltas = np.diff(epoch)
+    streams = [varint_encode(zigzag_encode(np.diff(deltas, prepend=0))),
+               varint_encode(zigzag_encode(np.diff(lat_fixed))),
+               varint_encode(zigzag_encode(np.diff(lon_fixed)))]
+    header = BLOCK_HEADER.pack(len(epoch), int(epoch[0]), int(lat_fixed[0]), int(lon_fixed[0]),
+                               *(len(stream) for stream in streams))
+    return header + b"".join(stream.tobytes() for stream in streams)
+
+
+def decode_block(buffer):
+    """
+    Descodifica um bloco para arrays (epoch int64, latitude e longitude em graus).
+    """
+    count, epoch0, lat0, lon0, *sizes = BLOCK_HEADER.unpack_from(buffer)
+    offset = BLOCK_HEADER.size
+    columns = []
+    for first, size in zip((epoch0, lat0, lon0), sizes):
+        deltas = zigzag_decode(varint_decode(buffer[offset:offset + size], count - 1))
+        offset += size
+        column = np.empty(count, dtype=np.int64)
+        column[0] = first
+        if len(columns) == 0:
+            deltas = np.cumsum(deltas)  # delta-of-delta -> deltas
+        np.cumsum(deltas, out=column[1:])
+        column[1:] += first
+        columns.append(column)
+    epoch, lat, lon = columns
+    return epoch, lat / COORDINATE_SCALE, lon / COORDINATE_SCALE
+
+
+def _epoch_bounds(start, end):
+    """
+    Limites (epoch) de um intervalo de datas; None fica sem limite.
+    """
+    start_epoch = to_epoch([start])[0] if start is not None else np.iinfo(np.int64).min
+    end_epoch = to_epoch([end])[0] if end is not None else np.iinfo(np.int64).max
+    return start_epoch, end_epoch
+
+
+class ArchiveWriter:
+    """
+    Escreve um arquivo .gla em fluxo: os pontos acumulam-se até BLOCK_SIZE e cada bloco
+    cheio é gravado logo; o índice de blocos é escrito no fim, em close().
+
+    A escrita é feita num ficheiro temporário que só substitui o caminho final em
+    close(); se for interrompida, o arquivo anterior (se existir) fica intacto.
+    """
+
+    def __init__(self, path, block_size=BLOCK_SIZE):
+        self.path = path
+        self.block_size = block_size
+        base, ext = os.path.splitext(path)
+        self._tmp_path = f"{base}.tmp-{os.getpid()}-{threading.get_ident()}{ext}"
+        self._file = open(self._tmp_path, "wb")
+        self._file.write(FILE_HEADER.pack(MAGIC, FORMAT_VERSION, COORDINATE_SCALE))
+        self._pending = []
+        self._pending_count = 0
+        self._index = []
+        self.points = 0
+
+    def append(self, epoch, lat, lon):
+        """
+        Acrescenta pontos (epoch em segundos, latitude e longitude em graus).
+        """
+        epoch = np.asarray(epoch, dtype=np.int64)
+        lat_fixed = np.round(np.asarray(lat, dtype=np.float64) * COORDINATE_SCALE).astype(np.int64)
+        lon_fixed = np.round(np.asarray(lon, dtype=np.float64) * COORDINATE_SCALE).astype(np.int64)
+        self._pending.append((epoch, lat_fixed, lon_fixed))
+        self._pending_count += len(epoch)
+        self.points += len(epoch)
+        if self._pending_count >= self.block_size:
+            self._flush(self._pending_count // self.block_size * self.block_size)
+
+    def _flush(self, count):
+        """
+        Grava os primeiros count pontos pendentes em blocos de até block_size pontos.
+        """
+        epoch, lat, lon = (np.concatenate(column) for column in zip(*self._pending))
+        self._pending = [(epoch[count:], lat[count:], lon[count:])]
+        self._pending_count = len(epoch) - count
+
+        for start in range(0, count, self.block_size):
+            stop = min(start + self.block_size, count)
+            block = encode_block(epoch[start:stop], lat[start:stop], lon[start:stop])
+            self._index.append((self._file.tell(), len(block), stop - start,
+                                epoch[start:stop].min(), epoch[start:stop].max()))
+            self._file.write(block)
+
+    def close(self):
+        if self._pending_count:
+            self._flush(self._pending_count)
+        index = np.array(self._index, dtype=INDEX_DTYPE)
+        index_offset = self._file.tell()
+        self._file.write(index.tobytes())
+        self._file.write(FOOTER.pack(index_offset, len(index), MAGIC))
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        """
+        Descarta a escrita: fecha e apaga o ficheiro temporário.
+        """
+        self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class TrackArchive:
+    """
+    Leitura de um arquivo .gla. O índice de blocos (intervalo de tempo de cada bloco)
+    permite ler só os blocos que tocam um intervalo de datas; cada bloco é lido do
+    ficheiro mapeado em memória e descodificado de forma vetorizada.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._data = np.memmap(path, dtype=np.uint8, mode="r")
+        magic, version, scale = FILE_HEADER.unpack_from(self._data)
+        index_offset, n_blocks, footer_magic = FOOTER.unpack_from(self._data, len(self._data) - FOOTER.size)
+        if magic != MAGIC or footer_magic != MAGIC:
+            raise ValueError(f"{path} não é um arquivo de trajetórias válido.")
+        if version != FORMAT_VERSION or scale != COORDINATE_SCALE:
+            raise ValueError(f"Versão do arquivo não suportada: {version}")
+        self.index = np.frombuffer(self._data, dtype=INDEX_DTYPE, count=n_blocks, offset=index_offset)
+
+    def __len__(self):
+        return int(self.index["count"].sum())
+
+    def time_range(self):
+        if len(self.index) == 0:
+            return None, None
+        return (pd.to_datetime(self.index["start"].min(), unit="s"),
+                pd.to_datetime(self.index["end"].max(), unit="s"))
+
+    def blocks(self, start=None, end=None):
+        """
+        Posições (no índice) dos blocos com pontos entre start e end (datas, inclusive).
+        """
+        return self._blocks(*_epoch_bounds(start, end))
+
+    def _blocks(self, start, end):
+        return np.flatnonzero((self.index["end"] >= start) & (self.index["start"] <= end))
+
+    def read(self, start=None, end=None):
+        """
+        Pontos entre start e end (datas, inclusive; None = sem limite), pela ordem do arquivo.
+
+        :return: (epoch, latitude, longitude) como arrays NumPy.
+        """
+        start, end = _epoch_bounds(start, end)
+        parts = []
+        for block in self._blocks(start, end):
+            entry = self.index[block]
+            offset = int(entry["offset"])
+            parts.append(decode_block(self._data[offset:offset + int(entry["size"])]))
+        if not parts:
+            return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)
+        epoch, lat, lon = (np.concatenate(column) for column in zip(*parts))
+
+        inside = (epoch >= start) & (epoch <= end)
+        if not inside.all():
+            epoch, lat, lon = epoch[inside], lat[inside], lon[inside]
+        return epoch, lat, lon
+
+    def read_frame(self, start=None, end=None):
+        """
+        read() como DataFrame com "datetime", latitude e longitude.
+        """
+        epoch, lat, lon = self.read(start, end)
+        return pd.DataFrame({"datetime": pd.to_datetime(epoch, unit="s"), "latitude": lat, "longitude": lon})
+
+
+def _csv_columns(csv_path):
+    """
+    Identifica as colunas de coordenadas e de data/hora pelo cabeçalho do CSV, com os nomes
+    normalizados como no file_reader (sem espaços, em minúsculas).
+
+    :return: ({nome normalizado: nome no ficheiro}, coluna de latitude, coluna de longitude, colunas de data/hora)
+    """
+    names = {str(column).strip().lower(): column for column in pd.read_csv(csv_path, nrows=0).columns}
+    lat_col = "latitude" if "latitude" in names else "lat"
+    lon_col = "longitude" if "longitude" in names else "lon"
+    if lat_col not in names or lon_col not in names:
+        raise ValueError("O CSV não contém as colunas de latitude e longitude ('Latitude', 'Longitude').")
+    time_col = next((col for col in ("datetime", "timestamp", "date_time") if col in names), None)
+    if time_col:
+        time_cols = [time_col]
+    elif {"date", "time"}.issubset(names):
+        time_cols = ["date", "time"]
+    else:
+        raise ValueError("Não foi possível identificar corretamente as colunas de data e hora.")
+    return names, lat_col, lon_col, time_cols
+
+
+def _csv_chunks(csv_path, chunksize=ARCHIVE_CHUNK_ROWS):
+    """
+    Lê um CSV bruto (registador) ou filtrado (data_filter) em blocos e devolve
+    (epoch, latitude, longitude) de cada bloco. Linhas sem data ou coordenadas são ignoradas.
+    Só as colunas usadas são lidas, e as de data/hora sempre como texto, para que todos
+    os blocos sejam interpretados da mesma forma.
+    """
+    names, lat_col, lon_col, time_cols = _csv_columns(csv_path)
+    usecols = [names[col] for col in (lat_col, lon_col, *time_cols)]
+    reader = pd.read_csv(csv_path, usecols=usecols, dtype={names[col]: str for col in time_cols},
+                         chunksize=chunksize)
+    for chunk in reader:
+        chunk = chunk.rename(columns={names[col]: col for col in (lat_col, lon_col, *time_cols)})
+        if len(time_cols) == 1:
+            times = pd.to_datetime(chunk[time_cols[0]], errors="coerce")
+        else:
+            times = parse_datetime(chunk["date"].astype(str) + " " + chunk["time"].astype(str))
+
+        lat = pd.to_numeric(chunk[lat_col], errors="coerce").to_numpy(dtype=np.float64)
+        lon = pd.to_numeric(chunk[lon_col], errors="coerce").to_numpy(dtype=np.float64)
+        valid = times.notna().to_numpy() & np.isfinite(lat) & np.isfinite(lon)
+        yield to_epoch(times[valid]), lat[valid], lon[valid]
+
+
+def archive_path_for(csv_path, directory=ARCHIVE_DIR):
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(directory, name + ARCHIVE_EXTENSION)
+
+
+def archive_csv(csv_path, archive_path=None, panel=None, block_size=BLOCK_SIZE):
+    """
+    Converte um CSV num arquivo .gla (em data/archive, por omissão), sem o carregar inteiro.
+
+    :return: Relatório com os pontos, blocos e tamanhos do CSV e do arquivo.
+    """
+    archive_path = archive_path or archive_path_for(csv_path)
+    os.makedirs(os.path.dirname(archive_path) or ".", exist_ok=True)
+    chunks = _csv_chunks(csv_path)
+    if panel:
+        chunks = panel.progress(chunks, desc="Arquivo")
+    with ArchiveWriter(archive_path, block_size) as writer:
+        for epoch, lat, lon in chunks:
+            writer.append(epoch, lat, lon)
+    return compression_report(csv_path, archive_path)
+
+
+def compression_report(csv_path, archive_path):
+    csv_bytes = os.path.getsize(csv_path)
+    archive_bytes = os.path.getsize(archive_path)
+    archive = TrackArchive(archive_path)
+    points = len(archive)
+    return {
+        "csv_file": csv_path,
+        "archive_file": archive_path,
+        "points": points,
+        "blocks": len(archive.index),
+        "csv_bytes": csv_bytes,
+        "archive_bytes": archive_bytes,
+        "ratio": csv_bytes / archive_bytes if archive_bytes else 0.0,
+        "bytes_per_point": archive_bytes / points if points else 0.0,
+    }
+
+
+def format_report(report):
+    return (f"{report['points']} pontos em {report['blocks']} bloco(s): "
+            f"{report['csv_bytes'] / 1e6:.2f} MB -> {report['archive_bytes'] / 1e6:.2f} MB "
+            f"({report['ratio']:.1f}x, {report['bytes_per_point']:.2f} bytes/ponto)")
+
+
+def archive_files(csv_paths, panel=None):
+    return [archive_csv(csv_path, panel=panel) for csv_path in csv_paths]
+
+
+def main_gui():
+    root = tk.Tk()
+    root.title("Arquivo Comprimido de Trajetórias")
+    root.attributes("-fullscreen", True)
+    root.resizable(False, False)
+
+    description = """
+Converta CSV brutos (registador) ou filtrados num arquivo comprimido (.gla): as datas
+são guardadas como delta-of-delta e as coordenadas como deltas em ponto fixo (~1 cm),
+em blocos independentes com um índice por intervalo de tempo.
+
+Instruções:
+1. Selecione um ou mais arquivos CSV.
+2. Clique em "Arquivar". Os arquivos ficam em 'data/archive' e a taxa de compressão
+   em relação a cada CSV aparece no registo.
+"""
+    label_description = tk.Label(root, text=description, font=("Arial", 18), justify="left", padx=10, pady=40)
+    label_description.pack(fill=tk.BOTH, padx=30, pady=0)
+
+    frame = ttk.Frame(root, padding=10)
+    frame.pack()
+
+    selected_files = []
+    files_label = tk.StringVar(value="Nenhum arquivo selecionado")
+
+    def browse():
+        filenames = filedialog.askopenfilenames(title="Escolha os arquivos CSV", filetypes=[("CSV files", "*.csv")],
+                                                initialdir="data")
+        if filenames:
+            selected_files[:] = filenames
+            files_label.set(f"{len(filenames)} arquivo(s) selecionado(s)")
+
+    log_text = scrolledtext.ScrolledText(root, wrap=tk.WORD, height=15, state='disabled')
+    log_text.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
+
+    def show_result(reports):
+        log_text.configure(state='normal')
+        for report in reports:
+            log_text.insert(tk.END, f"\n✅ {report['csv_file']} -> {report['archive_file']}\n")
+            log_text.insert(tk.END, f"🗜️ {format_report(report)}\n")
+        log_text.insert(tk.END, "-" * 50 + "\n")
+        log_text.configure(state='disabled')
+
+    def start_archive():
+        if not selected_files:
+            messagebox.showerror("Erro", "Selecione pelo menos um arquivo CSV.")
+            return
+        progress_panel.submit(archive_files, list(selected_files), progress_panel, on_done=show_result)
+
+    ttk.Label(frame, text="Arquivos CSV:").grid(row=0, column=0, sticky="w")
+    ttk.Label(frame, textvariable=files_label, width=50).grid(row=0, column=1)
+    ttk.Button(frame, text="Procurar", command=browse).grid(row=0, column=2, padx=5)
+
+    ttk.Button(frame, text="Arquivar", command=start_archive).grid(row=1, column=1, pady=20)
+
+    progress_panel = ProgressPanel(frame)
+    progress_panel.grid(row=2, column=0, columnspan=3)
+
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    main_gui()
@@ -0,0 +1,194 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from stopping_study import find_stops
+from history_store import device_from_path
+from file_reader import parse_datetime
+
+TRIPS_DIR = os.path.join("data", "trips")
+MAX_GAP_SECONDS = 15 * 60  # Um intervalo sem registos maior do que isto termina a viagem
+DEFAULT_CONSUMPTION = 15.0  # km/l
+DEFAULT_FUEL_PRICE = 1.80  # €/l
+
+
+def load_track(csv_path):
+    """
+    Lê um CSV filtrado (data_filter) e acrescenta a coluna "datetime".
+    A ordem das linhas é mantida, para que as posições no índice de viagens
+    correspondam às linhas do ficheiro.
+    """
+    df = pd.read_csv(csv_path)
+    df.columns = df.columns.str.strip().str.lower()
+
+    required_cols = {"latitude", "longitude", "date", "time", "distance_in_m", "speed_kmh"}
+    if not required_cols.issubset(df.columns):
+        raise ValueError("Colunas essenciais ausentes no CSV.")
+
+    df["datetime"] = parse_datetime(df["date"].astype(str) + " " + df["time"].astype(str))
+    return df
+
+
+def segment_trips(df, max_gap=MAX_GAP_SECONDS, consumption=DEFAULT_CONSUMPTION, fuel_price=DEFAULT_FUEL_PRICE):
+    """
+    Divide a trajetória em viagens. Uma viagem termina numa parada (ver
+    stopping_study.find_stops) ou num intervalo sem registos maior do que max_gap.
+
+    :param df: Pontos ordenados por "datetime", com latitude, longitude, distance_in_m e speed_kmh.
+    :return: (viagens, paradas). As viagens têm distância, duração, velocidades, início/fim
+             e custo de combustível; row_start/row_end são as posições dos pontos em df.
+    """
+    stops = find_stops(df, time_col="datetime")
+    n = len(df)
+    times = pd.to_datetime(df["datetime"]).to_numpy()
+
+    # Pontos dentro de uma parada: +1 no início e -1 depois do fim de cada parada
+    marks = np.zeros(n + 1, dtype=np.int64)
+    np.add.at(marks, stops["start_row"].to_numpy(), 1)
+    np.add.at(marks, stops["end_row"].to_numpy() + 1, -1)
+    moving = np.cumsum(marks[:-1]) == 0
+
+    gap = np.zeros(n, dtype=bool)
+    gap[1:] = (times[1:] - times[:-1]) / np.timedelta64(1, "s") > max_gap
+
+    previous_moving = np.concatenate([[False], moving[:-1]])
+    new_trip = moving & (~previous_moving | gap)
+    trip_id = np.cumsum(new_trip) - 1
+
+    # A distância/velocidade do primeiro ponto depois de um intervalo é um salto, não movimento
+    distance = pd.to_numeric(df["distance_in_m"], errors="coerce").to_numpy(dtype=np.float64).copy()
+    speed = pd.to_numeric(df["speed_kmh"], errors="coerce").to_numpy(dtype=np.float64).copy()
+    distance[gap] = 0
+    speed[gap] = 0
+
+    points = pd.DataFrame({
+        "trip_id": trip_id[moving],
+        "row": np.flatnonzero(moving),
+        "time": times[moving],
+        "latitude": df["latitude"].to_numpy()[moving],
+        "longitude": df["longitude"].to_numpy()[moving],
+        "distance_in_m": distance[moving],
+        "speed_kmh": speed[moving],
+    })
+
+    trips = points.groupby("trip_id").agg(
+        row_start=("row", "first"),
+        row_end=("row", "last"),
+        n_points=("row", "size"),
+        start_time=("time", "first"),
+        end_time=("time", "last"),
+        start_latitude=("latitude", "first"),
+        start_longitude=("longitude", "first"),
+        end_latitude=("latitude", "last"),
+        end_longitude=("longitude", "last"),
+        distance_m=("distance_in_m", "sum"),
+        max_speed_kmh=("speed_kmh", "max"),
+    )
+    trips = trips[trips["n_points"] > 1].reset_index(drop=True)
+    trips.index.name = "trip_id"
+
+    trips["duration_s"] = (trips["end_time"] - trips["start_time"]).dt.total_seconds()
+    trips["avg_speed_kmh"] = (trips["distance_m"] / trips["duration_s"] * 3.6).where(trips["duration_s"] > 0, 0)
+    trips["fuel_l"] = trips["distance_m"] / 1000 / consumption
+    trips["fuel_cost"] = trips["fuel_l"] * fuel_price
+    return trips, stops
+
+
+def trip_index_paths(device, directory=TRIPS_DIR):
+    return (os.path.join(directory, f"{device}_trips.csv"),
+            os.path.join(directory, f"{device}_stops.csv"))
+
+
+def index_source_path(device, directory=TRIPS_DIR):
+    return os.path.join(directory, f"{device}_index.json")
+
+
+def build_trip_index(df, device, directory=TRIPS_DIR, source=None, **kwargs):
+    """
+    Segmenta df em viagens e guarda as tabelas de viagens e de paradas do dispositivo.
+
+    :param source: CSV cujas linhas correspondem às de df (row_start/row_end indexam-nas);
+        fica registado com o número de linhas para trip_index_for saber se o índice serve.
+    """
+    trips, stops = segment_trips(df, **kwargs)
+    trips_path, stops_path = trip_index_paths(device, directory)
+    os.makedirs(directory, exist_ok=True)
+    trips.to_csv(trips_path)
+    stops.to_csv(stops_path, index=False)
+    with open(index_source_path(device, directory), "w", encoding="utf-8") as f:
+        json.dump({"source": os.path.abspath(source) if source else None, "rows": len(df)}, f)
+    return trips, stops
+
+
+def count_rows(csv_path):
+    """
+    Número de linhas de dados de um CSV (sem o cabeçalho), sem o interpretar.
+    """
+    lines, last = 0, b"\n"
+    with open(csv_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            lines += block.count(b"\n")
+            last = block[-1:]
+    if last != b"\n":
+        lines += 1  # última linha sem quebra de linha
+    return max(lines - 1, 0)
+
+
+def trip_index_for(csv_path, directory=TRIPS_DIR):
+    """
+    Índice de viagens do CSV. O índice guardado do dispositivo só é reutilizado se foi
+    construído a partir deste ficheiro e com o mesmo número de linhas: o ficheiro bruto e o
+    filtrado ("test1.csv" e "cleaned_test1.csv") partilham o dispositivo, e row_start/row_end
+    aplicados ao ficheiro errado selecionariam outras linhas. Caso contrário é reconstruído.
+    """
+    device = device_from_path(csv_path)
+    try:
+        with open(index_source_path(device, directory), encoding="utf-8") as f:
+            source = json.load(f)
+    except (FileNotFoundError, ValueError):
+        source = {}
+    matches = (all(os.path.exists(path) for path in trip_index_paths(device, directory))
+               and source.get("source") == os.path.abspath(csv_path)
+               and source.get("rows") == count_rows(csv_path))
+    if not matches:
+        build_trip_index_from_csv(csv_path, directory=directory)
+    return load_trip_index(device, directory)
+
+
+def load_trip_index(device, directory=TRIPS_DIR):
+    """
+    Lê o índice de viagens do dispositivo sem tocar nos pontos originais.
+    """
+    trips_path, _ = trip_index_paths(device, directory)
+    return pd.read_csv(trips_path, index_col="trip_id", parse_dates=["start_time", "end_time"])
+
+
+def load_stop_index(device, directory=TRIPS_DIR):
+    _, stops_path = trip_index_paths(device, directory)
+    return pd.read_csv(stops_path, parse_dates=["start_time", "end_time"])
+
+
+def filter_trips(trips, start=None, end=None, min_distance_m=None):
+    """
+    Filtra o índice de viagens por intervalo de datas e distância mínima.
+    """
+    mask = np.ones(len(trips), dtype=bool)
+    if start is not None:
+        mask &= trips["start_time"] >= pd.Timestamp(start)
+    if end is not None:
+        mask &= trips["end_time"] <= pd.Timestamp(end)
+    if min_distance_m is not None:
+        mask &= trips["distance_m"] >= min_distance_m
+    return trips[mask]
+
+
+def trip_points(csv_path, trip):
+    """
+    Lê só as linhas do CSV filtrado que pertencem à viagem indicada (linha do índice).
+    """
+    return pd.read_csv(csv_path, skiprows=range(1, int(trip["row_start"]) + 1),
+                       nrows=int(trip["row_end"]) - int(trip["row_start"]) + 1)
+
+
+def build_trip_index_from_csv(csv_path, **kwargs):
+    return build_trip_index(load_track(csv_path), device_from_path(csv_path), source=csv_path, **kwargs)
@@ -6,91 +6,199 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
-from folium.plugins import HeatMap
 import webbrowser
+from task_runner import ProgressPanel, CHUNK_SIZE
+from artifact_cache import ArtifactCache, code_version
+from heatmap_bins import add_binned_heatmap
+from history_store import HistoryStore
+from file_reader import parse_datetime
+from resampling import resample_frame
+import resampling
+import heatmap_bins
+import projection
 
-def analyze_speed(csv_path):
-    if not csv_path:
-        messagebox.showerror("Erro", "Nenhum arquivo selecionado.")
-        return
+CODE_VERSION = code_version(__file__, heatmap_bins.__file__, projection.__file__, resampling.__file__)
+CHART_STEP_S = 10  # passo da grelha de tempo do gráfico de velocidade
+PERCENTILE_LABELS = {
+    "speed_kmh": ("Velocidade", "km/h"),
+    "interval_s": ("Intervalo entre pontos", "s"),
+    "stop_s": ("Duração das paradas", "s"),
+}
+SPEED_OUTPUTS = ["grafico_velocidade.png", "mapa_alta_velocidade.html", "mapa_baixa_velocidade.html"]
+HIGH_SPEED_RATIO = 0.5
+LOW_SPEED_RATIO = 1.5
+
+cache = ArtifactCache()
+
+def analyze_speed(csv_path, panel):
+    """
+    Parte pesada da análise, executada em segundo plano: lê o CSV e gera os mapas.
+    Devolve a chave na cache, os caminhos dos artefactos e os dados necessários ao
+    gráfico (None se os artefactos já existiam), ou None se não houver dados válidos.
+    """
+    key = cache.key(csv_path, {"analise": "velocidade", "alta": HIGH_SPEED_RATIO, "baixa": LOW_SPEED_RATIO}, CODE_VERSION)
+    outputs = cache.lookup(key, SPEED_OUTPUTS)
+    if outputs:
+        return key, outputs, None
 
     df = pd.read_csv(csv_path)
     df.columns = df.columns.str.strip()
 
     if "speed_kmh" not in df.columns or "latitude" not in df.columns or "longitude" not in df.columns or "time" not in df.columns:
-        messagebox.showerror("Erro", "O arquivo CSV não possui todas as colunas necessárias.")
-        return
+        raise ValueError("O arquivo CSV não possui todas as colunas necessárias.")
 
     df["speed_kmh"] = pd.to_numeric(df["speed_kmh"], errors="coerce")
+    chart = speed_chart_data(df)
     df["time"] = pd.to_datetime(df["time"], errors="coerce")
     df.dropna(subset=["speed_kmh", "time", "latitude", "longitude"], inplace=True)
     df = df[df["speed_kmh"] != 0]
 
     if df.empty:
-        messagebox.showwarning("Aviso", "Nenhum dado válido encontrado após filtragem.")
-        return
+        return None
 
-    # Gráfico de velocidade
-    plt.figure(figsize=(18, 8))
-    plt.plot(df["time"], df["speed_kmh"], label="Velocidade (km/h)", color="blue")
-    plt.title("Gráfico de Velocidade")
-    plt.xlabel("Tempo")
-    plt.ylabel("Velocidade (km/h)")
-    plt.xticks(rotation=70)
-    plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
-    plt.gca().xaxis.set_major_locator(mdates.MinuteLocator(interval=10))
-    plt.axhline(y=df["speed_kmh"].mean(), color="red", linestyle="--", label="Média")
-    plt.legend()
-    plt.grid()
-    plt.tight_layout()
-    os.makedirs("maps", exist_ok=True)
-    plt.savefig("maps/grafico_velocidade.png")
-    plt.show()
-    
-    # Mapa de altas velocidades
     map_center = [df["latitude"].iloc[0], df["longitude"].iloc[0]]
+
+    # Mapa de altas velocidades
     high_speed_map = folium.Map(location=map_center, zoom_start=14)
     max_speed = df["speed_kmh"].max()
 
-    for _, row in df.iterrows():
-        if row["speed_kmh"] >= max_speed * 0.5:
+    for start in panel.chunks(len(df), desc="Mapa de altas velocidades"):
+        chunk = df.iloc[start:start + CHUNK_SIZE]
+        for row in chunk[chunk["speed_kmh"] >= max_speed * HIGH_SPEED_RATIO].itertuples():
             folium.CircleMarker(
-                location=[row["latitude"], row["longitude"]],
+                location=[row.latitude, row.longitude],
                 radius=5,
                 color="red",
                 fill=True,
                 fill_color="red",
                 fill_opacity=0.5,
-                popup=f"Velocidade: {row['speed_kmh']} km/h"
+                popup=f"Velocidade: {row.speed_kmh} km/h"
             ).add_to(high_speed_map)
 
-    HeatMap([[row["latitude"], row["longitude"], row["speed_kmh"]] for _, row in df.iterrows()]).add_to(high_speed_map)
-    high_speed_map.save("maps/mapa_alta_velocidade.html")
+    # Calor agregado por células: soma das velocidades em cada célula
+    add_binned_heatmap(high_speed_map, df["latitude"], df["longitude"], df["speed_kmh"])
+    with cache.writing(key, "mapa_alta_velocidade.html") as tmp_path:
+        high_speed_map.save(tmp_path)
 
     # Mapa de baixas velocidades
     low_speed_map = folium.Map(location=map_center, zoom_start=14)
     min_speed = df["speed_kmh"].min()
 
-    for _, row in df.iterrows():
-        if row["speed_kmh"] <= min_speed * 1.5:
+    for start in panel.chunks(len(df), desc="Mapa de baixas velocidades"):
+        chunk = df.iloc[start:start + CHUNK_SIZE]
+        for row in chunk[chunk["speed_kmh"] <= min_speed * LOW_SPEED_RATIO].itertuples():
             folium.CircleMarker(
-                location=[row["latitude"], row["longitude"]],
+                location=[row.latitude, row.longitude],
                 radius=5,
                 color="blue",
                 fill=True,
                 fill_color="blue",
                 fill_opacity=0.5,
-                popup=f"Velocidade: {row['speed_kmh']} km/h"
+                popup=f"Velocidade: {row.speed_kmh} km/h"
             ).add_to(low_speed_map)
 
-    HeatMap([[row["latitude"], row["longitude"], row["speed_kmh"]] for _, row in df.iterrows()]).add_to(low_speed_map)
-    low_speed_map.save("maps/mapa_baixa_velocidade.html")
+    add_binned_heatmap(low_speed_map, df["latitude"], df["longitude"], df["speed_kmh"])
+    with cache.writing(key, "mapa_baixa_velocidade.html") as tmp_path:
+        low_speed_map.save(tmp_path)
+
+    outputs = {name: cache.path(key, name) for name in SPEED_OUTPUTS}
+    return key, outputs, chart
+
+def speed_chart_data(df):
+    """
+    Velocidade numa grelha de tempo regular (CHART_STEP_S), em vez das amostras
+    irregulares deixadas pela filtragem. A média do gráfico passa a ser ponderada
+    pelo tempo. Intervalos sem registos maiores do que resampling.MAX_GAP_S ficam vazios.
+    """
+    times = df["date"].astype(str) + " " + df["time"].astype(str) if "date" in df.columns else df["time"]
+    track = pd.DataFrame({
+        "datetime": parse_datetime(times),
+        "latitude": df["latitude"],
+        "longitude": df["longitude"],
+        "speed_kmh": df["speed_kmh"],
+    })
+    resampled = resample_frame(track, CHART_STEP_S)
+    return resampled.rename(columns={"datetime": "time"})[["time", "speed_kmh"]]
+
+def show_speed_results(result):
+    """
+    Executado no thread principal: desenha o gráfico (ou mostra o da cache) e abre os mapas.
+    """
+    if result is None:
+        messagebox.showwarning("Aviso", "Nenhum dado válido encontrado após filtragem.")
+        return
+
+    key, outputs, df = result
+    plt.figure(figsize=(18, 8))
+    if df is None:
+        # Artefactos reaproveitados da cache: mostra o gráfico já gerado
+        plt.imshow(plt.imread(outputs["grafico_velocidade.png"]))
+        plt.axis("off")
+    else:
+        plot_speed(df, key)
+
+    cache.evict(keep=outputs.values())
 
     # Abrir os mapas gerados automaticamente no navegador
-    webbrowser.open(f"file://{os.path.abspath('maps/mapa_alta_velocidade.html')}")
-    webbrowser.open(f"file://{os.path.abspath('maps/mapa_baixa_velocidade.html')}")
+    webbrowser.open(f"file://{os.path.abspath(outputs['mapa_alta_velocidade.html'])}")
+    webbrowser.open(f"file://{os.path.abspath(outputs['mapa_baixa_velocidade.html'])}")
 
-    messagebox.showinfo("Sucesso", "Análise completa!\nGráfico salvo como 'maps/grafico_velocidade.png'\nMapas salvos como:\n- 'maps/mapa_alta_velocidade.html'\n- 'maps/mapa_baixa_velocidade.html'")
+    messagebox.showinfo("Sucesso", "Análise completa!\n"
+                        f"Gráfico salvo como '{outputs['grafico_velocidade.png']}'\n"
+                        "Mapas salvos como:\n"
+                        f"- '{outputs['mapa_alta_velocidade.html']}'\n"
+                        f"- '{outputs['mapa_baixa_velocidade.html']}'")
+    plt.show()
+
+def plot_speed(df, key):
+    # Gráfico de velocidade
+    plt.plot(df["time"], df["speed_kmh"], label="Velocidade (km/h)", color="blue")
+    plt.title("Gráfico de Velocidade")
+    plt.xlabel("Tempo")
+    plt.ylabel("Velocidade (km/h)")
+    plt.xticks(rotation=70)
+    plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
+    plt.gca().xaxis.set_major_locator(mdates.MinuteLocator(interval=10))
+    plt.axhline(y=df["speed_kmh"].mean(), color="red", linestyle="--", label="Média")
+    plt.legend()
+    plt.grid()
+    plt.tight_layout()
+    with cache.writing(key, "grafico_velocidade.png") as tmp_path:
+        plt.savefig(tmp_path)
+
+def history_percentiles(device, start, end):
+    """
+    p50/p95/p99 de todo o histórico do dispositivo entre start e end, combinando os
+    histogramas guardados por dia no HistoryStore (sem reler os pontos).
+    """
+    histograms = HistoryStore().histograms(device, start, end)
+    if all(h.total == 0 for h in histograms.values()):
+        raise ValueError(f"Sem dados do dispositivo '{device}' entre {start} e {end}.")
+    return device, start, end, histograms
+
+def show_percentiles(result):
+    device, start, end, histograms = result
+    lines = [f"Histórico '{device}' de {start} a {end}:"]
+    for metric, (label, unit) in PERCENTILE_LABELS.items():
+        histogram = histograms[metric]
+        p50, p95, p99 = histogram.quantiles().values()
+        lines.append(f"{label} ({histogram.total}): p50 {p50:.1f} {unit}, p95 {p95:.1f} {unit}, p99 {p99:.1f} {unit}")
+    messagebox.showinfo("Percentis", "\n".join(lines))
+
+def start_percentiles():
+    device = selected_device.get()
+    if not device:
+        messagebox.showerror("Erro", "Nenhum dispositivo selecionado.")
+        return
+    start, end = entry_start.get().strip(), entry_end.get().strip()
+    try:
+        pd.Timestamp(start), pd.Timestamp(end)
+    except ValueError:
+        messagebox.showerror("Erro", "Datas inválidas (use o formato AAAA-MM-DD).")
+        return
+    if len(end) == 10:
+        end += " 23:59:59"  # data sem hora: inclui o dia inteiro
+    progress_panel.submit(history_percentiles, device, start, end, on_done=show_percentiles)
 
 def browse_file():
     filename = filedialog.askopenfilename(
@@ -103,7 +211,10 @@ def browse_file():
 
 def start_analysis():
     file_path = selected_file.get()
-    analyze_speed(file_path)
+    if not file_path:
+        messagebox.showerror("Erro", "Nenhum arquivo selecionado.")
+        return
+    progress_panel.submit(analyze_speed, file_path, progress_panel, on_done=show_speed_results)
 
 # GUI Setup
 root = tk.Tk()
@@ -117,6 +228,7 @@ Realize uma análise de velocidade contendo coordenadas geográficas e velocidad
 Instruções:
 - Selecione um arquivo CSV filtrado.
 - Clique em "Analisar Velocidade" para gerar gráficos e mapas de alta e baixa velocidade.
+- Para percentis de todo o histórico, escolha o dispositivo e as datas e clique em "Percentis".
 """
 
 label_description = tk.Label(root, text=description_text, font=("Arial", 18), justify="left", padx=10, pady=150)
@@ -133,4 +245,18 @@ ttk.Button(frame, text="Procurar", command=browse_file).grid(row=0, column=2, pa
 
 ttk.Button(frame, text="Analisar Velocidade", command=start_analysis).grid(row=1, column=1, pady=20)
 
+ttk.Label(frame, text="Dispositivo:").grid(row=2, column=0, sticky="w")
+selected_device = tk.StringVar()
+ttk.Combobox(frame, textvariable=selected_device, values=HistoryStore().devices(), state="readonly").grid(row=2, column=1, sticky="w")
+ttk.Label(frame, text="Início (AAAA-MM-DD):").grid(row=3, column=0, sticky="w")
+entry_start = ttk.Entry(frame)
+entry_start.grid(row=3, column=1, sticky="w")
+ttk.Label(frame, text="Fim (AAAA-MM-DD):").grid(row=4, column=0, sticky="w")
+entry_end = ttk.Entry(frame)
+entry_end.grid(row=4, column=1, sticky="w")
+ttk.Button(frame, text="Percentis", command=start_percentiles).grid(row=5, column=1, pady=20)
+
+progress_panel = ProgressPanel(frame)
+progress_panel.grid(row=6, column=0, columnspan=3)
+
 root.mainloop()